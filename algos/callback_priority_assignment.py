@@ -1,21 +1,44 @@
-from typing import List
+from typing import Callable, Dict, List, Tuple
 
 from components.chain import Chain
 
+# コールバックの優先度の割り当て方
+#   chain_id: チェインid順 (これまで通り, チェインidが大きいほど高優先度)
+#   rate_monotonic: 周期の短いチェインほど高優先度
+#   deadline_monotonic: 相対デッドラインの短いチェインほど高優先度 (デッドラインが無いチェインは周期)
+#   criticality: 入力で指定されたクリティカリティの高いチェインほど高優先度 (同じ場合はrate_monotonic)
+PRIORITY_POLICIES = ("chain_id", "rate_monotonic", "deadline_monotonic", "criticality")
+DEFAULT_PRIORITY_POLICY = "chain_id"
 
-def callback_priority_assignment(chains: List[Chain]) -> List[Chain]:
-    # sort chain by id
-    chains = sorted(chains, key=lambda chain: chain.chain_id)
+# 優先度の低い順に並べるためのキー (同じ場合はチェインidの小さい方を低優先度にする)
+_POLICY_KEYS: Dict[str, Callable[[Chain], Tuple]] = {
+    "chain_id": lambda chain: (chain.chain_id,),
+    "rate_monotonic": lambda chain: (-chain.get_period(), chain.chain_id),
+    "deadline_monotonic": lambda chain: (-chain.get_deadline(), chain.chain_id),
+    "criticality": lambda chain: (chain.criticality, -chain.get_period(), chain.chain_id),
+}
+
+
+def callback_priority_assignment(chains: List[Chain], policy: str = DEFAULT_PRIORITY_POLICY) -> List[Chain]:
+    """チェインをpolicyで決まる順に並べて、コールバックに連番の優先度を割り当てる
+
+    どのpolicyでも、一つのチェインのコールバックには連続した優先度をコールバックid順に割り当てるので、
+    チェインの中の優先度がid順に並ぶこと (戦略I~IVの前提) は変わらない
+
+    Returns:
+        チェインid順のチェイン
+    """
+    if policy not in _POLICY_KEYS:
+        raise ValueError(f"unknown priority policy: {policy} (choose from {PRIORITY_POLICIES})")
 
     priority = 1
 
     # assign priority
-    for chain in chains:
+    for chain in sorted(chains, key=_POLICY_KEYS[policy]):
         # NOTE: chain.callbacksは必ずcallback_idでソートされている必要がある
         for cb in chain.callbacks:
             cb.priority = priority
             priority += 1
-    
-    return chains
-
 
+    # sort chain by id
+    return sorted(chains, key=lambda chain: chain.chain_id)
@@ -0,0 +1,151 @@
+"""チェインのエンドツーエンドの最悪応答時間 (レイテンシ) の解析
+
+エグゼキューターとコアの割り当ての後に、コールバックの優先度、エグゼキューターの優先度、コアの配置から
+チェインごとの最悪応答時間の上界を求める
+
+- コア上ではエグゼキューターが優先度順にプリエンプティブに実行され、
+  エグゼキューターの中ではコールバックが優先度順にノンプリエンプティブに実行される
+- コールバックの応答時間 R は、固定点反復で求める (応答時間解析, RTA)
+    R = C + B + Σ ceil(R / T_j) * C_j
+    C: 最悪実行時間, B: 同じエグゼキューターの低優先度のコールバックによるブロッキング (実行時間の最大値)
+    j: 同じコアの高優先度のエグゼキューターのコールバックと、同じエグゼキューターの高優先度のコールバック
+  同じチェインのコールバックは同じインスタンスの中で順番に実行されるので、干渉とブロッキングからは除く
+- チェインのレイテンシは、チェインに含まれるコールバックの応答時間の和 (相対デッドライン以下ならデッドラインを満たす)
+- ceil(R / T_j) の式は R <= T (周期) の場合にしか成り立たないので、
+  応答時間が周期を超えたコールバックを含むチェインは、デッドラインを満たさないとしてレイテンシをNoneにする
+  (レイテンシが周期を超えたチェインも、同じチェインの次のインスタンスとの干渉は考えていないので、デッドラインを満たさないとだけ扱う)
+
+コアごとに (エグゼキューターの優先度の降順, コールバックの優先度の降順) に並べると、
+各コールバックに干渉するコールバックはその並びの先頭からの部分になる
+先頭から順に周期ごとの実行時間の合計を積み上げて使い回すので、コールバックごとに干渉の集合を作り直さない
+"""
+import math
+from typing import Any, Dict, Iterator, List, Tuple
+
+from components.callback import CallBack
+from components.core import Core
+from components.executor import sort_executors_by_priority
+from components.system_model import SystemModel
+
+# 出力する表 (chain_latency) の列のタイトル
+CHAIN_LATENCY_COLUMNS = ["chain_id", "period", "deadline", "latency", "is_schedulable"]
+
+
+class ChainLatency:
+    """チェインのレイテンシの解析結果"""
+    __slots__ = ("chain_id", "period", "deadline", "latency", "is_schedulable")
+
+    def __init__(self, chain_id: int, period: float, latency: float, deadline: float = None):
+        self.chain_id: int = chain_id  # チェインid
+        self.period: float = period  # 周期
+        self.deadline: float = deadline if deadline is not None else period  # 相対デッドライン
+        self.latency: float = latency  # エンドツーエンドの最悪応答時間 (求まらない場合はNone)
+        # デッドラインを満たすかどうか (周期を超えるレイテンシは解析の前提が成り立たないので、デッドラインが周期より長くても満たさないとする)
+        self.is_schedulable: bool = latency is not None and latency <= min(self.period, self.deadline)
+
+
+def analyze_chain_latencies(system: SystemModel) -> List[ChainLatency]:
+    """チェインごとのエンドツーエンドの最悪応答時間を求める (チェインid順)
+    NOTE: エグゼキューターとコアの割り当ての後に呼び出す
+    """
+    response_times = callback_response_times(system)
+
+    chain_latencies: List[ChainLatency] = []
+    for chain in sorted(system.chains, key=lambda chain: chain.chain_id):
+        latency = 0
+        for cb in chain.callbacks:
+            response_time = response_times.get(cb.callback_id)
+            if response_time is None:  # 周期を超えた、または割り当てられていない
+                latency = None
+                break
+            latency += response_time
+        chain_latencies.append(ChainLatency(chain.chain_id, chain.get_period(), latency, chain.get_deadline()))
+    return chain_latencies
+
+
+def chain_latency_rows(chain_latencies: List[ChainLatency]) -> Iterator[Tuple[Any, ...]]:
+    """解析結果をCHAIN_LATENCY_COLUMNSの順の行にする (iostreams.writer.write_table()に渡す)"""
+    for chain_latency in chain_latencies:
+        yield (chain_latency.chain_id, chain_latency.period, chain_latency.deadline, chain_latency.latency, chain_latency.is_schedulable)
+
+
+def callback_response_times(system: SystemModel) -> Dict[int, float]:
+    """コールバックごとの最悪応答時間 (周期を超える場合はNone)
+
+    Returns:
+        コールバックid -> 最悪応答時間 (コアに割り当てられていないコールバックは含まない)
+    """
+    response_times: Dict[int, float] = {}
+    for core in system.cores:
+        _core_response_times(core, system, response_times)
+    return response_times
+
+
+def _core_response_times(core: Core, system: SystemModel, response_times: Dict[int, float]) -> None:
+    """一つのコアのコールバックの最悪応答時間を、優先度の高い順に求める"""
+    wcet_sum_each_period: Dict[float, float] = {}  # ここまでのコールバックの、周期ごとの実行時間の合計
+    wcet_sum_each_chain: Dict[int, float] = {}  # ここまでのコールバックの、チェインごとの実行時間の合計
+
+    for executor in sort_executors_by_priority(core.executors, is_decending=True):
+        blockings = _blockings(executor.callbacks)
+        for cb in reversed(executor.callbacks):  # 優先度の降順
+            response_times[cb.callback_id] = _response_time(
+                cb, blockings[cb.callback_id], wcet_sum_each_period, wcet_sum_each_chain.get(cb.chain_id, 0), system
+            )
+            wcet_sum_each_period[cb.period] = wcet_sum_each_period.get(cb.period, 0) + cb.wcet
+            wcet_sum_each_chain[cb.chain_id] = wcet_sum_each_chain.get(cb.chain_id, 0) + cb.wcet
+
+
+def _blockings(callbacks: List[CallBack]) -> Dict[int, float]:
+    """同じエグゼキューターの低優先度の (別のチェインの) コールバックの実行時間の最大値
+
+    Args:
+        callbacks: エグゼキューターのコールバック (優先度の昇順)
+    """
+    blockings: Dict[int, float] = {}
+    # ここまでの実行時間の最大値と、それとは別のチェインでの最大値 (実行時間, チェインid)
+    first = (0, None)
+    second = (0, None)
+    for cb in callbacks:
+        blockings[cb.callback_id] = second[0] if first[1] == cb.chain_id else first[0]
+
+        if cb.chain_id == first[1]:
+            first = max(first, (cb.wcet, cb.chain_id), key=lambda item: item[0])
+        elif cb.wcet > first[0]:
+            second = first
+            first = (cb.wcet, cb.chain_id)
+        elif cb.wcet > second[0]:
+            second = (cb.wcet, cb.chain_id)
+    return blockings
+
+
+def _response_time(
+    cb: CallBack,
+    blocking: float,
+    wcet_sum_each_period: Dict[float, float],
+    own_chain_wcet_sum: float,
+    system: SystemModel,
+) -> float:
+    """固定点反復で最悪応答時間を求める (周期を超えた時点でNone)
+
+    Args:
+        wcet_sum_each_period: 干渉するコールバックの周期ごとの実行時間の合計 (同じチェインのものも含む)
+        own_chain_wcet_sum: wcet_sum_each_periodに含まれている同じチェインのコールバックの実行時間の合計
+    """
+    response_time = cb.wcet + blocking
+    num_iterations = 0
+    while response_time <= cb.period:
+        num_iterations += 1
+        interference = sum([
+            math.ceil(response_time / period) * wcet_sum
+            for period, wcet_sum in wcet_sum_each_period.items()
+        ])
+        if own_chain_wcet_sum != 0:
+            # 同じチェインのコールバックは同じ周期なので、その分を引く
+            interference -= math.ceil(response_time / cb.period) * own_chain_wcet_sum
+        next_response_time = cb.wcet + blocking + interference
+        if next_response_time == response_time:
+            break
+        response_time = next_response_time
+    system.instrumentation.count("rta_iterations", num_iterations)
+    return response_time if response_time <= cb.period else None
@@ -1,19 +1,55 @@
-import itertools
-from typing import List
+from typing import Dict, List, Tuple
 
 from components.callback import CallBack, sort_cb_by_id
-from components.chain import Chain
 from components.core import Core
 from components.executor import Executor
+from components.system_model import SystemModel
 
 
-def check_satisfy_all_core_strategies(core: Core, assigned_executors: List[Executor], executors: List[Executor], chains: List[Chain]) -> bool:
+def check_satisfy_all_core_strategies(core: Core, assigned_executors: List[Executor], system: SystemModel) -> bool:
     """
     戦略 V と VI を満たすかどうか
     Args:
         core: 割り当てるコア
         assigned_executors: コアに割り当てられる予定のエグゼキューター
+        system: システム全体のコンポーネント
     """
+    system.instrumentation.count("core_strategy_checks")
+
+    # 同じ内容のコアとエグゼキューターの組み合わせは以前の結果を使う
+    # NOTE: 戦略V, VIはコア内のエグゼキューターの内容 (とその優先度) だけで決まる
+    cache = system.strategy_cache
+    cache_key = None
+    cached = None
+    if cache.enabled:
+        cache_key = (
+            "core",
+            core.version,
+            tuple([exe.version for exe in core.executors]),
+            tuple([exe.version for exe in assigned_executors]),
+        )
+        cached = cache.get(cache_key)
+
+    if cached is not None:
+        strategy, res = cached
+    else:
+        strategy, res = _check_core_strategies(core, assigned_executors, system)
+        if cache.enabled:
+            cache.put(cache_key, (strategy, res))
+
+    if system.trace.enabled:
+        system.trace.emit(
+            "core_strategy_check",
+            core_id=core.core_id,
+            executor_ids=[exe.executor_id for exe in assigned_executors],
+            strategy=strategy,
+            satisfied=res,
+            cached=cached is not None,
+        )
+    return res
+
+def _check_core_strategies(core: Core, assigned_executors: List[Executor], system: SystemModel) -> Tuple[str, bool]:
+    """戦略 V と VI のどちらを使うか決めてチェックする (使った戦略と結果を返す)"""
     res = True
     all_executors = list(set(core.executors + assigned_executors))
     all_callbacks = [cb for exe in all_executors for cb in exe.callbacks]
@@ -23,12 +59,14 @@ def check_satisfy_all_core_strategies(core: Core, assigned_executors: List[Execu
     # 一つのコアに何個のチェインを割り当てるかによって戦略を使い分ける
     num_chains_containing_core = len(list(set([cb.chain_id for cb in all_callbacks])))
     if num_chains_containing_core == 1:
-        res = _check_strategy_five(num_callbacks, all_callbacks, executors)
+        strategy = "V"
+        res = _check_strategy_five(num_callbacks, all_callbacks, system)
     else:
-        res = _check_strategy_six(all_callbacks, executors, chains)
-    return res
+        strategy = "VI"
+        res = _check_strategy_six(all_callbacks, system)
+    return strategy, res
 
-def _check_strategy_five(num_callbacks: int, all_callbacks: List[CallBack], executors: List[Executor]) -> bool:
+def _check_strategy_five(num_callbacks: int, all_callbacks: List[CallBack], system: SystemModel) -> bool:
     """戦略 V を満たすかどうか
     
     優先度を比較して以下だったらTrue
@@ -40,8 +78,8 @@ def _check_strategy_five(num_callbacks: int, all_callbacks: List[CallBack], exec
         high_cb = all_callbacks[i+1]
 
         # コールバックを含むエグゼキューターを抽出
-        exe_containing_low_cb = [exe for exe in executors if exe.executor_id == low_cb.assigned_executor_id][0]
-        exe_containing_high_cb = [exe for exe in executors if exe.executor_id == high_cb.assigned_executor_id][0]
+        exe_containing_low_cb = system.get_executor(low_cb.assigned_executor_id)
+        exe_containing_high_cb = system.get_executor(high_cb.assigned_executor_id)
 
         # 一つでも違反があればFalse
         # NOTE: exe_containing_low_cb.priority <= exe_containing_high_cb.priority を満たしたい
@@ -50,45 +88,51 @@ def _check_strategy_five(num_callbacks: int, all_callbacks: List[CallBack], exec
             break  # これ以降のコールバックをチェックする必要ないのでbreak
     return res
 
-def _check_strategy_six(all_callbacks: List[CallBack], executors: List[Executor], chains: List[Chain]) -> bool:
+def _check_strategy_six(all_callbacks: List[CallBack], system: SystemModel) -> bool:
     """戦略 VI を満たすかどうか
     
     任意の二つのチェーンについて、優先度を比較して以下だったらTrue
     (低優先度のチェイン内のコールバックを含むエグゼキュータ) < (高優先度のチェイン内のコールバックを含むエグゼキュータ)
     つまり、
     (低優先度のチェイン内のエグゼキュータの優先度の最大値) < (高優先度のチェイン内のエグゼキュータの優先度の最小値)
+
+    全ての組み合わせを調べる代わりに、チェインごとのエグゼキュータ優先度の最小値と最大値を一度だけ求め、
+    チェインを優先度の低い順に並べて走査する
+    (それまでのチェインの最大値の最大値) <= (今のチェインの最小値) が全てのチェインで成り立てばよい
     """
     res = True
 
-    chains_id_containing_core = list(set([cb.chain_id for cb in all_callbacks]))
-    chains_containing_core = [chain for chain in chains if chain.chain_id in chains_id_containing_core]
-    num_chains_containing_core = len(chains_containing_core)
+    # チェインごとのエグゼキュータ優先度の最小値と最大値
+    min_exe_priority_each_chain: Dict[int, int] = {}
+    max_exe_priority_each_chain: Dict[int, int] = {}
+    for cb in all_callbacks:
+        exe_priority = system.get_executor(cb.assigned_executor_id).priority
+        if cb.chain_id not in min_exe_priority_each_chain:
+            min_exe_priority_each_chain[cb.chain_id] = exe_priority
+            max_exe_priority_each_chain[cb.chain_id] = exe_priority
+        else:
+            min_exe_priority_each_chain[cb.chain_id] = min(min_exe_priority_each_chain[cb.chain_id], exe_priority)
+            max_exe_priority_each_chain[cb.chain_id] = max(max_exe_priority_each_chain[cb.chain_id], exe_priority)
 
-    # チェインの全ての組み合わせ
-    patterns = list(itertools.combinations(range(num_chains_containing_core), r=2))
-    for chain_id_i, chain_id_j in patterns:
-        chain_i = chains_containing_core[chain_id_i]
-        chain_j = chains_containing_core[chain_id_j]
+    # チェインを優先度の低い順に並べる
+    # NOTE: 優先度が同じ場合はチェインidの大きい方を低優先度として扱う (全組み合わせを調べていた時と同じ)
+    chains_containing_core = system.get_chains(min_exe_priority_each_chain.keys())
+    chains_containing_core = sorted(chains_containing_core, key=lambda chain: (chain.priority, -chain.chain_id))
 
-        # 優先度の高低
-        low_priority_chain = chain_i if chain_i.priority < chain_j.priority else chain_j
-        high_priority_chain = chain_i if chain_i.priority >= chain_j.priority else chain_j
-
-        # チェインに含まれているコールバックが割り当てられているエグゼキューター一覧
-        exe_id_containing_lpchain: List[int] = [cb.assigned_executor_id for cb in all_callbacks if cb.chain_id == low_priority_chain.chain_id]
-        exe_containing_lpchain: List[Executor] = [exe for exe in executors if exe.executor_id in exe_id_containing_lpchain]
-
-        exe_id_containing_hpchain: List[int] = [cb.assigned_executor_id for cb in all_callbacks if cb.chain_id == high_priority_chain.chain_id]
-        exe_containing_hpchain: List[Executor] = [exe for exe in executors if exe.executor_id in exe_id_containing_hpchain]
-
-        # 低優先度のチェイン(lpchain)内 の エグゼキュータの優先度の最大値
-        max_exe_priority_containing_lpchain = max([exe.priority for exe in exe_containing_lpchain])
-        # 高優先度のチェイン(hpchain)内 の エグゼキュータの優先度の最小値
-        min_exe_priority_containing_hpchain = min([exe.priority for exe in exe_containing_hpchain])
-
-        # 一つでも違反があればFalse
-        # NOTE: max_exe_priority_containing_lpchain <= min_exe_priority_containing_hpchain を満たしたい
-        if max_exe_priority_containing_lpchain > min_exe_priority_containing_hpchain:
+    # 低優先度のチェインから順に走査する
+    max_exe_priority_lower_chains = None  # これまでに見た低優先度のチェイン内のエグゼキュータの優先度の最大値
+    for chain in chains_containing_core:
+        if (
+            max_exe_priority_lower_chains is not None
+            and max_exe_priority_lower_chains > min_exe_priority_each_chain[chain.chain_id]
+        ):
+            # 一つでも違反があればFalse
+            # NOTE: max_exe_priority_containing_lpchain <= min_exe_priority_containing_hpchain を満たしたい
             res = False
-            break  # これ以降のコールバックをチェックする必要ないのでbreak
+            break  # これ以降のチェインをチェックする必要ないのでbreak
+
+        if max_exe_priority_lower_chains is None:
+            max_exe_priority_lower_chains = max_exe_priority_each_chain[chain.chain_id]
+        else:
+            max_exe_priority_lower_chains = max(max_exe_priority_lower_chains, max_exe_priority_each_chain[chain.chain_id])
     return res
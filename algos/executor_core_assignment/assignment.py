@@ -1,36 +1,49 @@
-from pathlib import Path
-from typing import Dict, List
+from typing import List
 
-from components.callback import CallBack
-from components.chain import Chain
-from components.core import Core, sort_core_by_utilization
-from components.executor import Executor
-from components.node import Node, sort_nodes_by_highest_priority
+from components.node import Node
+from components.node_worklist import NodeWorklist
+from components.resource_pool import FreeExecutorPool
+from components.system_model import SystemModel
 
 from .partA import partA_assignment
 from .partB import partB_assignment
 
+# 割り当てアルゴリズムのバージョン (結果のキャッシュのキーに使うので、割り当て結果が変わる変更をしたら上げる)
+SCHEDULER_VERSION = 2
 
-def executor_core_assignment(
-    nodes: List[Node],
-    executors: List[Executor],
-    cores: List[Core],
-    chains: List[Chain],
-):
-    not_assigned_nodes = nodes.copy()  # まだ割り当てられていないノード
-    not_assigned_nodes = sort_nodes_by_highest_priority(not_assigned_nodes, is_decending=True)  # 最も高い優先度を降順でソート
+
+def executor_core_assignment(system: SystemModel):
+    # NOTE: メモ化した戦略のチェック結果は優先度に依存するので、優先度が決まった後のここで捨てる
+    system.strategy_cache.clear()
+
+    # まだ割り当てられていないノード (最も高い優先度の降順)
+    not_assigned_nodes = NodeWorklist(system.nodes)
 
     while len(not_assigned_nodes) != 0:
         selected_nodes = _select_node(not_assigned_nodes)  # 選択されたノードのサブセット
-        if _is_exist_empty_executor(executors):
+        system.instrumentation.count("assignment_iterations")
+        is_exist_empty_executor = _is_exist_empty_executor(system.free_executor_pool)
+        if system.trace.enabled:
+            system.trace.emit(
+                "select_nodes",
+                part="A" if is_exist_empty_executor else "B",
+                node_ids=[node.node_id for node in selected_nodes],
+                num_not_assigned_nodes=len(not_assigned_nodes),
+            )
+        if is_exist_empty_executor:
             # Part A in the paper
-            not_assigned_nodes = partA_assignment(not_assigned_nodes, selected_nodes, executors, cores, chains)
+            not_assigned_nodes = partA_assignment(not_assigned_nodes, selected_nodes, system)
         else:
             # Part B in the paper
-            not_assigned_nodes = partB_assignment(not_assigned_nodes, selected_nodes, executors, cores, chains)
+            not_assigned_nodes = partB_assignment(not_assigned_nodes, selected_nodes, system)
+
+    # PartBで割り当て済みのエグゼキューターに足したコールバックの分を、コアの利用率に反映する
+    # (結果の要約, core_info.csv, 結果のキャッシュはコアの利用率をそのまま使う)
+    for core in system.cores:
+        core.refresh_utilization()
 
 
-def _select_node(not_assigned_nodes: List[Node]) -> List[Node]:
+def _select_node(not_assigned_nodes: NodeWorklist) -> List[Node]:
     """利用率が1を超えないようにノードを抽出"""
     utilization = 0
     selected_nodes = []
@@ -42,7 +55,5 @@ def _select_node(not_assigned_nodes: List[Node]) -> List[Node]:
     return selected_nodes
 
 
-def _is_exist_empty_executor(executors: List[Executor]) -> bool:
-    # エグゼキューターごとのコールバックのリスト
-    num_callbacks_each_executor = [len(executor.callbacks) for executor in executors]
-    return 0 in num_callbacks_each_executor  # コールバックの数が0のエグゼキューターがあるか
+def _is_exist_empty_executor(free_executor_pool: FreeExecutorPool) -> bool:
+    return len(free_executor_pool) != 0  # コールバックの数が0のエグゼキューターがあるか
@@ -0,0 +1,54 @@
+"""エグゼキューターとコアの割り当て結果を、pickleやjsonにできる形で取り出す・反映する
+
+ワーカープロセスからの結果の受け渡し (decomposition) や、結果のキャッシュ (iostreams.result_cache) で使う
+"""
+from typing import Any, Dict
+
+from components.system_model import SystemModel
+
+
+def export_assignment(system: SystemModel) -> Dict[str, Any]:
+    """割り当て結果をidと利用率のリストにして返す"""
+    return {
+        "callbacks": [[cb.callback_id, cb.assigned_executor_id] for cb in system.callbacks],
+        "executors": [
+            [exe.executor_id, [cb.callback_id for cb in exe.callbacks], exe.utilization, exe.assigned_core_id]
+            for exe in system.executors
+        ],
+        "cores": [
+            [core.core_id, [exe.executor_id for exe in core.executors], core.utilization]
+            for core in system.cores
+        ],
+        "num_partC_fallbacks": system.num_partC_fallbacks,
+    }
+
+
+def apply_assignment(system: SystemModel, result: Dict[str, Any], executor_offset: int = 0, core_offset: int = 0) -> None:
+    """export_assignment()の結果を、エグゼキューターidとコアidをずらしてシステムに反映する
+    NOTE: 利用率などは記録された値をそのまま使う (足し直すと丸め誤差で値が変わりうる)
+    """
+    def global_executor_id(executor_id: int) -> int:
+        return None if executor_id is None else executor_offset + executor_id
+
+    def global_core_id(core_id: int) -> int:
+        return None if core_id is None else core_offset + core_id
+
+    for executor_id, callback_ids, utilization, _ in result["executors"]:
+        exe = system.get_executor(global_executor_id(executor_id))
+        if len(callback_ids) != 0:
+            exe.assign_callbacks([system.get_callback(callback_id) for callback_id in callback_ids])
+        exe.utilization = utilization
+
+    for core_id, executor_ids, utilization in result["cores"]:
+        core = system.get_core(global_core_id(core_id))
+        for executor_id in executor_ids:
+            core.assign_executor(system.get_executor(global_executor_id(executor_id)))
+        core.utilization = utilization
+
+    # マージで空になったエグゼキューターなども含めて、記録された登録をそのまま反映する
+    for executor_id, _, _, assigned_core_id in result["executors"]:
+        system.get_executor(global_executor_id(executor_id)).set_assigned_core(global_core_id(assigned_core_id))
+    for callback_id, assigned_executor_id in result["callbacks"]:
+        system.get_callback(callback_id).set_assigned_executor(global_executor_id(assigned_executor_id))
+
+    system.num_partC_fallbacks += result["num_partC_fallbacks"]
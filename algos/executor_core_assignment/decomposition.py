@@ -0,0 +1,177 @@
+"""ノードを共有しない独立したサブシステムごとに、エグゼキューターとコアの割り当てを並列に行う
+
+1. ノードとチェインの二部グラフ (コールバックが属するノードとチェインを辺で結ぶ) を連結成分に分ける
+2. 連結成分を利用率が偏らないようにクラスターにまとめ、エグゼキューターとコアを利用率に比例して分ける
+   (各クラスターには利用率を収められるだけのコアを必ず渡す。渡せない場合はクラスターの数を減らす)
+3. クラスターごとにワーカープロセスでexecutor_core_assignment()を行う
+4. クラスターごとのエグゼキューターidとコアidをずらして、元のシステムに割り当て結果を反映する
+
+クラスター同士はコアもエグゼキューターも共有しないので、各クラスターで戦略を満たしていれば全体でも満たす
+(エグゼキューターidは順番を保ったままずらすので、優先度の大小関係も変わらない)
+NOTE: コールバック、ノード、チェインの優先度が決まった後に呼び出す
+"""
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+from components.callback import CallBack
+from components.chain import Chain
+from components.initial_components import build_system_model
+from components.instrumentation import Instrumentation
+from components.node import Node
+from components.system_model import SystemModel
+
+from .assignment import executor_core_assignment
+from .assignment_result import apply_assignment, export_assignment
+
+
+def find_connected_components(system: SystemModel) -> List[List[Node]]:
+    """ノードとチェインの二部グラフの連結成分ごとにノードを分ける (Union-Find)
+
+    Returns:
+        連結成分ごとのノード (連結成分は最小のノードidの順、各連結成分のノードはノードid順)
+    """
+    # ノードを 0..num_nodes-1、チェインを num_nodes.. に対応させる
+    node_index = {node.node_id: i for i, node in enumerate(system.nodes)}
+    chain_index = {chain.chain_id: len(system.nodes) + i for i, chain in enumerate(system.chains)}
+    parents = list(range(len(system.nodes) + len(system.chains)))
+
+    def find(i: int) -> int:
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]  # 経路圧縮
+            i = parents[i]
+        return i
+
+    for cb in system.callbacks:
+        root_node = find(node_index[cb.node_id])
+        root_chain = find(chain_index[cb.chain_id])
+        if root_node != root_chain:
+            parents[root_chain] = root_node
+
+    nodes_each_component: Dict[int, List[Node]] = {}
+    for node in sorted(system.nodes, key=lambda node: node.node_id):
+        nodes_each_component.setdefault(find(node_index[node.node_id]), []).append(node)
+    return list(nodes_each_component.values())
+
+
+def parallel_executor_core_assignment(system: SystemModel, num_workers: int = None) -> int:
+    """連結成分ごとに分けて、エグゼキューターとコアの割り当てをワーカープロセスで並列に行う
+
+    Args:
+        system: システム全体のコンポーネント (割り当て結果はここに反映される)
+        num_workers: ワーカープロセスの数 (Noneの場合はCPUの数, 1の場合はこのプロセスで順番に行う)
+
+    Returns:
+        クラスターの数 (1の場合は分けずにexecutor_core_assignment()を行う)
+    """
+    components = find_connected_components(system)
+    num_clusters = min(len(components), system.num_executors, system.num_cores)
+    while num_clusters > 1:
+        clusters = _group_components(components, num_clusters)
+        utilizations = [sum([node.utilization for node in nodes]) for nodes in clusters]
+        min_cores = [max(1, math.ceil(utilization)) for utilization in utilizations]
+        if sum(min_cores) <= system.num_cores:
+            break
+        num_clusters -= 1  # コアが足りないクラスターができるので、まとめ直す
+    if num_clusters <= 1:
+        executor_core_assignment(system)
+        return 1
+
+    executor_budgets = _partition_budget(system.num_executors, utilizations, [1] * num_clusters)
+    core_budgets = _partition_budget(system.num_cores, utilizations, min_cores)
+
+    payloads = [
+        _cluster_payload(nodes, system, num_executors, num_cores)
+        for nodes, num_executors, num_cores in zip(clusters, executor_budgets, core_budgets)
+    ]
+    if num_workers == 1:
+        results = [_assign_cluster(payload) for payload in payloads]
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as pool:
+            results = list(pool.map(_assign_cluster, payloads))
+
+    # 割り当て結果を元のシステムに反映する (エグゼキューターidとコアidはクラスターごとにずらす)
+    executor_offset = 0
+    core_offset = 0
+    for result, num_executors, num_cores in zip(results, executor_budgets, core_budgets):
+        _apply_result(system, result, executor_offset, core_offset)
+        executor_offset += num_executors
+        core_offset += num_cores
+    system.instrumentation.count("decomposition_clusters", num_clusters)
+    return num_clusters
+
+
+def _group_components(components: List[List[Node]], num_clusters: int) -> List[List[Node]]:
+    """連結成分を利用率の大きい順に、最も利用率の小さいクラスターへ入れていく (LPT)"""
+    utilizations = [sum([node.utilization for node in nodes]) for nodes in components]
+    order = sorted(range(len(components)), key=lambda i: -utilizations[i])  # 同じ利用率なら元の順番
+
+    clusters: List[List[Node]] = [[] for _ in range(num_clusters)]
+    cluster_utilizations = [0] * num_clusters
+    for i in order:
+        target = min(range(num_clusters), key=lambda j: cluster_utilizations[j])
+        clusters[target].extend(components[i])
+        cluster_utilizations[target] += utilizations[i]
+
+    return [sorted(nodes, key=lambda node: node.node_id) for nodes in clusters]
+
+
+def _partition_budget(total: int, weights: List[float], minimums: List[int]) -> List[int]:
+    """各クラスターにminimumsを渡した残りを、重みに比例して分ける (端数は最大剰余方式)
+    NOTE: total >= sum(minimums) であること
+    """
+    num_clusters = len(weights)
+    sum_weights = sum(weights)
+    if sum_weights <= 0:
+        weights = [1] * num_clusters
+        sum_weights = num_clusters
+
+    remaining = total - sum(minimums)
+    quotas = [remaining * weight / sum_weights for weight in weights]
+    budgets = [minimum + int(quota) for minimum, quota in zip(minimums, quotas)]
+
+    # 余りは端数の大きい順に配る
+    leftover = total - sum(budgets)
+    order = sorted(range(num_clusters), key=lambda i: -(quotas[i] - int(quotas[i])))
+    for i in order[:leftover]:
+        budgets[i] += 1
+    return budgets
+
+
+def _cluster_payload(nodes: List[Node], system: SystemModel, num_executors: int, num_cores: int) -> Dict[str, Any]:
+    """ワーカープロセスに渡すクラスターの情報"""
+    node_ids = {node.node_id for node in nodes}
+    callbacks = [cb for cb in system.callbacks if cb.node_id in node_ids]
+    chain_ids = {cb.chain_id for cb in callbacks}
+    chains = [chain for chain in system.chains if chain.chain_id in chain_ids]
+    return {
+        "callbacks": callbacks,
+        "chains": chains,
+        "nodes": nodes,
+        "num_executors": num_executors,
+        "num_cores": num_cores,
+        "instrument": system.instrumentation.enabled,
+    }
+
+
+def _assign_cluster(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """一つのクラスターのエグゼキューターとコアの割り当てを行う (ワーカープロセスで実行される)
+
+    エグゼキューターとコアのidはクラスター内で0から振られる
+    """
+    callbacks: List[CallBack] = payload["callbacks"]
+    chains: List[Chain] = payload["chains"]
+    cluster = build_system_model(callbacks, chains, payload["nodes"], payload["num_executors"], payload["num_cores"])
+    cluster.instrumentation = Instrumentation(enabled=payload["instrument"])
+    executor_core_assignment(cluster)
+
+    result = export_assignment(cluster)
+    result["counters"] = dict(cluster.instrumentation.counters)
+    return result
+
+
+def _apply_result(system: SystemModel, result: Dict[str, Any], executor_offset: int, core_offset: int) -> None:
+    """クラスターの割り当て結果を、idをずらして元のシステムに反映する"""
+    apply_assignment(system, result, executor_offset, core_offset)
+    for name, value in result["counters"].items():
+        system.instrumentation.count(name, value)
@@ -0,0 +1,469 @@
+"""割り当ての後に、コアの利用率の最大値を小さくする局所探索
+
+executor_core_assignment() (PartA/B/C) は選んだノードを利用率の低いコアに詰めていくので、
+一つのコアに利用率が偏り、別のコアがほとんど空いたままになることがある
+最も利用率の高いコアから他のコアへ以下の移動を試し、戦略I〜VIを満たすものを適用することを繰り返す
+- ノードの移動: ノードを別のコアのエグゼキューター (空いているコアの場合は空のエグゼキューター) に移す
+- ノードの交換: 別のコアのエグゼキューターのノードと入れ替える
+- エグゼキューターの移動: エグゼキューターを別のコアに移す
+
+- 移動の良し悪しは移動元と移動先のコアの利用率の差分だけで求める (移動後の2つのコアの利用率の大きい方が小さいほど良い)
+  移動元のコアの利用率より小さくなる移動だけを候補にするので、コアの利用率の並びは移動のたびに辞書順で小さくなり、必ず終わる
+- 候補を良い順に仮に適用し (ノードの交換は他の移動ができない場合だけ)、戦略を満たさなければ取り消す
+- 最も利用率の高いコアからどの移動もできなくなるか、time_budget秒を過ぎたら終わる
+
+戦略のチェックは、変わったエグゼキューター (戦略I〜IV) とコア (戦略V, VI) の、変わったチェインだけを差分で行う
+戦略III, IV, VIを満たすチェインの集合は、優先度の順に並べた時に隣同士が満たしていれば全ての組み合わせが満たすので、
+移動の前に同じ戦略を満たしていたなら、変わったチェインとその両隣だけを比べればよい
+(戦略が変わる場合と、チェインが一つの場合 (戦略I, II, V) は、これまで通り全体をチェックする)
+NOTE: 空のエグゼキューターは、エグゼキューターが一つもないコアへノードを移す場合にだけ使う
+"""
+import bisect
+import heapq
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from algos.core_strategy import check_satisfy_all_core_strategies
+from algos.executor_strategy import (check_satisfy_all_executor_strategies,
+                                     is_chain_pair_satisfy_strategy_four,
+                                     is_chain_pair_satisfy_strategy_three)
+from components.chain import Chain
+from components.core import Core
+from components.executor import Executor
+from components.node import Node
+from components.system_model import SystemModel
+from components.transaction import AssignmentTransaction
+
+DEFAULT_TIME_BUDGET = 1.0  # 局所探索に使う時間の上限 (秒)
+_EPSILON = 1e-9  # これより小さい利用率の変化は改善とみなさない
+
+# 移動の種類 (同じ良さの候補は、この順に試す)
+_EXECUTOR_MOVE = 0
+_NODE_MOVE = 1
+_NODE_SWAP = 2
+_MOVE_NAMES = {_EXECUTOR_MOVE: "executor_move", _NODE_MOVE: "node_move", _NODE_SWAP: "node_swap"}
+_FREE_EXECUTOR = -1  # ノードの移動先が空のエグゼキューターであることを表すid
+
+# 移動の候補: (移動後の2つのコアの利用率の大きい方, 移動の種類, 移動するもののid, 移動先のid, 移動先のコアid)
+#   エグゼキューターの移動: (エグゼキューターid, コアid)
+#   ノードの移動: (ノードid, エグゼキューターid (空のエグゼキューターの場合は_FREE_EXECUTOR))
+#   ノードの交換: (移動元のノードid, 移動先のノードid)
+Move = Tuple[float, int, int, int, int]
+
+# チェインの並びの変更: (並び, チェイン, 値, 増やすコールバックの数 (減らす場合は負))
+ChainOrderChange = Tuple["_ChainOrder", Chain, int, int]
+
+
+def local_search_assignment(system: SystemModel, time_budget: float = DEFAULT_TIME_BUDGET) -> int:
+    """コアの利用率の最大値を小さくするように、割り当て済みのノードとエグゼキューターを動かす
+    NOTE: executor_core_assignment()の後に呼び出す
+
+    Args:
+        system: 割り当て済みのシステム (結果はここに反映される)
+        time_budget: 使う時間の上限 (秒)
+
+    Returns:
+        適用した移動の数
+    """
+    time_limit = time.perf_counter() + time_budget
+    search = _LocalSearch(system, time_limit)
+
+    num_moves = 0
+    while time.perf_counter() < time_limit:
+        system.instrumentation.count("local_search_iterations")
+        if not search.improve_max_core():
+            break  # 局所最適
+        num_moves += 1
+    system.instrumentation.count("local_search_moves", num_moves)
+    return num_moves
+
+
+class _ChainOrder:
+    """エグゼキューターかコアに含まれるチェインを優先度の低い順に並べ、チェインごとに値ごとのコールバックの数を持つ
+    値は、コアの場合はコールバックを含むエグゼキューターの優先度、エグゼキューターの場合はタイマーコールバックかどうか (1 or 0)
+    """
+    __slots__ = ("_keys", "_counts", "value_counts")
+
+    def __init__(self):
+        self._keys: List[Tuple[int, int]] = []  # (チェインの優先度, -チェインid) の昇順 (戦略のチェックと同じ並び)
+        self._counts: Dict[int, Dict[int, int]] = {}  # チェインid -> 値 -> コールバックの数
+        self.value_counts: Dict[int, int] = {}  # 値 -> コールバックの数 (全てのチェインの合計)
+
+    def __len__(self) -> int:
+        """チェインの数"""
+        return len(self._keys)
+
+    def __contains__(self, chain_id: int) -> bool:
+        return chain_id in self._counts
+
+    def change(self, chain: Chain, value: int, n: int) -> None:
+        """値がvalueのチェインのコールバックをn個増やす (nが負なら減らす)"""
+        counts = self._counts.get(chain.chain_id)
+        if counts is None:
+            counts = self._counts[chain.chain_id] = {}
+            bisect.insort(self._keys, _chain_key(chain))
+        counts[value] = counts.get(value, 0) + n
+        if counts[value] == 0:
+            del counts[value]
+            if len(counts) == 0:
+                del self._counts[chain.chain_id]
+                del self._keys[bisect.bisect_left(self._keys, _chain_key(chain))]
+        self.value_counts[value] = self.value_counts.get(value, 0) + n
+
+    def neighbors(self, chain: Chain) -> Tuple[Optional[int], Optional[int]]:
+        """優先度の順で一つ下と一つ上のチェインid (なければNone)"""
+        i = bisect.bisect_left(self._keys, _chain_key(chain))
+        lower = -self._keys[i - 1][1] if i > 0 else None
+        higher = -self._keys[i + 1][1] if i + 1 < len(self._keys) else None
+        return lower, higher
+
+    def value_range(self, chain_id: int) -> Tuple[int, int]:
+        """チェインのコールバックの値の (最小値, 最大値)"""
+        values = self._counts[chain_id].keys()
+        return min(values), max(values)
+
+
+def _chain_key(chain: Chain) -> Tuple[int, int]:
+    """チェインを優先度の低い順に並べるキー (優先度が同じ場合はチェインidの大きい方を低優先度として扱う)"""
+    return (chain.priority, -chain.chain_id)
+
+
+class _LocalSearch:
+    """局所探索の状態 (エグゼキューターとコアごとのノード、チェインの並び、満たしている戦略)"""
+
+    def __init__(self, system: SystemModel, time_limit: float):
+        self.system = system
+        self.time_limit = time_limit
+
+        # PartBで後からコールバックが足されたエグゼキューターの利用率はコアに反映されていないので、記録し直す
+        for core in system.cores:
+            core.refresh_utilization()
+
+        # エグゼキューターid -> 割り当てられているノードid
+        # NOTE: ノードのコールバックは全て同じエグゼキューターに割り当てられている
+        self.nodes_each_executor: Dict[int, Set[int]] = {}
+        for node in system.nodes:
+            executor_id = node.callbacks[0].assigned_executor_id
+            self.nodes_each_executor.setdefault(executor_id, set()).add(node.node_id)
+
+        # コアid -> 割り当てられているノードの (利用率, ノードid) の昇順
+        self.sorted_nodes_each_core: Dict[int, List[Tuple[float, int]]] = {
+            core.core_id: sorted([
+                (system.get_node(node_id).utilization, node_id)
+                for exe in core.executors
+                for node_id in self.nodes_each_executor.get(exe.executor_id, ())
+            ])
+            for core in system.cores
+        }
+
+        # エグゼキューターとコアごとのチェインの並び
+        self.executor_orders: Dict[int, _ChainOrder] = {exe.executor_id: _ChainOrder() for exe in system.executors}
+        self.core_orders: Dict[int, _ChainOrder] = {core.core_id: _ChainOrder() for core in system.cores}
+        for core in system.cores:
+            for exe in core.executors:
+                for cb in exe.callbacks:
+                    chain = system.get_chain(cb.chain_id)
+                    self.executor_orders[exe.executor_id].change(chain, int(cb.is_timer_callback), 1)
+                    self.core_orders[core.core_id].change(chain, exe.priority, 1)
+
+        # エグゼキューターid, コアid -> 今満たしている戦略 (満たしていない場合と空の場合はNone)
+        self.executor_strategies: Dict[int, Optional[str]] = {}
+        self.core_strategies: Dict[int, Optional[str]] = {}
+        for core in system.cores:
+            for exe in core.executors:
+                is_satisfied = len(exe.callbacks) != 0 and check_satisfy_all_executor_strategies(exe, [], system)
+                self._commit_executor_strategy(exe, is_satisfied)
+            is_satisfied = len(core.executors) != 0 and check_satisfy_all_core_strategies(core, [], system)
+            self._commit_core_strategy(core, is_satisfied)
+
+    def improve_max_core(self) -> bool:
+        """最も利用率の高いコアの利用率を下げる移動を一つ適用する (できなければFalse)
+        ノードの交換は、エグゼキューターとノードの移動がどれもできない場合にだけ試す
+        """
+        source = max(self.system.cores, key=lambda core: (core.utilization, -core.core_id))
+        for candidates in (self._move_candidates, self._swap_candidates):
+            for move in candidates(source):
+                if time.perf_counter() >= self.time_limit:
+                    return False
+                if self._try_move(move, source):
+                    return True
+        return False
+
+    def _move_candidates(self, source: Core) -> Iterator[Move]:
+        """sourceの利用率を下げるエグゼキューターとノードの移動の候補を、良い順に返す
+        移動先のコアごとに良い順に作り、それらをマージする (試す分しか作らない)
+        """
+        has_free_executor = len(self.system.free_executor_pool) != 0
+        candidates_each_target = [
+            self._target_move_candidates(source, target, has_free_executor)
+            for target in self.system.cores
+            if target is not source and source.utilization - target.utilization > 2 * _EPSILON
+        ]
+        return heapq.merge(*candidates_each_target)
+
+    def _target_move_candidates(self, source: Core, target: Core, has_free_executor: bool) -> Iterator[Move]:
+        """sourceからtargetへの移動の候補を良い順に返す
+
+        動かす利用率をdとすると、移動後の2つのコアの利用率の大きい方は (二つのコアの利用率の平均) + |d - gap / 2| なので、
+        dがgap / 2 に近い順に返せばよい (ノードは利用率の昇順に並べてあるので、gap / 2 の位置から両側に広げていく)
+        """
+        gap = source.utilization - target.utilization  # 動かす利用率dが 0 < d < gap なら改善する
+        middle = (source.utilization + target.utilization) / 2
+
+        # エグゼキューターの移動
+        executor_moves = sorted([
+            (middle + abs(exe.utilization - gap / 2), _EXECUTOR_MOVE, exe.executor_id, target.core_id, target.core_id)
+            for exe in source.executors
+            if _EPSILON < exe.utilization < gap - _EPSILON
+        ])
+
+        # ノードの移動
+        target_executor_ids = sorted([exe.executor_id for exe in target.executors])
+        if len(target_executor_ids) == 0 and has_free_executor:
+            target_executor_ids = [_FREE_EXECUTOR]
+        node_moves = (
+            (middle + abs(utilization - gap / 2), _NODE_MOVE, node_id, executor_id, target.core_id)
+            for utilization, node_id in _nearest_first(self.sorted_nodes_each_core[source.core_id], gap / 2)
+            if _EPSILON < utilization < gap - _EPSILON
+            for executor_id in target_executor_ids
+        )
+        return heapq.merge(executor_moves, node_moves)
+
+    def _swap_candidates(self, source: Core) -> List[Move]:
+        """sourceの利用率を下げるノードの交換の候補を良い順に返す
+        sourceのノードごとに、動かす利用率がgapの半分に近い相手を二分探索で探す
+        """
+        moves: List[Move] = []
+        source_nodes = self.sorted_nodes_each_core[source.core_id]
+        for target in self.system.cores:
+            gap = source.utilization - target.utilization
+            if target is source or gap <= 2 * _EPSILON:
+                continue
+            middle = (source.utilization + target.utilization) / 2
+            target_nodes = self.sorted_nodes_each_core[target.core_id]
+            for utilization, node_id in source_nodes:
+                i = bisect.bisect_left(target_nodes, (utilization - gap / 2,))
+                for other_utilization, other_node_id in target_nodes[max(i - 1, 0):i + 1]:
+                    d = utilization - other_utilization
+                    if _EPSILON < d < gap - _EPSILON:
+                        moves.append((middle + abs(d - gap / 2), _NODE_SWAP, node_id, other_node_id, target.core_id))
+        return sorted(moves)
+
+    def _try_move(self, move: Move, source: Core) -> bool:
+        """移動を仮に適用し、改善して戦略を満たしていれば確定する (満たさなければ取り消す)"""
+        system = self.system
+        _, kind, moved_id, destination_id, target_core_id = move
+        target = system.get_core(target_core_id)
+        prev_max_utilization = max(source.utilization, target.utilization)
+
+        transaction = AssignmentTransaction()
+        transaction.begin()
+        changes: List[ChainOrderChange] = []
+        if kind == _EXECUTOR_MOVE:
+            exe = system.get_executor(moved_id)
+            changed_executors = []
+            moved_callbacks = exe.callbacks
+            transaction.remove_executor(source, exe)
+            transaction.assign_executor(target, exe)
+            for cb in moved_callbacks:
+                chain = system.get_chain(cb.chain_id)
+                changes.append((self.core_orders[source.core_id], chain, exe.priority, -1))
+                changes.append((self.core_orders[target.core_id], chain, exe.priority, 1))
+        elif kind == _NODE_MOVE:
+            node = system.get_node(moved_id)
+            from_executor = system.get_executor(node.callbacks[0].assigned_executor_id)
+            if destination_id == _FREE_EXECUTOR:
+                to_executor = system.free_executor_pool.highest_priority()
+            else:
+                to_executor = system.get_executor(destination_id)
+            changed_executors = [from_executor, to_executor]
+            moved_callbacks = node.callbacks
+            self._move_node(transaction, changes, node, from_executor, source, to_executor, target)
+        else:
+            node = system.get_node(moved_id)
+            other_node = system.get_node(destination_id)
+            from_executor = system.get_executor(node.callbacks[0].assigned_executor_id)
+            to_executor = system.get_executor(other_node.callbacks[0].assigned_executor_id)
+            changed_executors = [from_executor, to_executor]
+            moved_callbacks = node.callbacks + other_node.callbacks
+            self._move_node(transaction, changes, node, from_executor, source, to_executor, target)
+            self._move_node(transaction, changes, other_node, to_executor, target, from_executor, source)
+        _apply_chain_order_changes(changes)
+
+        is_improved = max(source.utilization, target.utilization) < prev_max_utilization - _EPSILON
+        changed_chains = system.get_chains([cb.chain_id for cb in moved_callbacks])
+        if is_improved and self._satisfy_strategies(changed_executors, [source, target], changed_chains):
+            transaction.commit()
+            self._commit_move(kind, moved_id, destination_id, changed_executors, source, target)
+            if system.trace.enabled:
+                system.trace.emit(
+                    "local_search_move",
+                    move=_MOVE_NAMES[kind],
+                    moved_id=moved_id,
+                    destination_id=None if destination_id == _FREE_EXECUTOR else destination_id,
+                    from_core_id=source.core_id,
+                    to_core_id=target.core_id,
+                    utilizations=[source.utilization, target.utilization],
+                )
+            return True
+
+        _apply_chain_order_changes([(order, chain, value, -n) for order, chain, value, n in reversed(changes)])
+        transaction.rollback()
+        system.instrumentation.count("local_search_rejections")
+        return False
+
+    def _move_node(
+        self,
+        transaction: AssignmentTransaction,
+        changes: List[ChainOrderChange],
+        node: Node,
+        from_executor: Executor,
+        from_core: Core,
+        to_executor: Executor,
+        to_core: Core,
+    ) -> None:
+        """ノードをエグゼキューターからエグゼキューターへ仮に移し、コアの利用率を更新する (チェインの並びの変更はchangesに足す)"""
+        transaction.remove_callbacks(from_executor, node.callbacks)
+        if len(from_executor.callbacks) == 0:
+            transaction.remove_executor(from_core, from_executor)  # 空になったエグゼキューターはコアから外す
+        else:
+            transaction.update_executor_utilization(from_core, from_executor)
+
+        transaction.assign_callbacks(to_executor, node.callbacks)
+        if to_executor not in to_core.executors:
+            transaction.assign_executor(to_core, to_executor)  # コアに割り当てられていなかった空のエグゼキューター
+        else:
+            transaction.update_executor_utilization(to_core, to_executor)
+
+        for cb in node.callbacks:
+            chain = self.system.get_chain(cb.chain_id)
+            is_timer = int(cb.is_timer_callback)
+            changes.append((self.executor_orders[from_executor.executor_id], chain, is_timer, -1))
+            changes.append((self.executor_orders[to_executor.executor_id], chain, is_timer, 1))
+            changes.append((self.core_orders[from_core.core_id], chain, from_executor.priority, -1))
+            changes.append((self.core_orders[to_core.core_id], chain, to_executor.priority, 1))
+
+    def _satisfy_strategies(self, executors: List[Executor], cores: List[Core], chains: List[Chain]) -> bool:
+        """変わったエグゼキューターが戦略I〜IVを、変わったコアが戦略V, VIを満たすかどうか"""
+        for exe in executors:
+            if not self._satisfy_executor_strategies(exe, chains):
+                return False
+        for core in cores:
+            if not self._satisfy_core_strategies(core, chains):
+                return False
+        return True
+
+    def _satisfy_executor_strategies(self, executor: Executor, chains: List[Chain]) -> bool:
+        """エグゼキューターが戦略I〜IVを満たすかどうか (移動の前と同じ戦略IIIかIVなら、変わったチェインだけを調べる)"""
+        order = self.executor_orders[executor.executor_id]
+        if len(order) == 0:
+            return True
+        strategy = _executor_strategy(order)
+        if strategy not in ("III", "IV") or self.executor_strategies.get(executor.executor_id) != strategy:
+            return check_satisfy_all_executor_strategies(executor, [], self.system)
+
+        self.system.instrumentation.count("local_search_incremental_checks")
+        if strategy == "III":
+            return _satisfy_neighbors(order, chains, self.system, is_chain_pair_satisfy_strategy_three)
+        return _satisfy_neighbors(order, chains, self.system, is_chain_pair_satisfy_strategy_four)
+
+    def _satisfy_core_strategies(self, core: Core, chains: List[Chain]) -> bool:
+        """コアが戦略V, VIを満たすかどうか (移動の前も戦略VIなら、変わったチェインだけを調べる)"""
+        order = self.core_orders[core.core_id]
+        if len(order) == 0:
+            return True
+        if len(order) == 1 or self.core_strategies.get(core.core_id) != "VI":
+            return check_satisfy_all_core_strategies(core, [], self.system)
+
+        self.system.instrumentation.count("local_search_incremental_checks")
+
+        # (低優先度のチェイン内のエグゼキュータの優先度の最大値) <= (高優先度のチェイン内のエグゼキュータの優先度の最小値)
+        def is_pair_satisfied(low_priority_chain: Chain, high_priority_chain: Chain) -> bool:
+            return order.value_range(low_priority_chain.chain_id)[1] <= order.value_range(high_priority_chain.chain_id)[0]
+
+        return _satisfy_neighbors(order, chains, self.system, is_pair_satisfied)
+
+    def _commit_move(
+        self, kind: int, moved_id: int, destination_id: int, executors: List[Executor], source: Core, target: Core
+    ) -> None:
+        """確定した移動を、エグゼキューターとコアごとのノードと、満たしている戦略に反映する"""
+        if kind == _EXECUTOR_MOVE:
+            self._move_sorted_nodes(self.nodes_each_executor.get(moved_id, ()), source, target)
+        else:
+            from_executor, to_executor = executors
+            self.nodes_each_executor[from_executor.executor_id].discard(moved_id)
+            self.nodes_each_executor.setdefault(to_executor.executor_id, set()).add(moved_id)
+            self._move_sorted_nodes([moved_id], source, target)
+            if kind == _NODE_SWAP:
+                self.nodes_each_executor[to_executor.executor_id].discard(destination_id)
+                self.nodes_each_executor[from_executor.executor_id].add(destination_id)
+                self._move_sorted_nodes([destination_id], target, source)
+
+        # 戦略のチェックを通ったので、変わったエグゼキューターとコアは今の戦略を満たしている
+        for exe in executors:
+            self._commit_executor_strategy(exe, True)
+        for core in (source, target):
+            self._commit_core_strategy(core, True)
+
+    def _move_sorted_nodes(self, node_ids: Iterable[int], from_core: Core, to_core: Core) -> None:
+        """コアごとのノードの並びの間でノードを移す"""
+        from_nodes = self.sorted_nodes_each_core[from_core.core_id]
+        to_nodes = self.sorted_nodes_each_core[to_core.core_id]
+        for node_id in node_ids:
+            item = (self.system.get_node(node_id).utilization, node_id)
+            del from_nodes[bisect.bisect_left(from_nodes, item)]
+            bisect.insort(to_nodes, item)
+
+    def _commit_executor_strategy(self, executor: Executor, is_satisfied: bool) -> None:
+        order = self.executor_orders[executor.executor_id]
+        is_valid = is_satisfied and len(order) != 0
+        self.executor_strategies[executor.executor_id] = _executor_strategy(order) if is_valid else None
+
+    def _commit_core_strategy(self, core: Core, is_satisfied: bool) -> None:
+        order = self.core_orders[core.core_id]
+        is_valid = is_satisfied and len(order) != 0
+        self.core_strategies[core.core_id] = ("V" if len(order) == 1 else "VI") if is_valid else None
+
+
+def _executor_strategy(order: _ChainOrder) -> str:
+    """エグゼキューターのチェインの数とタイマーコールバックの有無から、使う戦略を決める (_check_executor_strategies()と同じ)"""
+    is_contain_timer_callback = order.value_counts.get(1, 0) != 0
+    if len(order) == 1:
+        return "II" if is_contain_timer_callback else "I"
+    return "IV" if is_contain_timer_callback else "III"
+
+
+def _satisfy_neighbors(
+    order: _ChainOrder,
+    chains: List[Chain],
+    system: SystemModel,
+    is_pair_satisfied: Callable[[Chain, Chain], bool],
+) -> bool:
+    """変わったチェインが、優先度の順で両隣のチェインとの組み合わせを満たすかどうか"""
+    for chain in chains:
+        if chain.chain_id not in order:
+            continue  # 取り除かれたチェイン (残ったチェイン同士は移動の前から満たしている)
+        lower_chain_id, higher_chain_id = order.neighbors(chain)
+        if lower_chain_id is not None and not is_pair_satisfied(system.get_chain(lower_chain_id), chain):
+            return False
+        if higher_chain_id is not None and not is_pair_satisfied(chain, system.get_chain(higher_chain_id)):
+            return False
+    return True
+
+
+def _apply_chain_order_changes(changes: List[ChainOrderChange]) -> None:
+    for order, chain, value, n in changes:
+        order.change(chain, value, n)
+
+
+def _nearest_first(sorted_nodes: List[Tuple[float, int]], utilization: float) -> Iterator[Tuple[float, int]]:
+    """(利用率, ノードid) の昇順のリストから、利用率がutilizationに近い順に返す"""
+    hi = bisect.bisect_left(sorted_nodes, (utilization,))
+    lo = hi - 1
+    while lo >= 0 or hi < len(sorted_nodes):
+        if hi >= len(sorted_nodes) or (lo >= 0 and utilization - sorted_nodes[lo][0] <= sorted_nodes[hi][0] - utilization):
+            yield sorted_nodes[lo]
+            lo -= 1
+        else:
+            yield sorted_nodes[hi]
+            hi += 1
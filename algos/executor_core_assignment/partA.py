@@ -3,20 +3,20 @@ from typing import List
 from algos.core_strategy import check_satisfy_all_core_strategies
 from algos.executor_core_assignment.partC import (
     assign_lowest_utilization_core, merge_all_executors_containing_core)
-from components.callback import CallBack
-from components.chain import Chain
-from components.core import Core, sort_core_by_utilization
-from components.executor import Executor, sort_executors_by_priority
-from components.node import Node, exclude_lowest_priority_in_nodes
+from components.core import Core
+from components.executor import Executor
+from components.node import Node
+from components.node_worklist import NodeSelection, NodeWorklist
+from components.resource_pool import CorePool, FreeExecutorPool
+from components.system_model import SystemModel
+from components.transaction import AssignmentTransaction
 
 
 def partA_assignment(
-    not_assigned_nodes: List[Node],
+    not_assigned_nodes: NodeWorklist,
     selected_nodes: List[Node],
-    executors: List[Executor],
-    cores: List[Core],
-    chains: List[Chain],
-) -> List[Node]:
+    system: SystemModel,
+) -> NodeWorklist:
     """
     選択されたノードを適切なエグゼキューターに、そのエグゼキューターを適切なコアを割り当てる
     まだ割り当てられていないノードを更新して返す
@@ -24,87 +24,100 @@ def partA_assignment(
     Args:
         not_assigned_nodes: まだ割り当てられていないノード
         selected_nodes: 選択されたノードのサブセット
-        executors: エグゼキューターの集合
-        cores: コアの集合
+        system: システム全体のコンポーネント
 
     Returns:
         not_assigned_nodes: まだ割り当てられていないノード
     """
-    selected_executor = _select_executor(executors)  # 今回割り当てるエグゼキューターを決定
+    cores = system.cores
+    trace = system.trace
+    selected_executor = _select_executor(system.free_executor_pool)  # 今回割り当てるエグゼキューターを決定
+    selection = NodeSelection(selected_nodes)  # 失敗した時にノードを除外していく
+    if trace.enabled:
+        trace.emit("partA_select_executor", executor_id=selected_executor.executor_id)
 
     # 割り当てが終了するまでループ
+    # NOTE: 割り当てに失敗した場合はトランザクションで取り消すので、ループの先頭ではエグゼキューターは必ず空
+    transaction = AssignmentTransaction()
     is_complete_assign_exe_and_core = False
     while not is_complete_assign_exe_and_core:
-        # エグゼキューターの初期化 (空のエグゼキューターしかここでは登場しない)
-        selected_executor.reinitialization()
+        system.instrumentation.count("partA_iterations")
 
         # 割り当て可能なCPUコアを選択する
-        selected_cores = _select_cores(selected_executor, cores)
+        selected_cores = _select_cores(selected_executor, system.core_pool)
+        if trace.enabled:
+            trace.emit(
+                "partA_candidate_cores",
+                node_ids=[node.node_id for node in selection.nodes()],
+                core_ids=[core.core_id for core in selected_cores],
+            )
         
         # 割り当てるべきコアがない場合
         if len(selected_cores) == 0:
-            if len(selected_nodes) > 1:
+            if len(selection) > 1:
                 # 選択されたノードの中で最も低いコールバックを含むノードを除去して再挑戦
-                selected_nodes = exclude_lowest_priority_in_nodes(selected_nodes)
+                excluded_node = selection.exclude_lowest_priority()
+                if trace.enabled:
+                    trace.emit("partA_exclude_node", node_ids=[excluded_node.node_id])
+                system.instrumentation.count("partA_node_exclusions")
                 continue
             else:
                 # 一つしかノードがない場合はPartCで無理やり割り当てる
-                assign_lowest_utilization_core(selected_nodes[0], cores)
+                selected_nodes = selection.nodes()
+                assign_lowest_utilization_core(selected_nodes[0], cores, trace)
+                system.num_partC_fallbacks += 1
+                system.instrumentation.count("partC_assign_lowest_utilization_core")
                 is_complete_assign_exe_and_core = True
                 break  # 無理やりコアに割り当てられたのでwhileループ終了
         
         # 選択されたノードを一旦エグゼキューターに割り当てる
+        selected_nodes = selection.nodes()
         callbacks = [cb for node in selected_nodes for cb in node.callbacks]
-        selected_executor.assign_callbacks(callbacks)
+        transaction.begin()
+        transaction.assign_callbacks(selected_executor, callbacks)
 
         # 利用率の小さい順に走査して、エグゼキューターをコアに割り当てる
-        selected_cores = sort_core_by_utilization(selected_cores)
+        # NOTE: selected_coresは既に利用率の昇順に並んでいる
         for core in selected_cores:
-            if check_satisfy_all_core_strategies(core, [selected_executor], executors, chains):
-                core.assign_executor(selected_executor)  # 割り当て
+            if check_satisfy_all_core_strategies(core, [selected_executor], system):
+                transaction.assign_executor(core, selected_executor)  # 割り当て
+                transaction.commit()  # 割り当てを確定
+                if trace.enabled:
+                    trace.emit("partA_assign", executor_id=selected_executor.executor_id, core_id=core.core_id)
                 is_complete_assign_exe_and_core = True
                 break
         
         if is_complete_assign_exe_and_core:
             break  # 割り当てられたのでwhileループ終了
         else:
+            # エグゼキューター->コアの割り当て失敗
+            # エグゼキューターへの仮の割り当てを取り消す (コールバックの割り当て先も元に戻る)
+            transaction.rollback()
+            system.instrumentation.count("partA_rollbacks")
+
             # 実行可能なコアは見つかったが戦略を満たせない場合、
             # コア内のエグゼキューターを一つに集約して戦略を必ず満たせるようにする
             target_core = selected_cores[0]  # 最も利用率の低いコア
-            merge_all_executors_containing_core(target_core)
-
-            # エグゼキューター->コアの割り当て失敗
-            selected_executor.reinitialization()  # エグゼキューターの初期化
+            merge_all_executors_containing_core(target_core, trace)
+            system.num_partC_fallbacks += 1
+            system.instrumentation.count("partC_merge_all_executors_containing_core")
             is_complete_assign_exe_and_core = False
             break  # 失敗
 
     if is_complete_assign_exe_and_core:
         # エグゼキューターに割り当てられたノードを、割り当てられていないノードリストからpop
-        not_assigned_nodes = [node for node in not_assigned_nodes if node not in selected_nodes]
+        not_assigned_nodes.remove_all(selected_nodes)
 
     return not_assigned_nodes
 
 
-def _select_executor(executors: List[Executor]) -> Executor:
+def _select_executor(free_executor_pool: FreeExecutorPool) -> Executor:
     """今回割り当てるエグゼキューター (最も優先度の高い空のエグゼキューター) を決定
     NOTE: partAに入る前にチェックしているので必ず空のエグゼキューターが存在する
     """
-    # 優先度の高い順番に走査して、空のエグゼキューターを見つける
-    executors = sort_executors_by_priority(executors, is_decending=True)
-    for exe in executors:
-        if len(exe.callbacks) == 0:  # 空のエグゼキューター
-            return exe
-
-def _select_cores(executor: Executor, cores: List[Core]) -> List[Core]:
-    """エグゼキューターとコアの利用率が合計1以下のコアのみ選択"""
-    selected_core: List[Core] = []
-    for core in cores:
-        if executor.utilization + core.utilization <= 1:
-            selected_core.append(core)
-    
-    if len(selected_core) != 0:
-        # 利用率でソート
-        selected_core = sort_core_by_utilization(selected_core)
+    return free_executor_pool.highest_priority()
 
-    return selected_core
+def _select_cores(executor: Executor, core_pool: CorePool) -> List[Core]:
+    """エグゼキューターとコアの利用率が合計1以下のコアのみ選択 (利用率の昇順)"""
+    return core_pool.cores_fitting(executor.utilization)
 
@@ -4,13 +4,14 @@ from algos.core_strategy import check_satisfy_all_core_strategies
 from algos.executor_core_assignment.partC import (
     assign_lowest_utilization_core, merge_all_executors_containing_core)
 from algos.executor_strategy import check_satisfy_all_executor_strategies
-from components.chain import Chain
-from components.core import Core
 from components.executor import Executor, sort_executors_by_utilization
-from components.node import Node, sort_nodes_by_highest_priority
+from components.node import Node
+from components.node_worklist import NodeSelection, NodeWorklist
+from components.resource_pool import CorePool
+from components.system_model import SystemModel
 
 
-def partB_assignment(not_assigned_nodes: List[Node], selected_nodes: List[Node], executors: List[Executor], cores: List[Core], chains: List[Chain]) -> List[Node]:
+def partB_assignment(not_assigned_nodes: NodeWorklist, selected_nodes: List[Node], system: SystemModel) -> NodeWorklist:
     """
     選択されたノードを適切なエグゼキューターに割り当てる
     まだ割り当てられていないノードを更新して返す
@@ -18,43 +19,61 @@ def partB_assignment(not_assigned_nodes: List[Node], selected_nodes: List[Node],
     Args:
         not_assigned_nodes: まだ割り当てられていないノード
         selected_nodes: 選択されたノードのサブセット
-        executors: エグゼキューターの集合
-        cores: コアの集合
-        chain: チェインの集合
+        system: システム全体のコンポーネント
 
     Returns:
         not_assigned_nodes: まだ割り当てられていないノード
     """
+    cores = system.cores
+    trace = system.trace
+    selection = NodeSelection(selected_nodes)  # 失敗した時にノードを除外していく
+
     # 割り当てが終了するまでループ
     is_complete_assign_exe = False
     while not is_complete_assign_exe:
+        system.instrumentation.count("partB_iterations")
+
         # ノードとの利用率の合計が1以下のコア に含まれているエグゼキューターを抽出
-        selected_executors = _select_executors(selected_nodes, cores)
+        selected_executors = _select_executors(selection, system.core_pool)
+        if trace.enabled:
+            trace.emit(
+                "partB_candidate_executors",
+                node_ids=[node.node_id for node in selection.nodes()],
+                executor_ids=[exe.executor_id for exe in selected_executors],
+            )
 
         # 割り当てるべきコアがない場合
         if len(selected_executors) == 0:
-            if len(selected_nodes) > 1:
+            if len(selection) > 1:
                 # 選択するノードを減らして再挑戦
-                selected_nodes = sort_nodes_by_highest_priority(selected_nodes, is_decending=True)  # 最も高い優先度を降順でソート
-                selected_nodes = selected_nodes[:-1]
+                # NOTE: 選択されたノードは最も高い優先度の降順に並んでいるので、末尾のノードを除外する
+                excluded_node = selection.exclude_last()
+                if trace.enabled:
+                    trace.emit("partB_exclude_node", node_ids=[excluded_node.node_id])
+                system.instrumentation.count("partB_node_exclusions")
                 continue
             else:
                 # 一つしかノードがない場合はPart Cで無理やり割り当てる
-                assign_lowest_utilization_core(selected_nodes[0], cores)
+                assign_lowest_utilization_core(selection.nodes()[0], cores, trace)
+                system.num_partC_fallbacks += 1
+                system.instrumentation.count("partC_assign_lowest_utilization_core")
                 is_complete_assign_exe = True  # 無理やりコアに割り当てられたのでwhileループ終了
                 break
 
         # 利用率が小さい順に走査して、ノードをエグゼキューターに割り当てる
+        selected_nodes = selection.nodes()
         selected_executors = sort_executors_by_utilization(selected_executors)
         for exe in selected_executors:
             # exeが割り当てられているコア
-            core_assigned_exe = [core for core in cores if core.core_id == exe.assigned_core_id][0]
+            core_assigned_exe = system.get_core(exe.assigned_core_id)
             if (
-                check_satisfy_all_executor_strategies(exe, selected_nodes, chains)
-                and check_satisfy_all_core_strategies(core_assigned_exe, [exe], executors, chains)
+                check_satisfy_all_executor_strategies(exe, selected_nodes, system)
+                and check_satisfy_all_core_strategies(core_assigned_exe, [exe], system)
             ):
                 callbacks = [cb for node in selected_nodes for cb in node.callbacks]
                 exe.assign_callbacks(callbacks) # 割り当て
+                if trace.enabled:
+                    trace.emit("partB_assign", executor_id=exe.executor_id, core_id=core_assigned_exe.core_id)
                 is_complete_assign_exe = True
                 break  # 割り当て完了
         
@@ -63,23 +82,25 @@ def partB_assignment(not_assigned_nodes: List[Node], selected_nodes: List[Node],
         else:
             # どのエグゼキューターにも割り当てれれなかった場合、PartCで無理やり割り当てる
             # 最も利用率の低いエグゼキューターを含むコア
-            target_core = [core for core in cores if core.core_id == selected_executors[0].assigned_core_id][0]
-            merge_all_executors_containing_core(target_core)
+            target_core = system.get_core(selected_executors[0].assigned_core_id)
+            merge_all_executors_containing_core(target_core, trace)
+            system.num_partC_fallbacks += 1
+            system.instrumentation.count("partC_merge_all_executors_containing_core")
             is_complete_assign_exe = True
             break  # 無理やりコアに割り当てられたのでwhileループ終了
 
     # エグゼキューターに割り当てられたノードは割り当てられていないノードリストからpop
-    not_assigned_nodes = [node for node in not_assigned_nodes if node not in selected_nodes]
+    not_assigned_nodes.remove_all(selection.nodes())
 
     return not_assigned_nodes
 
-def _select_executors(selected_nodes: List[Node], cores: List[Core]) -> List[Executor]:
+def _select_executors(selection: NodeSelection, core_pool: CorePool) -> List[Executor]:
     """ノードとの利用率の合計が1以下のコア に含まれているエグゼキューターを抽出"""
     selected_executors = []
 
-    selected_nodes_utilization = sum([node.utilization for node in selected_nodes])
-    for core in cores:
-        if (selected_nodes_utilization + core.utilization) <= 1:  
-            selected_executors.extend(core.executors)  # コアに割り当てられているエグゼキューターを追加
+    # NOTE: 後で利用率で安定ソートするので、利用率が同じエグゼキューターの順番が変わらないようにコアid順に並べる
+    fitting_cores = sorted(core_pool.cores_fitting(selection.utilization), key=lambda core: core.core_id)
+    for core in fitting_cores:
+        selected_executors.extend(core.executors)  # コアに割り当てられているエグゼキューターを追加
  
     return selected_executors
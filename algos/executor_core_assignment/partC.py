@@ -1,11 +1,12 @@
 from typing import List
 
 from components.core import Core, sort_core_by_utilization
+from components.decision_trace import DISABLED_TRACE, DecisionTrace
 from components.executor import Executor, sort_executors_by_priority
 from components.node import Node
 
 
-def assign_lowest_utilization_core(selected_node: Node, cores: List[Core]):
+def assign_lowest_utilization_core(selected_node: Node, cores: List[Core], trace: DecisionTrace = DISABLED_TRACE):
     """最も優先度の低いコアに割り当てる
     
     (利用率が1以下のコアが見つからなかった) and (ノードが一つである) 場合に呼ばれる
@@ -29,12 +30,18 @@ def assign_lowest_utilization_core(selected_node: Node, cores: List[Core]):
     # 一時的なエグゼキューターを最も優先度の低いコアに割り当てる
     # NOTE: 次の関数でエグゼキューターは一つにまとめらる
     lowest_utilization_core.assign_executor(temp_executor)
+    if trace.enabled:
+        trace.emit(
+            "partC_assign_lowest_utilization_core",
+            node_id=selected_node.node_id,
+            core_id=lowest_utilization_core.core_id,
+        )
 
     # エグゼキューターを一つにまとめる
-    merge_all_executors_containing_core(lowest_utilization_core)
+    merge_all_executors_containing_core(lowest_utilization_core, trace)
 
 
-def merge_all_executors_containing_core(target_core: Core):
+def merge_all_executors_containing_core(target_core: Core, trace: DecisionTrace = DISABLED_TRACE):
     """コアに含まれる全てのエグゼキューターを一つのエグゼキューターにマージする
     
     実行可能なコアが見つかったが、戦略を満たさなかった場合に呼ばれる
@@ -42,13 +49,20 @@ def merge_all_executors_containing_core(target_core: Core):
     # 唯一残すエグゼキューター (最も優先度の低いエグゼキューター)
     merge_target_executor = sort_executors_by_priority(target_core.executors)[0]
 
+    # 残すエグゼキューター以外
+    merged_executors = [exe for exe in target_core.executors if exe.executor_id != merge_target_executor.executor_id]
+    if trace.enabled:
+        trace.emit(
+            "partC_merge_all_executors_containing_core",
+            core_id=target_core.core_id,
+            target_executor_id=merge_target_executor.executor_id,
+            merged_executor_ids=[exe.executor_id for exe in merged_executors],
+        )
+
     # 残すエグゼキューターに全てのコールバックを集約させる
-    for exe in target_core.executors:
-        if exe.executor_id == merge_target_executor.executor_id:
-            continue  # 残すエグゼキューターは無視
-        
-        # 残すエグゼキューターにコールバックを移す
-        merge_target_executor.assign_callbacks(exe.callbacks)
+    # NOTE: 各エグゼキューターのコールバックは優先度でソート済みなので、まとめてk-way mergeする
+    merge_target_executor.assign_sorted_callback_lists([exe.callbacks for exe in merged_executors])
+    for exe in merged_executors:
         exe.reinitialization()  # エグゼキューターの初期化
 
     # コアに再割り当てさせる
@@ -1,20 +1,52 @@
-import itertools
-from typing import List
+from typing import List, Tuple
 
 from components.callback import CallBack, sort_cb_by_id
 from components.chain import Chain
 from components.executor import Executor
 from components.node import Node
+from components.system_model import SystemModel
 
 
-def check_satisfy_all_executor_strategies(executor: Executor, assigned_nodes: List[Node], chains: List[Chain]) -> bool:
+def check_satisfy_all_executor_strategies(executor: Executor, assigned_nodes: List[Node], system: SystemModel) -> bool:
     """
     戦略 I, II, III, IV を満たすかどうか
     Args:
         executor: 割り当てるエグゼキューター
         assigned_nodes: コアに割り当てられる予定のノード
-        chain: チェインの集合
+        system: システム全体のコンポーネント
     """
+    system.instrumentation.count("executor_strategy_checks")
+
+    # 同じ内容のエグゼキューターとノードの組み合わせは以前の結果を使う
+    # NOTE: 戦略I〜IVはコールバックとチェインの優先度だけで決まり、それらは割り当て中に変わらない
+    cache = system.strategy_cache
+    cache_key = None
+    cached = None
+    if cache.enabled:
+        cache_key = ("executor", executor.version, tuple([node.node_id for node in assigned_nodes]))
+        cached = cache.get(cache_key)
+
+    if cached is not None:
+        strategy, res = cached
+    else:
+        strategy, res = _check_executor_strategies(executor, assigned_nodes, system)
+        if cache.enabled:
+            cache.put(cache_key, (strategy, res))
+
+    if system.trace.enabled:
+        system.trace.emit(
+            "executor_strategy_check",
+            executor_id=executor.executor_id,
+            node_ids=[node.node_id for node in assigned_nodes],
+            strategy=strategy,
+            satisfied=res,
+            cached=cached is not None,
+        )
+    return res
+
+
+def _check_executor_strategies(executor: Executor, assigned_nodes: List[Node], system: SystemModel) -> Tuple[str, bool]:
+    """戦略 I, II, III, IV のどれを使うか決めてチェックする (使った戦略と結果を返す)"""
     res = True
     all_callbacks = [cb for cb in executor.callbacks] + [cb for node in assigned_nodes for cb in node.callbacks]
     all_callbacks = list(set(all_callbacks))
@@ -26,40 +58,48 @@ def check_satisfy_all_executor_strategies(executor: Executor, assigned_nodes: Li
     is_contain_timer_callback = any([cb.is_timer_callback for cb in all_callbacks])
 
     if num_chains_containing_executor == 1:
+        chain = system.get_chain(all_callbacks[0].chain_id)
         if not is_contain_timer_callback:
-            res = _check_strategy_one(all_callbacks)
+            strategy = "I"
+            res = _check_strategy_one(all_callbacks, chain)
         else:
-            res = _check_strategy_two(all_callbacks)
+            strategy = "II"
+            res = _check_strategy_two(all_callbacks, chain)
     else:  # 複数のチェインが存在する場合
         if not is_contain_timer_callback:
-            res = _check_strategy_three(all_callbacks, chains)
+            strategy = "III"
+            res = _check_strategy_three(all_callbacks, system)
         else:
-            res = _check_strategy_four(all_callbacks, chains)
+            strategy = "IV"
+            res = _check_strategy_four(all_callbacks, system)
 
-    return res
+    return strategy, res
 
 
-def _check_strategy_one(all_regular_callbacks: List[CallBack]) -> bool:
+def _check_strategy_one(all_regular_callbacks: List[CallBack], chain: Chain) -> bool:
     """戦略 I を満たすかどうか
     
     優先度を比較して以下だったらTrue
     レギュラーコールバックの優先度がチェイン内の順序と逆に割り当てられている
+
+    NOTE: チェインのレギュラーコールバックが既にid順に並んでいれば、その部分集合も必ず並んでいるのでソートを省略する
     """
     res = True
-    all_regular_callbacks = sort_cb_by_id(all_regular_callbacks)
-    
-    # 隣同士の優先度を比較してどんどん大きくなっていっていればTrue
-    for i in range(len(all_regular_callbacks) - 1):
-        if all_regular_callbacks[i].priority > all_regular_callbacks[i+1].priority:
-            res = False
-            break  # これ以降のコールバックをチェックする必要ないのでbreak
+    if not chain.is_regular_id_ordered:
+        all_regular_callbacks = sort_cb_by_id(all_regular_callbacks)
+        
+        # 隣同士の優先度を比較してどんどん大きくなっていっていればTrue
+        for i in range(len(all_regular_callbacks) - 1):
+            if all_regular_callbacks[i].priority > all_regular_callbacks[i+1].priority:
+                res = False
+                break  # これ以降のコールバックをチェックする必要ないのでbreak
 
     # この戦略を満たさないことはあり得ないので一応確認 (for debug)
     _debug_unsatisfy(res, "I")
 
     return res
 
-def _check_strategy_two(all_callbacks: List[CallBack]) -> bool:
+def _check_strategy_two(all_callbacks: List[CallBack], chain: Chain) -> bool:
     """戦略 II を満たすかどうか
     
     優先度を比較して以下だったらTrue
@@ -69,20 +109,21 @@ def _check_strategy_two(all_callbacks: List[CallBack]) -> bool:
     """
     # チェイン内のコールバックを分類する
     # NOTE: 一つのチェインにtcbは一つしかない
-    timer_callback = [cb for cb in all_callbacks if cb.is_timer_callback][0]
+    timer_callback = chain.timer_callback
     regular_callbacks = [cb for cb in all_callbacks if not cb.is_timer_callback]
 
     # 戦略IIは以下を満たせばTrue
     # (タイマーコールバックの優先度) < (レギュラーコールバック優先度の最小値)
+    # NOTE: チェイン全体で満たしていれば、その部分集合でも必ず満たす
     priority_tcb = timer_callback.priority
-    min_priority_rcb = min([cb.priority for cb in regular_callbacks])
-    if priority_tcb < min_priority_rcb:
+    if _is_chain_satisfy_strategy_two(chain) or len(regular_callbacks) == 0:
         is_satisfy_strategy_two = True
     else:
-        is_satisfy_strategy_two = False
+        min_priority_rcb = min([cb.priority for cb in regular_callbacks])
+        is_satisfy_strategy_two = priority_tcb < min_priority_rcb
 
     # レギュラーコールバックについては戦略Iをチェックする
-    is_satisfy_strategy_one = _check_strategy_one(regular_callbacks)
+    is_satisfy_strategy_one = _check_strategy_one(regular_callbacks, chain)
 
     # この戦略を満たさないことはあり得ないので一応確認 (for debug)
     _debug_unsatisfy(is_satisfy_strategy_one, "I in II")
@@ -90,7 +131,7 @@ def _check_strategy_two(all_callbacks: List[CallBack]) -> bool:
 
     return is_satisfy_strategy_one and is_satisfy_strategy_two
 
-def _check_strategy_three(all_callbacks: List[CallBack], chains: List[Chain]) -> bool:
+def _check_strategy_three(all_callbacks: List[CallBack], system: SystemModel) -> bool:
     """戦略 III を満たすかどうか
     
     任意の二つのチェーンについて、優先度を比較して以下だったらTrue
@@ -99,101 +140,122 @@ def _check_strategy_three(all_callbacks: List[CallBack], chains: List[Chain]) ->
     (低優先度のチェイン内のコールバック優先度の最大値) < (高優先度のチェイン内のコールバック優先度の最小値)
     
     ※各チェーンのコールバックの優先度の割り当ては戦略Iに従う
+
+    全ての組み合わせを調べる代わりに、チェインを優先度の低い順に並べて走査する
+    (それまでのチェインのコールバック優先度の最大値の最大値) < (今のチェインのコールバック優先度の最小値) が全てのチェインで成り立てばよい
     """
     res = True
-    chains_id_containing_executor = list(set([cb.chain_id for cb in all_callbacks]))
-    chains_containing_executor = [chain for chain in chains if chain.chain_id in chains_id_containing_executor]
-    num_chains_containing_executor = len(chains_containing_executor)
-
-    # チェインの全ての組み合わせ
-    patterns = list(itertools.combinations(range(num_chains_containing_executor), r=2))
-    for chain_id_i, chain_id_j in patterns:
-        chain_i = chains_containing_executor[chain_id_i]
-        chain_j = chains_containing_executor[chain_id_j]
-
-        # 優先度の高低
-        low_priority_chain = chain_i if chain_i.priority < chain_j.priority else chain_j
-        high_priority_chain = chain_i if chain_i.priority >= chain_j.priority else chain_j
-
-        # 低優先度のチェイン(lpchain)内のコールバック優先度の最大値
-        max_cb_priority_containing_lpchain = max([cb.priority for cb in all_callbacks])
-        # 高優先度のチェイン(hpchain)内のコールバック優先度の最小値
-        min_cb_priority_containing_hpchain = min([cb.priority for cb in all_callbacks])
+    chains_containing_executor = _sort_chains_by_priority(all_callbacks, system)
 
+    # 低優先度のチェインから順に走査する
+    max_callback_priority_lower_chains = None  # これまでに見た低優先度のチェイン内のコールバック優先度の最大値
+    for chain in chains_containing_executor:
         # 戦略IIIのチェック
-        if max_cb_priority_containing_lpchain < min_cb_priority_containing_hpchain:
-            is_satisfy_strategy_three = True
-        else:
-            is_satisfy_strategy_three = False
-
-
-        # 各チェインのレギュラーコールバックについては戦略Iをチェックする
-        is_satisfy_strategy_one = (
-            _check_strategy_one([cb for cb in low_priority_chain.callbacks])  # rcb in lpchain
-            and _check_strategy_one([cb for cb in high_priority_chain.callbacks])  # rcb in hpchain
+        # (低優先度のチェイン(lpchain)内のコールバック優先度の最大値) < (高優先度のチェイン(hpchain)内のコールバック優先度の最小値)
+        is_satisfy_strategy_three = (
+            max_callback_priority_lower_chains is None
+            or max_callback_priority_lower_chains < chain.min_callback_priority
         )
 
-        res = res and is_satisfy_strategy_one and is_satisfy_strategy_three
+        # 各チェインのコールバックについては戦略Iをチェックする
+        is_satisfy_strategy_one = chain.is_id_ordered
+
+        res = is_satisfy_strategy_one and is_satisfy_strategy_three
         if not res:
             # この戦略を満たさないことはあり得ないので一応確認 (for debug)
             _debug_unsatisfy(is_satisfy_strategy_one, "I in III")
-            _debug_unsatisfy(is_satisfy_strategy_three, "III")    
+            _debug_unsatisfy(is_satisfy_strategy_three, "III")
             break  # これ以降のチェインをチェックする必要ないのでbreak
 
+        if max_callback_priority_lower_chains is None:
+            max_callback_priority_lower_chains = chain.max_callback_priority
+        else:
+            max_callback_priority_lower_chains = max(max_callback_priority_lower_chains, chain.max_callback_priority)
+
     return res
 
-def _check_strategy_four(all_callbacks: List[CallBack], chains: List[Chain]) -> bool:
+def _check_strategy_four(all_callbacks: List[CallBack], system: SystemModel) -> bool:
     """戦略 IV を満たすかどうか
     
     任意の二つのチェーンについて、優先度を比較して以下だったらTrue
     (低優先度のチェイン内のタイマーコールバック優先度) < (高優先度のチェイン内のタイマーコールバック優先度)
     
     ※各チェーンは個別に戦略IIに従う
+
+    全ての組み合わせを調べる代わりに、チェインを優先度の低い順に並べて走査する
+    (一つ前のチェインのタイマーコールバック優先度) < (今のチェインのタイマーコールバック優先度) が全てのチェインで成り立てばよい
     """
     res = True
-    chains_id_containing_executor = list(set([cb.chain_id for cb in all_callbacks]))
-    chains_containing_executor = [chain for chain in chains if chain.chain_id in chains_id_containing_executor]
-    num_chains_containing_executor = len(chains_containing_executor)
-
-    # チェインの全ての組み合わせ
-    patterns = list(itertools.combinations(range(num_chains_containing_executor), r=2))
-    for chain_id_i, chain_id_j in patterns:
-        chain_i = chains_containing_executor[chain_id_i]
-        chain_j = chains_containing_executor[chain_id_j]
-
-        # 優先度の高低
-        low_priority_chain = chain_i if chain_i.priority < chain_j.priority else chain_j
-        high_priority_chain = chain_i if chain_i.priority >= chain_j.priority else chain_j
-
-        # 各チェイン内のタイマーコールバック
-        # NOTE: タイマーコールバックは各チェインに一つしかない
-        tcb_containing_lpchain = [cb for cb in low_priority_chain.callbacks if cb.is_timer_callback][0]
-        tcb_containing_hpchain = [cb for cb in high_priority_chain.callbacks if cb.is_timer_callback][0]
-        
-        # 戦略IVのチェック
-        if tcb_containing_lpchain.priority < tcb_containing_hpchain.priority:
-            is_satisfy_strategy_four = True
-        else:
-            is_satisfy_strategy_four = False
+    chains_containing_executor = _sort_chains_by_priority(all_callbacks, system)
 
+    # 低優先度のチェインから順に走査する
+    # NOTE: タイマーコールバックは各チェインに一つしかない
+    tcb_containing_lower_chain = None  # 一つ前の (低優先度の) チェイン内のタイマーコールバック
+    for chain in chains_containing_executor:
+        # 戦略IVのチェック
+        is_satisfy_strategy_four = (
+            tcb_containing_lower_chain is None
+            or tcb_containing_lower_chain.priority < chain.timer_callback.priority
+        )
 
         # 各チェインのチェックは戦略IIをチェックする
-        is_satisfy_strategy_two = (
-            _check_strategy_two([cb for cb in low_priority_chain.callbacks])  # lpchain
-            and _check_strategy_two([cb for cb in high_priority_chain.callbacks])  # hpchain
-        )
-        
-        
-        res = res and is_satisfy_strategy_two and is_satisfy_strategy_four
+        is_satisfy_strategy_two = _is_chain_satisfy_strategy_two(chain)
+
+        res = is_satisfy_strategy_two and is_satisfy_strategy_four
         if not res:
             # この戦略を満たさないことはあり得ないので一応確認 (for debug)
             _debug_unsatisfy(is_satisfy_strategy_two, "II in IV")
-            _debug_unsatisfy(is_satisfy_strategy_four, "IV")    
+            _debug_unsatisfy(is_satisfy_strategy_four, "IV")
             break  # これ以降のチェインをチェックする必要ないのでbreak
 
+        tcb_containing_lower_chain = chain.timer_callback
+
     return res
 
 
+def _sort_chains_by_priority(all_callbacks: List[CallBack], system: SystemModel) -> List[Chain]:
+    """コールバックを含むチェインを優先度の低い順に並べる
+    NOTE: 優先度が同じ場合はチェインidの大きい方を低優先度として扱う (全組み合わせを調べていた時と同じ)
+    """
+    chains = system.get_chains([cb.chain_id for cb in all_callbacks])
+    return sorted(chains, key=lambda chain: (chain.priority, -chain.chain_id))
+
+
+def is_chain_pair_satisfy_strategy_three(low_priority_chain: Chain, high_priority_chain: Chain) -> bool:
+    """二つのチェインが戦略 III (と各チェインの戦略 I) を満たすかどうか
+
+    戦略IIIを満たすチェインの集合を優先度の順に並べると、隣同士が満たしていれば全ての組み合わせが満たすので、
+    チェインを足した場合は、足したチェインとその両隣だけを調べればよい (局所探索で使う)
+    """
+    return (
+        low_priority_chain.is_id_ordered
+        and high_priority_chain.is_id_ordered
+        and low_priority_chain.max_callback_priority < high_priority_chain.min_callback_priority
+    )
+
+
+def is_chain_pair_satisfy_strategy_four(low_priority_chain: Chain, high_priority_chain: Chain) -> bool:
+    """二つのチェインが戦略 IV (と各チェインの戦略 II) を満たすかどうか
+    NOTE: is_chain_pair_satisfy_strategy_three()と同じく、隣同士だけを調べる場合に使う
+    """
+    return (
+        _is_chain_satisfy_strategy_two(low_priority_chain)
+        and _is_chain_satisfy_strategy_two(high_priority_chain)
+        and low_priority_chain.timer_callback.priority < high_priority_chain.timer_callback.priority
+    )
+
+
+def _is_chain_satisfy_strategy_two(chain: Chain) -> bool:
+    """チェイン全体が戦略 II (と戦略 I) を満たすかどうか
+    チェインにキャッシュされている要約だけで判定する
+    """
+    if not chain.is_regular_id_ordered:
+        return False
+    if chain.min_regular_callback_priority is None:
+        return True  # レギュラーコールバックがない
+    return chain.timer_callback.priority < chain.min_regular_callback_priority
+
+
 def _debug_unsatisfy(flag: bool, strategy_number: int) -> None:
     """この戦略を満たさないことはあり得ないのでfalseになったら例外投げる"""
     if not flag:
@@ -0,0 +1,323 @@
+"""エグゼキューターとコアの割り当て結果の離散イベントシミュレーション
+
+割り当て後のコールバック、エグゼキューター、コアの状態から実際の実行を模擬して、
+チェインごとの観測されたレイテンシ (ヒストグラム) とデッドラインミス、コアごとのビジー時間を求める
+(chain_latency.pyの解析による上界に対して、実際にどれくらいになるかを確かめるために使う)
+
+- チェインのタイマーコールバックは時刻0から周期ごとにリリースされる (全てのチェインが同時にリリースされる最悪の場合)
+- レギュラーコールバックは、チェインの一つ前のコールバック (id順) が終わった時にリリースされる
+- エグゼキューターは、実行中のコールバックがなければ、リリースされたコールバックから優先度が最も高いものを選んで最後まで実行する
+- コアは、実行できるエグゼキューターの中で優先度が最も高いものを実行する (優先度の高いエグゼキューターはプリエンプトする)
+- チェインのレイテンシは、タイマーコールバックのリリースから最後のコールバックが終わるまでの時間
+
+イベント (タイマーのリリース、コールバックの終了) は時刻順のヒープで処理する
+プリエンプトされたコアの終了イベントは、コアごとのトークンで無効にしてヒープからは取り出す時に捨てる
+同じ時刻のイベントを全て処理してから、変化があったコアでエグゼキューターを選び直す
+"""
+import heapq
+import math
+from typing import Any, Dict, Iterator, List, Tuple
+
+from components.chain import Chain
+from components.system_model import SystemModel
+
+DEFAULT_MAX_HORIZON_PERIODS = 10  # ハイパーピリオドが長すぎる場合、最大の周期のこの倍で打ち切る
+NUM_BINS_PER_PERIOD = 10  # レイテンシのヒストグラムの、周期あたりのビンの数
+
+# 出力する表の列のタイトル
+SIMULATED_CHAIN_LATENCY_COLUMNS = ["chain_id", "period", "deadline", "num_instances", "num_deadline_misses", "min_latency", "mean_latency", "max_latency"]
+SIMULATED_LATENCY_HISTOGRAM_COLUMNS = ["chain_id", "bin_lower", "bin_upper", "count"]
+SIMULATED_CORE_BUSY_COLUMNS = ["core_id", "busy_time", "busy_ratio"]
+
+# イベントの種類 (同じ時刻ではコールバックの終了を先に処理する)
+_COMPLETION = 0
+_RELEASE = 1
+
+# エグゼキューターの待ち行列に入るジョブ: (-コールバックの優先度, 通し番号, チェインのindex, チェイン内の位置, チェインのリリース時刻)
+Job = Tuple[int, int, int, int, float]
+
+
+class ChainLatencyStats:
+    """一つのチェインの観測されたレイテンシの統計 (全てのサンプルは持たずに、ヒストグラムに数える)"""
+    __slots__ = ("chain_id", "period", "deadline", "num_instances", "num_deadline_misses", "min_latency", "max_latency", "sum_latency", "bin_width", "bins")
+
+    def __init__(self, chain_id: int, period: float, deadline: float = None):
+        self.chain_id: int = chain_id  # チェインid
+        self.period: float = period  # 周期
+        self.deadline: float = deadline if deadline is not None else period  # 相対デッドライン
+        self.num_instances: int = 0  # 最後まで実行されたインスタンスの数
+        self.num_deadline_misses: int = 0  # デッドラインを過ぎたインスタンスの数 (終わらなかったものも含む)
+        self.min_latency: float = None
+        self.max_latency: float = None
+        self.sum_latency: float = 0
+        self.bin_width: float = period / NUM_BINS_PER_PERIOD  # ヒストグラムのビンの幅
+        self.bins: Dict[int, int] = {}  # ビンの番号 -> インスタンスの数 (0のビンは持たない)
+
+    def add(self, latency: float) -> None:
+        """最後まで実行されたインスタンスのレイテンシを加える"""
+        self.num_instances += 1
+        if latency > self.deadline:
+            self.num_deadline_misses += 1
+        self.min_latency = latency if self.min_latency is None else min(self.min_latency, latency)
+        self.max_latency = latency if self.max_latency is None else max(self.max_latency, latency)
+        self.sum_latency += latency
+        index = int(latency // self.bin_width)
+        self.bins[index] = self.bins.get(index, 0) + 1
+
+    @property
+    def mean_latency(self) -> float:
+        return self.sum_latency / self.num_instances if self.num_instances != 0 else None
+
+    def histogram(self) -> List[Tuple[float, float, int]]:
+        """(ビンの下端, ビンの上端, インスタンスの数) のリスト (下端の昇順)"""
+        return [(index * self.bin_width, (index + 1) * self.bin_width, self.bins[index]) for index in sorted(self.bins)]
+
+
+class SimulationResult:
+    """シミュレーションの結果"""
+    __slots__ = ("horizon", "chain_stats", "core_busy_times")
+
+    def __init__(self, horizon: float, chain_stats: List[ChainLatencyStats], core_busy_times: Dict[int, float]):
+        self.horizon: float = horizon  # シミュレーションした時間
+        self.chain_stats: List[ChainLatencyStats] = chain_stats  # チェインごとのレイテンシの統計 (チェインid順)
+        self.core_busy_times: Dict[int, float] = core_busy_times  # コアid -> コールバックを実行していた時間
+
+    @property
+    def num_deadline_misses(self) -> int:
+        return sum([stats.num_deadline_misses for stats in self.chain_stats])
+
+    def tables(self) -> List[Tuple[str, List[str], Iterator[Tuple[Any, ...]]]]:
+        """出力する (表の名前, 列のタイトル, 行) のリスト (iostreams.writer.write_table()に渡す)"""
+        return [
+            ("simulated_chain_latency", SIMULATED_CHAIN_LATENCY_COLUMNS, self._chain_latency_rows()),
+            ("simulated_latency_histogram", SIMULATED_LATENCY_HISTOGRAM_COLUMNS, self._latency_histogram_rows()),
+            ("simulated_core_busy", SIMULATED_CORE_BUSY_COLUMNS, self._core_busy_rows()),
+        ]
+
+    def _chain_latency_rows(self) -> Iterator[Tuple[Any, ...]]:
+        for stats in self.chain_stats:
+            yield (
+                stats.chain_id, stats.period, stats.deadline, stats.num_instances, stats.num_deadline_misses,
+                stats.min_latency, stats.mean_latency, stats.max_latency,
+            )
+
+    def _latency_histogram_rows(self) -> Iterator[Tuple[Any, ...]]:
+        for stats in self.chain_stats:
+            for bin_lower, bin_upper, count in stats.histogram():
+                yield (stats.chain_id, bin_lower, bin_upper, count)
+
+    def _core_busy_rows(self) -> Iterator[Tuple[Any, ...]]:
+        for core_id in sorted(self.core_busy_times):
+            busy_time = self.core_busy_times[core_id]
+            yield (core_id, busy_time, busy_time / self.horizon if self.horizon > 0 else None)
+
+
+def simulation_horizon(system: SystemModel, max_horizon: float = None) -> float:
+    """シミュレーションする時間 (チェインの周期のハイパーピリオド, ただしmax_horizonで打ち切る)
+
+    Args:
+        max_horizon: Noneの場合は最大の周期のDEFAULT_MAX_HORIZON_PERIODS倍
+    """
+    periods = [chain.callbacks[0].period for chain in system.chains]
+    if len(periods) == 0:
+        return 0
+    if max_horizon is None:
+        max_horizon = max(periods) * DEFAULT_MAX_HORIZON_PERIODS
+    if not all([float(period).is_integer() for period in periods]):
+        return max_horizon  # 周期が整数でなければハイパーピリオドは求めない
+
+    hyperperiod = 1
+    for period in set([int(period) for period in periods]):
+        hyperperiod = math.lcm(hyperperiod, period)
+        if hyperperiod >= max_horizon:
+            return max_horizon
+    return hyperperiod
+
+
+def simulate_schedule(system: SystemModel, horizon: float = None) -> SimulationResult:
+    """割り当て結果を [0, horizon) の間シミュレーションする
+    NOTE: エグゼキューターとコアの割り当ての後に呼び出す
+
+    Args:
+        horizon: シミュレーションする時間 (Noneの場合はsimulation_horizon())
+    """
+    if horizon is None:
+        horizon = simulation_horizon(system)
+    return _Simulator(system, horizon).run()
+
+
+class _ExecutorState:
+    """シミュレーション中のエグゼキューターの状態"""
+    __slots__ = ("priority", "core", "ready", "current", "remaining", "is_in_runnable_heap")
+
+    def __init__(self, priority: int, core: "_CoreState"):
+        self.priority: int = priority
+        self.core: _CoreState = core
+        self.ready: List[Job] = []  # リリースされて実行を待っているジョブ (優先度のヒープ)
+        self.current: Job = None  # 実行中のジョブ (ノンプリエンプティブなので、終わるまで他のジョブは選ばない)
+        self.remaining: float = 0  # 実行中のジョブの残りの実行時間
+        self.is_in_runnable_heap: bool = False
+
+
+class _CoreState:
+    """シミュレーション中のコアの状態"""
+    __slots__ = ("core_id", "runnable", "running", "run_start", "token", "busy_time", "is_dirty")
+
+    def __init__(self, core_id: int):
+        self.core_id: int = core_id
+        self.runnable: List[Tuple[int, int, _ExecutorState]] = []  # 実行できるエグゼキューター (-優先度, 通し番号, 状態) のヒープ
+        self.running: _ExecutorState = None  # 実行中のエグゼキューター
+        self.run_start: float = 0  # 実行中のエグゼキューターが最後に実行時間を数えた時刻
+        self.token: int = 0  # 終了イベントが有効かどうかの判定用 (選び直すたびに増やす)
+        self.busy_time: float = 0
+        self.is_dirty: bool = False  # 同じ時刻のイベントの後で選び直すかどうか
+
+    def highest_runnable(self) -> _ExecutorState:
+        """実行できるエグゼキューターの中で優先度が最も高いもの (なければNone)"""
+        while len(self.runnable) != 0:
+            executor = self.runnable[0][2]
+            if executor.current is not None or len(executor.ready) != 0:
+                return executor
+            heapq.heappop(self.runnable)  # もう実行するジョブがない
+            executor.is_in_runnable_heap = False
+        return None
+
+
+class _Simulator:
+    def __init__(self, system: SystemModel, horizon: float):
+        self.system = system
+        self.horizon = horizon
+        self.events: List[tuple] = []  # (時刻, 種類, 通し番号 (終了イベントはトークン), 周期 (終了イベントはコアid)) のヒープ
+        self.seq = 0
+
+        self.cores: Dict[int, _CoreState] = {core.core_id: _CoreState(core.core_id) for core in system.cores}
+        self.executors: Dict[int, _ExecutorState] = {}
+        for core in system.cores:
+            for exe in core.executors:
+                self.executors[exe.executor_id] = _ExecutorState(exe.priority, self.cores[core.core_id])
+
+        # コアに割り当てられたチェインだけをシミュレーションする
+        self.chains: List[Chain] = sorted(system.chains, key=lambda chain: chain.chain_id)
+        self.chain_stats = [ChainLatencyStats(chain.chain_id, chain.get_period(), chain.get_deadline()) for chain in self.chains]
+        self.chain_steps: List[List[Tuple[_ExecutorState, int, float]]] = []  # チェインごとの (エグゼキューター, 優先度, 実行時間)
+        for chain in self.chains:
+            if all([cb.assigned_executor_id in self.executors for cb in chain.callbacks]):
+                steps = [(self.executors[cb.assigned_executor_id], cb.priority, cb.wcet) for cb in chain.callbacks]
+            else:
+                steps = None
+            self.chain_steps.append(steps)
+
+    def run(self) -> SimulationResult:
+        # NOTE: イベントの数はコールバックの数 x (horizon / 周期) になるので、ループの中ではメソッド呼び出しと属性の参照を減らす
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+        events = self.events
+        horizon = self.horizon
+        chain_steps = self.chain_steps
+        chain_stats = self.chain_stats
+        cores = self.cores
+
+        # 同じ周期のチェインは同じ時刻にリリースされるので、周期ごとにまとめて一つのイベントにする
+        release_groups: Dict[float, List[int]] = {}  # 周期 -> チェインのindex
+        for chain_index, steps in enumerate(chain_steps):
+            if steps is not None:
+                release_groups.setdefault(chain_stats[chain_index].period, []).append(chain_index)
+        for period in release_groups:
+            if horizon > 0:
+                self.seq += 1
+                heappush(events, (0, _RELEASE, self.seq, period))
+        releases: List[Tuple[int, int, float]] = []  # この時刻にリリースするコールバック (チェインのindex, チェイン内の位置, チェインのリリース時刻)
+
+        num_events = 0
+        while events and events[0][0] < horizon:
+            now = events[0][0]
+            dirty_cores: List[_CoreState] = []  # 選び直すコア
+            while events and events[0][0] == now:
+                _, kind, token, arg = heappop(events)
+                num_events += 1
+                if kind == _COMPLETION:
+                    core = cores[arg]
+                    if token != core.token:
+                        continue  # プリエンプトされて無効になった終了イベント
+                    # 実行中のコールバックが終わった
+                    executor = core.running
+                    _, _, chain_index, position, release_time = executor.current
+                    core.busy_time += now - core.run_start
+                    core.run_start = now
+                    executor.current = None
+                    executor.remaining = 0
+                    if not core.is_dirty:
+                        core.is_dirty = True
+                        dirty_cores.append(core)
+
+                    if position + 1 < len(chain_steps[chain_index]):
+                        releases.append((chain_index, position + 1, release_time))  # 次のコールバック
+                    else:
+                        chain_stats[chain_index].add(now - release_time)
+                else:
+                    # タイマーでチェインの新しいインスタンスをリリースし、次のリリースを予約する
+                    period = arg
+                    releases.extend([(chain_index, 0, now) for chain_index in release_groups[period]])
+                    next_release = now + period
+                    if next_release < horizon:
+                        self.seq += 1
+                        heappush(events, (next_release, _RELEASE, self.seq, period))
+
+            # リリースされたコールバックを、そのエグゼキューターの待ち行列に入れる
+            for chain_index, position, release_time in releases:
+                executor, priority, _ = chain_steps[chain_index][position]
+                self.seq += 1
+                heappush(executor.ready, (-priority, self.seq, chain_index, position, release_time))
+                core = executor.core
+                if not executor.is_in_runnable_heap:
+                    heappush(core.runnable, (-executor.priority, self.seq, executor))
+                    executor.is_in_runnable_heap = True
+                if core.is_dirty:
+                    continue
+                running = core.running
+                if running is None or running.current is None or executor.priority > running.priority:
+                    core.is_dirty = True  # 実行中のエグゼキューターより優先度が低ければ選び直しても変わらない
+                    dirty_cores.append(core)
+            releases.clear()
+
+            for core in dirty_cores:
+                core.is_dirty = False
+                self._dispatch(core, now)
+        self.system.instrumentation.count("simulation_events", num_events)
+
+        # 打ち切った時点で実行中のものの実行時間を数え、終わっていないインスタンスのデッドラインミスを数える
+        for core in self.cores.values():
+            if core.running is not None and core.running.current is not None:
+                core.busy_time += horizon - core.run_start
+        for executor in self.executors.values():
+            pending = executor.ready + ([executor.current] if executor.current is not None else [])
+            for _, _, chain_index, _, release_time in pending:
+                stats = chain_stats[chain_index]
+                if horizon - release_time > stats.deadline:
+                    stats.num_deadline_misses += 1
+
+        core_busy_times = {core_id: core.busy_time for core_id, core in self.cores.items()}
+        return SimulationResult(horizon, chain_stats, core_busy_times)
+
+    def _dispatch(self, core: _CoreState, now: float) -> None:
+        """コアで実行するエグゼキューターを選び直す"""
+        running = core.running
+        if running is not None and running.current is not None:
+            elapsed = now - core.run_start
+            running.remaining -= elapsed
+            core.busy_time += elapsed
+        core.run_start = now
+
+        executor = core.highest_runnable()
+        if executor is running and executor is not None and executor.current is not None:
+            return  # 実行中のまま変わらない (終了イベントもそのまま有効)
+
+        core.running = executor
+        core.token += 1
+        if executor is None:
+            return
+        if executor.current is None:
+            executor.current = heapq.heappop(executor.ready)  # 優先度が最も高いジョブを選ぶ
+            executor.remaining = self.chain_steps[executor.current[2]][executor.current[3]][2]
+        # NOTE: 終了イベントの通し番号の位置にはトークンを入れる (有効な終了イベントはコアごとに一つしかない)
+        heapq.heappush(self.events, (now + executor.remaining, _COMPLETION, core.token, core.core_id))
@@ -0,0 +1,207 @@
+"""複数の入力ファイルをプロセスプールでまとめてスケジューリングする
+
+Usage:
+    $ python batch.py "./data/generated/*.yaml" --output-dir ./data/batch_output --workers 8
+    $ python batch.py --manifest ./data/manifest.txt --output-dir ./data/batch_output
+
+入力ファイルごとに output_dir/<入力ファイル名>/ にcsvを出力し、
+全ての入力の要約を output_dir/summary.csv に出力する
+"""
+import argparse
+import csv
+import glob
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List
+
+from algos.callback_priority_assignment import DEFAULT_PRIORITY_POLICY, PRIORITY_POLICIES
+from algos.executor_core_assignment.local_search import DEFAULT_TIME_BUDGET as DEFAULT_LOCAL_SEARCH_TIME_BUDGET
+from iostreams.result_cache import ResultCache
+from run_progress import RunProgress
+
+SUMMARY_COLUMNS = [
+    "input_path",
+    "output_dir",
+    "status",
+    "feasible",
+    "max_core_utilization",
+    "num_partC_fallbacks",
+    "num_chain_deadline_misses",
+    "num_simulated_deadline_misses",
+    "runtime_sec",
+    "error",
+]
+
+
+def collect_input_paths(patterns: List[str], manifest_path: Path = None) -> List[Path]:
+    """globのパターンとマニフェスト (1行に1つの入力ファイル, #から始まる行は無視) から入力ファイルを集める"""
+    input_paths: List[Path] = []
+    for pattern in patterns:
+        input_paths.extend(Path(path) for path in sorted(glob.glob(pattern)))
+
+    if manifest_path is not None:
+        with open(manifest_path, "r") as manifest:
+            for line in manifest:
+                line = line.strip()
+                if len(line) == 0 or line.startswith("#"):
+                    continue
+                path = Path(line)
+                if not path.is_absolute():
+                    path = manifest_path.parent / path  # マニフェストからの相対パス
+                input_paths.append(path)
+
+    return input_paths
+
+
+def run_batch(
+    input_paths: List[Path],
+    output_dir: Path,
+    num_workers: int = None,
+    run_options: Dict[str, Any] = None,
+) -> List[Dict[str, Any]]:
+    """各入力ファイルに対してRunProgressをプロセスプールで実行し、要約をsummary.csvに出力する
+
+    ある入力で例外が起きても、他の入力の実行は続ける
+
+    Args:
+        input_paths: 入力ファイルのパス
+        output_dir: 出力ディレクトリ
+        num_workers: ワーカープロセスの数 (Noneの場合はCPUの数)
+        run_options: RunProgressに渡す追加の引数 (num_cpus, num_executors など)
+    """
+    output_dir.mkdir(exist_ok=True, parents=True)
+    run_options = run_options or {}
+    output_dirs = _output_dirs(input_paths, output_dir)
+
+    summaries: List[Dict[str, Any]] = [None] * len(input_paths)  # 入力の順番に並べる
+    num_finished = 0
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        futures = {
+            pool.submit(run_one, input_path, cur_output_dir, run_options): i
+            for i, (input_path, cur_output_dir) in enumerate(zip(input_paths, output_dirs))
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:  # ワーカープロセス自体が落ちた場合など
+                summary = _error_summary(input_paths[i], output_dirs[i], e, 0)
+            summaries[i] = summary
+            num_finished += 1
+            print(f"[{num_finished}/{len(futures)}] {input_paths[i]}: {summary['status']}")
+
+    _write_summary(output_dir / "summary.csv", summaries)
+    return summaries
+
+
+def run_one(input_path: Path, output_dir: Path, run_options: Dict[str, Any]) -> Dict[str, Any]:
+    """一つの入力ファイルをスケジューリングして要約を返す (ワーカープロセスで実行される)"""
+    start = time.perf_counter()
+    try:
+        run_progress = RunProgress(input_path, output_dir, **run_options)
+        run_progress.main_process()
+        summary = run_progress.summary()
+    except Exception as e:
+        return _error_summary(input_path, output_dir, e, time.perf_counter() - start)
+
+    return {
+        "input_path": str(input_path),
+        "output_dir": str(output_dir),
+        "status": "ok",
+        **summary,
+        "runtime_sec": time.perf_counter() - start,
+        "error": "",
+    }
+
+
+def _error_summary(input_path: Path, output_dir: Path, error: Exception, runtime_sec: float) -> Dict[str, Any]:
+    return {
+        "input_path": str(input_path),
+        "output_dir": str(output_dir),
+        "status": "error",
+        "feasible": None,
+        "max_core_utilization": None,
+        "num_partC_fallbacks": None,
+        "num_chain_deadline_misses": None,
+        "num_simulated_deadline_misses": None,
+        "runtime_sec": runtime_sec,
+        "error": " ".join(traceback.format_exception_only(type(error), error)).strip().replace("\n", " "),
+    }
+
+
+def _output_dirs(input_paths: List[Path], output_dir: Path) -> List[Path]:
+    """入力ファイルごとの出力ディレクトリ (ファイル名が重複する場合は番号を付ける)"""
+    output_dirs: List[Path] = []
+    used_names = set()
+    for input_path in input_paths:
+        name = input_path.stem
+        i = 1
+        while name in used_names:
+            name = f"{input_path.stem}_{i}"
+            i += 1
+        used_names.add(name)
+        output_dirs.append(output_dir / name)
+    return output_dirs
+
+
+def _write_summary(file_path: Path, summaries: List[Dict[str, Any]]) -> None:
+    with open(file_path, mode="w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=SUMMARY_COLUMNS)
+        writer.writeheader()
+        writer.writerows(summaries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="複数の入力ファイルをまとめてスケジューリングする")
+    parser.add_argument("patterns", nargs="*", help="入力ファイルのglobパターン")
+    parser.add_argument("--manifest", type=Path, default=None, help="入力ファイルを1行に1つ書いたファイル")
+    parser.add_argument("--output-dir", type=Path, default=Path("./data/batch_output/"))
+    parser.add_argument("--workers", type=int, default=None, help="ワーカープロセスの数 (省略時はCPUの数)")
+    parser.add_argument("--num-cpus", type=int, default=None, help="入力ファイルのnum_cpusの代わりに使う")
+    parser.add_argument("--num-executors", type=int, default=None, help="入力ファイルのnum_executorsの代わりに使う")
+    parser.add_argument("--instrument", action="store_true", help="入力ごとにinstrumentation.jsonを出力する")
+    parser.add_argument("--trace", action="store_true", help="入力ごとにdecision_trace.jsonlを出力する")
+    parser.add_argument("--output-format", choices=["csv", "parquet"], default="csv", help="結果の出力形式 (parquetはpyarrowが必要)")
+    parser.add_argument("--compress", action="store_true", help="結果をgzipで圧縮して出力する")
+    parser.add_argument("--result-cache-dir", type=Path, default=None, help="入力の内容をキーにして割り当て結果をキャッシュするディレクトリ")
+    parser.add_argument("--no-result-cache", action="store_true", help="キャッシュを読まずに割り当てを行う (結果も保存しない)")
+    parser.add_argument("--clear-result-cache", action="store_true", help="実行前にキャッシュを全て消す")
+    parser.add_argument("--simulate", action="store_true", help="割り当て結果をシミュレーションして観測されたレイテンシを出力する")
+    parser.add_argument("--simulation-horizon", type=float, default=None, help="シミュレーションする時間 (省略時はハイパーピリオド)")
+    parser.add_argument("--priority-policy", choices=PRIORITY_POLICIES, default=DEFAULT_PRIORITY_POLICY, help="コールバックの優先度の割り当て方")
+    parser.add_argument("--local-search", action="store_true", help="割り当ての後に局所探索でコアの利用率の最大値を小さくする")
+    parser.add_argument("--local-search-time-budget", type=float, default=DEFAULT_LOCAL_SEARCH_TIME_BUDGET, help="局所探索に使う時間の上限 (秒)")
+    args = parser.parse_args()
+
+    input_paths = collect_input_paths(args.patterns, args.manifest)
+    if len(input_paths) == 0:
+        parser.error("no input files")
+
+    if args.clear_result_cache and args.result_cache_dir is not None:
+        num_removed = ResultCache(args.result_cache_dir).clear()
+        print(f"removed {num_removed} entries from {args.result_cache_dir}")
+
+    run_options = {
+        "num_cpus": args.num_cpus,
+        "num_executors": args.num_executors,
+        "instrument": args.instrument,
+        "trace": args.trace,
+        "output_format": args.output_format,
+        "compress": args.compress,
+        "result_cache_dir": None if args.no_result_cache else args.result_cache_dir,
+        "simulate": args.simulate,
+        "simulation_horizon": args.simulation_horizon,
+        "priority_policy": args.priority_policy,
+        "local_search": args.local_search,
+        "local_search_time_budget": args.local_search_time_budget,
+    }
+    summaries = run_batch(input_paths, args.output_dir, args.workers, run_options)
+
+    num_errors = len([summary for summary in summaries if summary["status"] != "ok"])
+    print(f"{len(summaries) - num_errors} succeeded, {num_errors} failed")
+
+
+if __name__ == "__main__":
+    main()
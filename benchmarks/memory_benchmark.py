@@ -0,0 +1,55 @@
+"""コールバック1個あたりのメモリ使用量を計測する
+
+__slots__を使うCallBackと、同じ__init__を持つ__dict__ベースのクラスを比較する
+
+Usage:
+    $ python -m benchmarks.memory_benchmark --num-callbacks 100000
+"""
+import argparse
+import tracemalloc
+
+from components.callback import CallBack
+
+# __slots__を使う前と同じ、インスタンスごとに__dict__を持つCallBack
+DictCallBack = type("DictCallBack", (), {"__init__": CallBack.__init__})
+
+
+def measure_bytes_per_callback(callback_class: type, num_callbacks: int) -> float:
+    """callback_classのインスタンスをnum_callbacks個作った時の1個あたりのバイト数"""
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+
+    callbacks = [
+        callback_class(
+            callback_id=id,
+            wcet=1.5,
+            period=100 if id % 5 == 0 else 0,
+            node_id=id // 2,
+            chain_id=id // 5,
+            node_name="no_name",
+        )
+        for id in range(num_callbacks)
+    ]
+
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del callbacks
+    return (after - before) / num_callbacks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="コールバック1個あたりのメモリ使用量を計測する")
+    parser.add_argument("--num-callbacks", type=int, default=100000)
+    args = parser.parse_args()
+
+    dict_bytes = measure_bytes_per_callback(DictCallBack, args.num_callbacks)
+    slots_bytes = measure_bytes_per_callback(CallBack, args.num_callbacks)
+
+    print(f"num_callbacks: {args.num_callbacks}")
+    print(f"__dict__ (before): {dict_bytes:.1f} bytes/callback")
+    print(f"__slots__ (after): {slots_bytes:.1f} bytes/callback")
+    print(f"reduction: {(1 - slots_bytes / dict_bytes) * 100:.1f} %")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""生成したタスクセットでRunProgressの各フェーズの実行時間とピークメモリを計測する
+
+サイズごとに新しいプロセスで実行し、保存されたベースライン (benchmarks/baselines.json) と比較する
+結果のキャッシュ (空のディレクトリなので毎回ミスする)、局所探索、シミュレーションも有効にして、全てのフェーズを計測する
+
+Usage:
+    $ python -m benchmarks.scaling_benchmark                      # ベースラインと比較
+    $ python -m benchmarks.scaling_benchmark --sizes 10 100 1000  # サイズを指定
+    $ python -m benchmarks.scaling_benchmark --save-baseline      # ベースラインを更新
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+try:
+    import resource
+except ImportError:  # Windowsにはresourceがない
+    resource = None
+
+from run_progress import RunProgress
+
+from .task_set_generator import generate_task_set, write_task_set
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+BASELINE_PATH = Path(__file__).parent / "baselines.json"
+PHASES = [
+    "read_input",
+    "initial_components",
+    "callback_priority_assignment",
+    "set_priority_ranges",
+    "set_chains_priority",
+    "result_cache_lookup",
+    "executor_core_assignment",
+    "local_search",  # executor_core_assignmentの内訳
+    "result_cache_store",
+    "chain_latency_analysis",
+    "simulation",
+    "write_all_info",
+]
+
+
+def task_set_params(num_callbacks: int) -> Dict[str, Any]:
+    """コールバックの数からタスクセットの大きさを決める
+
+    エグゼキューターをCPUより少なくし、利用率の合計をCPUの数の0.8倍にするので、
+    PartAで空のエグゼキューターを使い切った後のPartB (ノードの除外) とPartCもどのサイズでも実行される
+    """
+    num_cpus = min(max(num_callbacks // 20, 2), 8)
+    return {
+        "num_callbacks": num_callbacks,
+        "num_chains": max(num_callbacks // 5, 1),
+        "num_nodes": max(num_callbacks * 3 // 5, 1),
+        "num_executors": max(num_cpus * 3 // 4, 1),
+        "num_cpus": num_cpus,
+        "total_utilization": num_cpus * 0.8,
+        "max_chain_length": 10,
+    }
+
+
+def run_benchmark(num_callbacks: int, seed: int) -> Dict[str, Any]:
+    """一つのサイズについて各フェーズの実行時間を計測する (新しいプロセスで実行される)"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = Path(tmp_dir) / "input.yaml"
+        write_task_set(input_path, generate_task_set(**task_set_params(num_callbacks), seed=seed))
+
+        start = time.perf_counter()
+        run_progress = RunProgress(
+            input_path,
+            Path(tmp_dir) / "output",
+            instrument=True,
+            result_cache_dir=Path(tmp_dir) / "result_cache",
+            simulate=True,
+            local_search=True,
+        )
+        run_progress.main_process()
+        total_seconds = time.perf_counter() - start
+
+    instrumentation = run_progress.instrumentation.to_dict()
+    phase_seconds = {phase: times["wall_sec"] for phase, times in instrumentation["phases"].items()}
+    return {
+        "num_callbacks": num_callbacks,
+        "phase_seconds": phase_seconds,
+        "total_seconds": total_seconds,  # フェーズは入れ子になるので、足し合わせずに全体を計る
+        "counters": instrumentation["counters"],
+        "peak_memory_mb": _peak_memory_mb(),
+    }
+
+
+def _peak_memory_mb() -> float:
+    """このプロセスのピークメモリ (MB)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)  # macOSはbyte
+    return peak / 1024  # Linuxはkilobyte
+
+
+def compare_with_baseline(results: List[Dict[str, Any]], baselines: Dict[str, Any], tolerance: float, min_seconds: float) -> List[str]:
+    """ベースラインよりtolerance倍以上遅くなったフェーズを返す (min_seconds未満の差は無視する)"""
+    regressions: List[str] = []
+    for result in results:
+        baseline = baselines.get(str(result["num_callbacks"]))
+        if baseline is None:
+            continue
+        for phase, seconds in result["phase_seconds"].items():
+            baseline_seconds = baseline["phase_seconds"].get(phase)
+            if baseline_seconds is None:
+                continue
+            if seconds > baseline_seconds * tolerance and seconds - baseline_seconds > min_seconds:
+                regressions.append(
+                    f"{result['num_callbacks']} callbacks / {phase}: {seconds:.3f}s (baseline {baseline_seconds:.3f}s)"
+                )
+    return regressions
+
+
+def _print_results(results: List[Dict[str, Any]]) -> None:
+    header = ["num_callbacks"] + PHASES + ["total", "peak_mb"]
+    print(" ".join(f"{column:>16}" for column in header))
+    for result in results:
+        row = [str(result["num_callbacks"])]
+        row += [f"{result['phase_seconds'][phase]:.4f}" if phase in result["phase_seconds"] else "-" for phase in PHASES]
+        row += [f"{result['total_seconds']:.4f}"]
+        row += [f"{result['peak_memory_mb']:.1f}" if result["peak_memory_mb"] is not None else "-"]
+        print(" ".join(f"{value:>16}" for value in row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RunProgressのフェーズごとの実行時間とピークメモリを計測する")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="コールバックの数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="計測結果でベースラインを更新する")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="ベースラインの何倍遅くなったら退行とみなすか")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="これより小さい差は無視する")
+    args = parser.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    for num_callbacks in args.sizes:
+        # 各サイズを新しいプロセスで実行してピークメモリを分ける
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            results.append(pool.submit(run_benchmark, num_callbacks, args.seed).result())
+    _print_results(results)
+
+    baselines: Dict[str, Any] = {}
+    if args.baseline.exists():
+        with open(args.baseline, "r") as file:
+            baselines = json.load(file)
+
+    if args.save_baseline:
+        for result in results:
+            baselines[str(result["num_callbacks"])] = result
+        with open(args.baseline, "w") as file:
+            json.dump(baselines, file, indent=2)
+        print(f"saved baseline to {args.baseline}")
+        return
+
+    regressions = compare_with_baseline(results, baselines, args.tolerance, args.min_seconds)
+    if len(regressions) != 0:
+        print("REGRESSION:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("no regression")
+
+
+if __name__ == "__main__":
+    main()
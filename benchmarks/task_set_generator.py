@@ -0,0 +1,195 @@
+"""入力ファイル (タスクセット) をランダムに生成する
+
+- チェインの利用率はUUniFastで合計がtotal_utilizationになるように決める
+- チェインの長さはmin_chain_length以上max_chain_length以下
+- 各コールバックはランダムなノードに属するので、ノードは複数のチェインで共有される
+
+Usage:
+    $ python -m benchmarks.task_set_generator ./data/generated/cb1000.yaml --num-callbacks 1000 --num-chains 200 --num-nodes 300
+"""
+import argparse
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, List
+
+PERIODS = [10, 20, 50, 100, 200, 500, 1000]  # チェインの周期の候補
+MAX_NODE_UTILIZATION = 1  # ノードの利用率の上限 (1を超えるノードは割り当てられない)
+
+
+def uunifast(num_tasks: int, total_utilization: float, rng: random.Random) -> List[float]:
+    """UUniFast: 合計がtotal_utilizationになる利用率を一様にnum_tasks個生成する"""
+    utilizations: List[float] = []
+    sum_utilization = total_utilization
+    for i in range(1, num_tasks):
+        next_sum_utilization = sum_utilization * rng.random() ** (1 / (num_tasks - i))
+        utilizations.append(sum_utilization - next_sum_utilization)
+        sum_utilization = next_sum_utilization
+    utilizations.append(sum_utilization)
+    return utilizations
+
+
+def generate_task_set(
+    num_callbacks: int,
+    num_chains: int,
+    num_nodes: int,
+    num_executors: int,
+    num_cpus: int,
+    total_utilization: float = None,
+    min_chain_length: int = 1,
+    max_chain_length: int = None,
+    seed: int = None,
+    max_retries: int = 100,
+) -> Dict[str, Any]:
+    """read_input()と同じ構造の入力を生成する
+
+    Args:
+        num_callbacks: コールバックの数
+        num_chains: チェインの数
+        num_nodes: ノードの数 (num_callbacks以下)
+        num_executors: エグゼキューターの数
+        num_cpus: CPUの数
+        total_utilization: 全チェインの利用率の合計 (省略時は num_cpus * 0.7)
+        min_chain_length, max_chain_length: チェインの長さの範囲 (max省略時は制限なし)
+        seed: 乱数のシード
+        max_retries: ノードの利用率が1を超えた場合に作り直す回数
+    """
+    if max_chain_length is None:
+        max_chain_length = num_callbacks
+    if not (num_chains * min_chain_length <= num_callbacks <= num_chains * max_chain_length):
+        raise ValueError("num_callbacks must be between num_chains * min_chain_length and num_chains * max_chain_length")
+    if not (1 <= num_nodes <= num_callbacks):
+        raise ValueError("num_nodes must be between 1 and num_callbacks")
+    if total_utilization is None:
+        total_utilization = num_cpus * 0.7
+
+    rng = random.Random(seed)
+    for _ in range(max_retries):
+        callbacks = _generate_callbacks(
+            num_callbacks, num_chains, num_nodes, total_utilization, min_chain_length, max_chain_length, rng
+        )
+        if _max_node_utilization(callbacks, num_nodes) <= MAX_NODE_UTILIZATION:
+            return {
+                "num_cpus": num_cpus,
+                "num_executors": num_executors,
+                "callbacks": {f"cb{id}": cb for id, cb in enumerate(callbacks)},
+            }
+    raise ValueError("could not generate a task set whose node utilizations are all <= 1. increase num_nodes")
+
+
+def _generate_callbacks(
+    num_callbacks: int,
+    num_chains: int,
+    num_nodes: int,
+    total_utilization: float,
+    min_chain_length: int,
+    max_chain_length: int,
+    rng: random.Random,
+) -> List[Dict[str, Any]]:
+    chain_lengths = _chain_lengths(num_callbacks, num_chains, min_chain_length, max_chain_length, rng)
+    chain_utilizations = uunifast(num_chains, total_utilization, rng)
+
+    callbacks: List[Dict[str, Any]] = []
+    for chain_id, (length, utilization) in enumerate(zip(chain_lengths, chain_utilizations)):
+        period = rng.choice(PERIODS)
+        # チェインの実行時間をコールバックに分配する
+        for i, cb_utilization in enumerate(uunifast(length, utilization, rng)):
+            callbacks.append({
+                "period": period if i == 0 else 0,  # 先頭だけタイマーコールバック
+                "exec": round(cb_utilization * period, 3),
+                "node_id": None,
+                "chain_id": chain_id,
+            })
+
+    # 全てのノードが少なくとも一つのコールバックを持つようにしてから、残りをランダムに割り振る
+    node_ids = list(range(num_nodes)) + [rng.randrange(num_nodes) for _ in range(num_callbacks - num_nodes)]
+    rng.shuffle(node_ids)
+    for cb, node_id in zip(callbacks, node_ids):
+        cb["node_id"] = node_id
+    return callbacks
+
+
+def _chain_lengths(num_callbacks: int, num_chains: int, min_chain_length: int, max_chain_length: int, rng: random.Random) -> List[int]:
+    """合計がnum_callbacksになるようにチェインの長さを決める"""
+    lengths = [min_chain_length] * num_chains
+    not_full = [i for i in range(num_chains) if lengths[i] < max_chain_length]
+    for _ in range(num_callbacks - num_chains * min_chain_length):
+        j = rng.randrange(len(not_full))
+        chain_id = not_full[j]
+        lengths[chain_id] += 1
+        if lengths[chain_id] == max_chain_length:
+            not_full[j] = not_full[-1]
+            not_full.pop()
+    return lengths
+
+
+def _max_node_utilization(callbacks: List[Dict[str, Any]], num_nodes: int) -> float:
+    chain_periods = {cb["chain_id"]: cb["period"] for cb in callbacks if cb["period"] != 0}
+    node_utilizations = [0] * num_nodes
+    for cb in callbacks:
+        node_utilizations[cb["node_id"]] += cb["exec"] / chain_periods[cb["chain_id"]]
+    return max(node_utilizations)
+
+
+def write_task_set(file_path: Path, task_set: Dict[str, Any]) -> None:
+    """拡張子 (.yaml / .json / .csv) に合わせてread_input()で読める形式で書き出す"""
+    file_path = Path(file_path)
+    file_path.parent.mkdir(exist_ok=True, parents=True)
+    suffix = file_path.suffix.lower()
+    if suffix == ".json":
+        with open(file_path, "w") as file:
+            json.dump(task_set, file)
+    elif suffix == ".csv":
+        with open(file_path, "w", newline="") as file:
+            file.write(f"# num_cpus: {task_set['num_cpus']}\n")
+            file.write(f"# num_executors: {task_set['num_executors']}\n")
+            file.write("callback_id,period,exec,node_id,chain_id\n")
+            for key, cb in task_set["callbacks"].items():
+                file.write(f"{key[len('cb'):]},{cb['period']},{cb['exec']},{cb['node_id']},{cb['chain_id']}\n")
+    elif suffix in (".yaml", ".yml"):
+        with open(file_path, "w") as file:
+            file.write(f"num_cpus: {task_set['num_cpus']}\n")
+            file.write(f"num_executors: {task_set['num_executors']}\n")
+            file.write("callbacks:\n")
+            for key, cb in task_set["callbacks"].items():
+                file.write(
+                    f"  {key}:\n"
+                    f"    period: {cb['period']}\n"
+                    f"    exec: {cb['exec']}\n"
+                    f"    node_id: {cb['node_id']}\n"
+                    f"    chain_id: {cb['chain_id']}\n"
+                )
+    else:
+        raise ValueError(f"unsupported output format: {file_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="入力ファイル (タスクセット) をランダムに生成する")
+    parser.add_argument("output_path", type=Path, help=".yaml / .json / .csv")
+    parser.add_argument("--num-callbacks", type=int, required=True)
+    parser.add_argument("--num-chains", type=int, required=True)
+    parser.add_argument("--num-nodes", type=int, required=True)
+    parser.add_argument("--num-executors", type=int, default=None, help="省略時はnum_nodes")
+    parser.add_argument("--num-cpus", type=int, default=4)
+    parser.add_argument("--total-utilization", type=float, default=None, help="省略時はnum_cpus * 0.7")
+    parser.add_argument("--min-chain-length", type=int, default=1)
+    parser.add_argument("--max-chain-length", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    task_set = generate_task_set(
+        num_callbacks=args.num_callbacks,
+        num_chains=args.num_chains,
+        num_nodes=args.num_nodes,
+        num_executors=args.num_executors if args.num_executors is not None else args.num_nodes,
+        num_cpus=args.num_cpus,
+        total_utilization=args.total_utilization,
+        min_chain_length=args.min_chain_length,
+        max_chain_length=args.max_chain_length,
+        seed=args.seed,
+    )
+    write_task_set(args.output_path, task_set)
+
+
+if __name__ == "__main__":
+    main()
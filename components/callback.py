@@ -3,6 +3,19 @@ from typing import List
 
 
 class CallBack:
+    # 大量のコールバックを扱うので、インスタンスごとの__dict__を持たせずにメモリを節約する
+    __slots__ = (
+        "callback_id",
+        "wcet",
+        "period",
+        "priority",
+        "node_id",
+        "chain_id",
+        "is_timer_callback",
+        "node_name",
+        "assigned_executor_id",
+    )
+
     def __init__(self, callback_id: int, wcet: int, period: int, node_id: int, chain_id: int, node_name: str):
         self.callback_id: int = callback_id  # コールバックid
         self.wcet: int = wcet # 最悪実行時間
@@ -37,6 +50,13 @@ def assign_period(callbacks: List[CallBack]) -> List[CallBack]:
             cb.period = chain_id_to_period[cb.chain_id]
     return callbacks
 
+def calc_utilization(callbacks: List[CallBack]) -> float:
+    """コールバックの利用率の合計を計算する"""
+    utilization = 0
+    for cb in callbacks:
+        utilization += cb.wcet / cb.period
+    return utilization
+
 def sort_cb_by_id(callbacks: List[CallBack]) -> List[CallBack]:
     """コールバックidでソート"""
     return sorted(callbacks, key=lambda cb: cb.callback_id)
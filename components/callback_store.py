@@ -0,0 +1,96 @@
+from typing import List
+
+try:
+    import numpy as np
+except ImportError:  # numpyは任意の依存 (CallbackStoreを使う時だけ必要)
+    np = None
+
+from .callback import CallBack
+
+NOT_ASSIGNED = -1  # 優先度やエグゼキューターが未割り当てであることを表す値
+
+
+def is_callback_store_available() -> bool:
+    """CallbackStoreが使えるかどうか (numpyがインストールされているか)"""
+    return np is not None
+
+
+class CallbackStore:
+    """コールバックの情報を列ごとにNumPy配列で持つストア (struct of arrays)
+
+    配列のindexはcallback_idと一致する
+    CallBackのインスタンスはそのまま残し、周期・優先度・割り当て先をこのストアと同期させる
+    ノードの利用率の計算はこのストアの配列に対してまとめて行う
+    NOTE: 結果はストアを使わない場合 (calc_utilization()) と浮動小数点の値まで同じになるようにする
+        (エグゼキューターとコアの利用率は割り当ての順に差分で更新されるので、ストアでは計算しない)
+    """
+    def __init__(self, callbacks: List[CallBack]):
+        if np is None:
+            raise ImportError("CallbackStore requires numpy. Install it with `pip install numpy`.")
+
+        self.callbacks: List[CallBack] = sorted(callbacks, key=lambda cb: cb.callback_id)  # callback_id順
+        self.num_callbacks: int = len(self.callbacks)
+
+        self.wcet = np.asarray([cb.wcet for cb in self.callbacks])  # 最悪実行時間
+        self.period = np.asarray([cb.period for cb in self.callbacks])  # 周期
+        self.priority = np.asarray([_to_index(cb.priority) for cb in self.callbacks], dtype=np.int64)  # 優先度
+        self.node_id = np.asarray([cb.node_id for cb in self.callbacks], dtype=np.int64)  # ノードid
+        self.chain_id = np.asarray([cb.chain_id for cb in self.callbacks], dtype=np.int64)  # チェインid
+        self.is_timer = np.asarray([cb.is_timer_callback for cb in self.callbacks], dtype=bool)  # タイマーコールバックかどうか
+        self.assigned_executor = np.asarray([_to_index(cb.assigned_executor_id) for cb in self.callbacks], dtype=np.int64)  # 割り当てられたエグゼキューターid
+
+    def assign_period(self) -> None:
+        """各コールバックの周期を決定する (components.callback.assign_periodと同じ)
+        (レギュラーコールバックの周期) = (同チェイン内のタイマーコールバックの周期)
+        """
+        # チェインごとの周期を抽出
+        chain_period = np.zeros(self.chain_id.max() + 1, dtype=self.period.dtype)
+        chain_period[self.chain_id[self.is_timer]] = self.period[self.is_timer]
+
+        # レギュラーコールバックにも周期を割り当てる
+        is_regular = ~self.is_timer
+        self.period[is_regular] = chain_period[self.chain_id[is_regular]]
+
+        # CallBackのインスタンスにも反映する
+        for cb, period in zip(self.callbacks, self.period.tolist()):
+            cb.period = period
+
+    def utilizations(self):
+        """各コールバックの利用率"""
+        return self.wcet / self.period
+
+    def node_utilizations(self, num_nodes: int) -> List[float]:
+        """ノードごとの利用率
+        NOTE: bincountは重みをindexの順 (callback_idの順) に一つずつ足すので、
+            ノードのコールバック (callback_idの順) にcalc_utilization()を使った場合と同じ値になる
+        """
+        return np.bincount(self.node_id, weights=self.utilizations(), minlength=num_nodes).tolist()
+
+    def pull_assignment(self) -> None:
+        """CallBackのインスタンスから優先度と割り当て先のエグゼキューターを取り込む"""
+        self.priority = np.asarray([_to_index(cb.priority) for cb in self.callbacks], dtype=np.int64)
+        self.assigned_executor = np.asarray([_to_index(cb.assigned_executor_id) for cb in self.callbacks], dtype=np.int64)
+
+    def columns(self):
+        """CSV出力用に各列をpythonのリストで返す (未割り当てはNone)
+        NOTE: 最悪実行時間は入力の表記 (intかfloatか) を保つためCallBackのインスタンスから取る
+        """
+        return (
+            [cb.callback_id for cb in self.callbacks],
+            [cb.wcet for cb in self.callbacks],
+            self.period.tolist(),
+            [_from_index(priority) for priority in self.priority.tolist()],
+            self.node_id.tolist(),
+            self.chain_id.tolist(),
+            self.is_timer.tolist(),
+            [_from_index(exe_id) for exe_id in self.assigned_executor.tolist()],
+        )
+
+
+def _to_index(value: int) -> int:
+    """Noneを未割り当てを表す値に変換"""
+    return NOT_ASSIGNED if value is None else value
+
+def _from_index(value: int) -> int:
+    """未割り当てを表す値をNoneに変換"""
+    return None if value == NOT_ASSIGNED else value
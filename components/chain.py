@@ -1,15 +1,46 @@
-from typing import List
+from typing import Any, Dict, List, Union
 
 from .callback import CallBack, sort_cb_by_id
+from .input_keys import parse_chain_id
 
 
 class Chain:
+    __slots__ = (
+        "chain_id",
+        "callbacks",
+        "wcet_sum",
+        "priority",
+        "deadline",
+        "criticality",
+        "timer_callback",
+        "regular_callbacks",
+        "min_callback_priority",
+        "max_callback_priority",
+        "min_regular_callback_priority",
+        "is_id_ordered",
+        "is_regular_id_ordered",
+    )
+
     def __init__(self, chain_id: int, callbacks: List[CallBack]):
         self.chain_id: int = chain_id  # チェインid
         self.callbacks: List[CallBack] = self._cb_preprocess(callbacks)  # チェインに含まれているcb
         self.wcet_sum: int = sum([cb.wcet for cb in callbacks]) # 最悪実行の合計
         self.priority: int = None  # 優先度
+        self.deadline: float = None  # 相対デッドライン (Noneの場合は周期, 入力のchainsで指定する)
+        self.criticality: int = 0  # クリティカリティ (大きいほど重要, 入力のchainsで指定する)
+
+        # チェインの要約 (戦略のチェックで使い回す)
+        # NOTE: 一つのチェインにtcbは一つしかない
+        timer_callbacks = [cb for cb in self.callbacks if cb.is_timer_callback]
+        self.timer_callback: CallBack = timer_callbacks[0] if len(timer_callbacks) != 0 else None  # タイマーコールバック
+        self.regular_callbacks: List[CallBack] = [cb for cb in self.callbacks if not cb.is_timer_callback]  # レギュラーコールバック (id順)
 
+        # 以下はコールバックに優先度が割り当てられてからset_priority()でセットされる
+        self.min_callback_priority: int = None  # コールバック優先度の最小値
+        self.max_callback_priority: int = None  # コールバック優先度の最大値
+        self.min_regular_callback_priority: int = None  # レギュラーコールバック優先度の最小値
+        self.is_id_ordered: bool = None  # 全てのコールバックの優先度がid順に並んでいるか
+        self.is_regular_id_ordered: bool = None  # レギュラーコールバックの優先度がid順に並んでいるか
 
     def _cb_preprocess(self, callbacks: List[CallBack]) -> List[CallBack]:
         """コールバックの前処理"""
@@ -20,6 +51,14 @@ class Chain:
         
         return callbacks
     
+    def get_period(self) -> float:
+        """チェインの周期 (タイマーコールバックの周期)"""
+        return self.callbacks[0].period
+
+    def get_deadline(self) -> float:
+        """チェインの相対デッドライン (指定されていなければ周期)"""
+        return self.deadline if self.deadline is not None else self.get_period()
+
     def set_priority(self) -> None:
         """コールバックの優先度を元にチェインの優先度をセットする
         NOTE: コールバックに優先度が割り当てられてからしか呼び出せない
@@ -27,10 +66,51 @@ class Chain:
         # 一番初めのタイマーコールバックの優先度と同じ
         self.priority: int = self.callbacks[0].priority
 
+        # 優先度に関する要約をセット
+        self._set_priority_summary()
+
+    def _set_priority_summary(self) -> None:
+        """コールバックの優先度に関する要約をセットする"""
+        priorities = [cb.priority for cb in self.callbacks]
+        regular_priorities = [cb.priority for cb in self.regular_callbacks]
+
+        self.min_callback_priority = min(priorities)
+        self.max_callback_priority = max(priorities)
+        self.min_regular_callback_priority = min(regular_priorities) if len(regular_priorities) != 0 else None
+        self.is_id_ordered = _is_ascending(priorities)
+        self.is_regular_id_ordered = _is_ascending(regular_priorities)
+
+def _is_ascending(values: List[int]) -> bool:
+    """隣同士を比較してどんどん大きくなっていっていればTrue"""
+    for i in range(len(values) - 1):
+        if values[i] > values[i+1]:
+            return False
+    return True
+
 def set_chains_priority(chains: List[Chain]) -> List[Chain]:
     """コールバックの優先度を元にチェインの優先度をセットする
     NOTE: コールバックに優先度が割り当てられてからしか呼び出せない
     """
     for chain in chains:
         chain.set_priority()
-    return chains
\ No newline at end of file
+    return chains
+
+
+def set_chain_attributes(chains: List[Chain], input_chains: Dict[Union[str, int], Dict[str, Any]]) -> List[Chain]:
+    """入力のchains ({"chain0": {"deadline": 60, "criticality": 2}, ...}) をチェインにセットする
+    NOTE: 書かれていないチェインや項目はデフォルト (デッドラインは周期, クリティカリティは0) のまま
+    """
+    chain_by_id = {chain.chain_id: chain for chain in chains}
+    for key, attributes in input_chains.items():
+        chain_id = parse_chain_id(key)
+        if chain_id not in chain_by_id:
+            raise ValueError(f"chain {key} in chains does not exist in callbacks")
+        chain = chain_by_id[chain_id]
+        unknown_keys = set(attributes) - {"deadline", "criticality"}
+        if len(unknown_keys) != 0:
+            raise ValueError(f"unknown chain attributes {sorted(unknown_keys)} in chain {key}")
+        if "deadline" in attributes:
+            chain.deadline = attributes["deadline"]
+        if "criticality" in attributes:
+            chain.criticality = attributes["criticality"]
+    return chains
@@ -1,33 +1,101 @@
-from typing import List
+from typing import Dict, List
 
 from .executor import Executor
+from .version import next_version
 
 
 class Core:
+    __slots__ = ("core_id", "executors", "_utilization", "_executor_utilizations", "version", "pool")
+
     def __init__(self, core_id: int):
         self.core_id: int = core_id  # コアid
+        self.pool = None  # 利用率で並べたインデックス (CorePool, 利用率が変わったら通知する)
         self.executors: List[Executor] = []  # コアに割り当てられたエグゼキューター
         self.utilization: int = 0  # 利用率
+
+        # 割り当て時の各エグゼキューターの利用率 (取り除く時に差分で更新するため)
+        self._executor_utilizations: Dict[int, float] = {}
+        self.version: int = next_version()  # エグゼキューターが変わるたびに振り直す (戦略のチェックのメモ化に使う)
             
-    def assign_executor(self, executor: Executor):
-        """エグゼキューターをコアに割り当てる"""
+    def assign_executor(self, executor: Executor, index: int = None):
+        """エグゼキューターをコアに割り当てる
+
+        Args:
+            index: 指定された場合はexecutorsのその位置に入れる (取り消しで元の並びに戻すため)
+        """
         # 割り当て
-        self.executors.append(executor)
+        if index is None:
+            self.executors.append(executor)
+        else:
+            self.executors.insert(index, executor)
 
-        # 利用率の更新
-        self._update_utilization()
+        # 利用率の更新 (追加分だけ足す)
+        self._executor_utilizations[executor.executor_id] = executor.utilization
+        self.utilization += executor.utilization
 
         # エグゼキューターのインスタンスにコアを登録する
         executor.set_assigned_core(self.core_id)
+        self.version = next_version()
+
+    @property
+    def utilization(self) -> float:
+        """利用率"""
+        return self._utilization
+
+    @utilization.setter
+    def utilization(self, utilization: float) -> None:
+        self._utilization = utilization
+        if self.pool is not None:
+            self.pool.update(self)  # インデックスの並び順を保つ
+
+    def update_executor_utilization(self, executor: Executor, utilization: float = None) -> float:
+        """割り当て済みのエグゼキューターの利用率を記録し直して、コアの利用率を差分で更新する
+        割り当てた後にエグゼキューターのコールバックが変わった場合に呼ぶ
+
+        Args:
+            utilization: 記録する利用率 (Noneの場合はエグゼキューターの今の利用率)
+
+        Returns:
+            それまで記録されていた利用率
+        """
+        if utilization is None:
+            utilization = executor.utilization
+        prev_utilization = self._executor_utilizations[executor.executor_id]
+        self._executor_utilizations[executor.executor_id] = utilization
+        self.utilization += utilization - prev_utilization
+        self.version = next_version()
+        return prev_utilization
+
+    def refresh_utilization(self) -> None:
+        """割り当て済みの全てのエグゼキューターの今の利用率を記録し直す
+        NOTE: PartBは割り当て済みのエグゼキューターにコールバックを足すので、その分はコアの利用率に反映されていない
+        """
+        for executor in self.executors:
+            self.update_executor_utilization(executor)
+
+    def remove_executor(self, executor: Executor) -> float:
+        """エグゼキューターをコアから取り除く (割り当て時に記録した利用率を返す)"""
+        self.executors.remove(executor)
+
+        # 利用率の更新 (割り当て時に足した分だけ引く)
+        removed_utilization = self._executor_utilizations.pop(executor.executor_id)
+        if len(self.executors) == 0:
+            self.utilization = 0  # 浮動小数点の誤差を残さない
+        else:
+            self.utilization -= removed_utilization
 
-    def _update_utilization(self) -> None:
-        """利用率を更新"""
-        self.utilization = sum([exe.utilization for exe in self.executors])
+        # エグゼキューターのインスタンスからコアの登録を外す
+        if executor.assigned_core_id == self.core_id:
+            executor.set_assigned_core(None)
+        self.version = next_version()
+        return removed_utilization
 
     def reinitialization(self) -> None:
         """コアの初期化"""
         self.executors = []
-        self._update_utilization()
+        self.utilization = 0
+        self._executor_utilizations = {}
+        self.version = next_version()
 
     
 
@@ -0,0 +1,54 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+
+class DecisionTrace:
+    """割り当てのループ (PartA/B/C) での判断を1行1イベントのJSONLで記録する
+
+    イベントはバッファに貯めておき、buffer_size個ごとにまとめてファイルに書き出す
+    無効 (enabled=False) の場合は何も記録しない
+    NOTE: 呼び出し側では引数を作るコストを避けるため `if trace.enabled:` で囲んでからemit()する
+
+    Args:
+        file_path: 出力するJSONLファイルのパス (Noneの場合は無効)
+        buffer_size: まとめて書き出すイベントの数
+    """
+    __slots__ = ("enabled", "file_path", "buffer_size", "_buffer", "_file")
+
+    def __init__(self, file_path: Path = None, buffer_size: int = 4096):
+        self.enabled: bool = file_path is not None
+        self.file_path: Path = file_path
+        self.buffer_size: int = buffer_size
+        self._buffer: List[str] = []
+        self._file = None
+
+    def emit(self, event: str, **fields: Any) -> None:
+        """イベントを一つ記録する"""
+        record: Dict[str, Any] = {"event": event}
+        record.update(fields)
+        self._buffer.append(json.dumps(record, separators=(",", ":")))
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """バッファに貯めたイベントをファイルに書き出す"""
+        if len(self._buffer) == 0:
+            return
+        if self._file is None:
+            self._file = open(self.file_path, "w")
+        self._file.write("\n".join(self._buffer) + "\n")
+        self._buffer = []
+
+    def close(self) -> None:
+        """残りのイベントを書き出してファイルを閉じる"""
+        if not self.enabled:
+            return
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# 記録しない場合に使う共有のインスタンス
+DISABLED_TRACE = DecisionTrace(file_path=None)
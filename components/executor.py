@@ -1,9 +1,13 @@
+import heapq
 from typing import List
 
-from .callback import CallBack, sort_cb_by_priority
+from .callback import CallBack, calc_utilization, sort_cb_by_priority
+from .version import next_version
 
 
 class Executor:
+    __slots__ = ("executor_id", "callbacks", "priority", "utilization", "assigned_core_id", "version", "pool")
+
     def __init__(self, executor_id: int):
         self.executor_id: int = executor_id  # エグゼキューターid
         self.callbacks: List[CallBack] = []  # エグゼキューターに割り当てられたcb
@@ -11,6 +15,8 @@ class Executor:
         self.utilization = 0  # 利用率
 
         self.assigned_core_id: int = None  # 割り当てられたコアid
+        self.version: int = next_version()  # コールバックが変わるたびに振り直す (戦略のチェックのメモ化に使う)
+        self.pool = None  # 空のエグゼキューターのプール (FreeExecutorPool, 空かどうかが変わったら通知する)
 
     def set_assigned_core(self, assigned_core_id: int) -> None:
         """割り当てられたコアidをセットする
@@ -20,30 +26,61 @@ class Executor:
         
     def assign_callbacks(self, callbacks: List[CallBack]) -> None:
         """コールバックをエグゼキューターに割り当てる"""
-        # 割り当てられたコールバックに追加
-        self.callbacks.extend(callbacks)
-
-        # 優先度でソート
-        self.callbacks = sort_cb_by_priority(self.callbacks)
+        # 追加分だけ優先度でソートして、ソート済みのリストとマージする
+        new_callbacks = sort_cb_by_priority(callbacks)
+        self.callbacks = list(heapq.merge(self.callbacks, new_callbacks, key=lambda cb: cb.priority))
 
-        # 利用率の更新
-        self._update_utilization()
+        # 利用率の更新 (追加分だけ足す)
+        self.utilization += calc_utilization(callbacks)
 
         # 各コールバックのインスタンスにエグゼキューターを登録する
         for cb in callbacks:
             cb.set_assigned_executor(self.executor_id)
+        self._callbacks_changed()
+
+    def assign_sorted_callback_lists(self, callback_lists: List[List[CallBack]]) -> None:
+        """優先度でソート済みの複数のコールバックのリストをまとめてエグゼキューターに割り当てる
+
+        リストごとにassign_callbacks()を呼ぶとその度に全体をマージし直すので、全てのリストを一度にk-way mergeする
+        NOTE: 利用率はassign_callbacks()をリストの順番に呼んだ時と同じ順番で足す
+        """
+        self.callbacks = list(heapq.merge(self.callbacks, *callback_lists, key=lambda cb: cb.priority))
+
+        # 利用率の更新と、各コールバックのインスタンスへのエグゼキューターの登録
+        for callbacks in callback_lists:
+            self.utilization += calc_utilization(callbacks)
+            for cb in callbacks:
+                cb.set_assigned_executor(self.executor_id)
+        self._callbacks_changed()
+
+    def remove_callbacks(self, callbacks: List[CallBack]) -> None:
+        """コールバックをエグゼキューターから取り除く"""
+        removed_callbacks = set(callbacks)
+        self.callbacks = [cb for cb in self.callbacks if cb not in removed_callbacks]
+
+        # 利用率の更新 (取り除いた分だけ引く)
+        if len(self.callbacks) == 0:
+            self.utilization = 0  # 浮動小数点の誤差を残さない
+        else:
+            self.utilization -= calc_utilization(callbacks)
+
+        # 各コールバックのインスタンスからエグゼキューターの登録を外す
+        for cb in callbacks:
+            if cb.assigned_executor_id == self.executor_id:
+                cb.set_assigned_executor(None)
+        self._callbacks_changed()
 
-    def _update_utilization(self) -> None:
-        """利用率を更新"""
-        utilization = 0
-        for cb in self.callbacks:
-            utilization += cb.wcet / cb.period
-        self.utilization = utilization
-    
     def reinitialization(self) -> None:
         """エグゼキューターの再初期化"""
         self.callbacks = []
-        self._update_utilization()
+        self.utilization = 0
+        self._callbacks_changed()
+
+    def _callbacks_changed(self) -> None:
+        """コールバックが変わった時に、バージョンを振り直してプールに通知する"""
+        self.version = next_version()
+        if self.pool is not None:
+            self.pool.update(self)
 
 def sort_executors_by_utilization(executors: List[Executor]) -> List[Executor]:
     """利用率でソート"""
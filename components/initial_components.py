@@ -1,43 +1,71 @@
-from typing import Dict, List, Tuple
+from typing import List, Tuple
 
 from .callback import CallBack, assign_period
+from .callback_store import CallbackStore
 from .chain import Chain
 from .core import Core
 from .executor import Executor
+from .input_keys import InputCallbacks, iter_input_callbacks
 from .node import Node
+from .system_model import SystemModel
 
 
 def initial_components(
-    input_cbs: Dict[str, Dict[str, int]],
+    input_cbs: InputCallbacks,
     num_executors: int,
     num_cores: int,
-) -> Tuple[int, List[CallBack], int, List[Chain], int, List[Node], List[Executor], List[Core]]:
-    """コンポーネント(コールバック, チェイン)の初期化"""
-    num_callbacks, callbacks = _initial_callback(input_cbs)
-    num_chains, chains = _initial_chain(callbacks)
-    num_nodes, nodes = _initial_node(callbacks)
+    use_callback_store: bool = False,
+) -> SystemModel:
+    """コンポーネント(コールバック, チェイン)の初期化
+
+    input_cbsは {"cb0": {...}, ...} の辞書か、(callback_id, コールバックの情報) を順に返すイテレーター
+    use_callback_storeがTrueの場合、列指向のコールバックストア(numpyが必要)を作成して
+    周期の割り当てや利用率の計算をまとめて行う
+    """
+    _, callbacks = _initial_callback(input_cbs)
+    callback_store = CallbackStore(callbacks) if use_callback_store else None
+
+    # チェインidを元に周期を割り当てる
+    if callback_store is not None:
+        callback_store.assign_period()
+    else:
+        assign_period(callbacks)
+
+    _, chains = _initial_chain(callbacks)
+    _, nodes = _initial_node(callbacks, callback_store)
+
+    return build_system_model(callbacks, chains, nodes, num_executors, num_cores, callback_store)
+
+def build_system_model(
+    callbacks: List[CallBack],
+    chains: List[Chain],
+    nodes: List[Node],
+    num_executors: int,
+    num_cores: int,
+    callback_store: CallbackStore = None,
+) -> SystemModel:
+    """初期化済みのコールバック, チェイン, ノードにエグゼキューターとコアを加えてシステムを作る"""
     executors = _initial_executor(num_executors)
     cores = _initial_core(num_cores)
 
-    return (
-        num_callbacks,
-        callbacks,
-        num_chains,
-        chains,
-        num_nodes,
-        nodes,
-        executors,
-        cores
+    return SystemModel(
+        callbacks=callbacks,
+        chains=chains,
+        nodes=nodes,
+        executors=executors,
+        cores=cores,
+        callback_store=callback_store,
     )
 
-def _initial_callback(input_cbs: Dict[str, Dict[str, int]]) -> Tuple[int, List[CallBack]]:
+def _initial_callback(input_cbs: InputCallbacks) -> Tuple[int, List[CallBack]]:
     """コールバックの初期化"""
-    num_callbacks = len(list(input_cbs.keys()))
     callbacks: List[CallBack] = []
 
     # create callback instance
-    for id in range(num_callbacks):
-        cur_input_cb = input_cbs[f"cb{id}"]
+    is_sorted_by_id = True
+    for id, cur_input_cb in iter_input_callbacks(input_cbs):
+        if len(callbacks) != 0 and callbacks[-1].callback_id > id:
+            is_sorted_by_id = False
         node_name: str = cur_input_cb["node_name"] if "node_name" in cur_input_cb else "no_name"
         callback = CallBack(
             callback_id=id,
@@ -49,8 +77,14 @@ def _initial_callback(input_cbs: Dict[str, Dict[str, int]]) -> Tuple[int, List[C
         )
         callbacks.append(callback)
 
-    # チェインidを元に周期を割り当てる
-    assign_period(callbacks)
+    # コールバックidの順に並べる
+    if not is_sorted_by_id:
+        callbacks.sort(key=lambda cb: cb.callback_id)
+    num_callbacks = len(callbacks)
+
+    # コールバックidは0から連番である必要がある
+    if any(cb.callback_id != id for id, cb in enumerate(callbacks)):
+        raise ValueError("callback ids must be consecutive numbers starting from 0 (cb0, cb1, ...)")
 
     return num_callbacks, callbacks
 
@@ -75,11 +109,14 @@ def _initial_chain(callbacks: List[CallBack]) -> Tuple[int, List[Chain]]:
 
     return num_chains, chains
 
-def _initial_node(callbacks: List[CallBack]) -> Tuple[int, List[Node]]:
+def _initial_node(callbacks: List[CallBack], callback_store: CallbackStore = None) -> Tuple[int, List[Node]]:
     """ノードの初期化"""
     num_nodes = len(set([cb.node_id for cb in callbacks]))
     nodes: List[Node] = []
 
+    # ストアがある場合はノードごとの利用率をまとめて計算しておく
+    node_utilizations = callback_store.node_utilizations(num_nodes) if callback_store is not None else None
+
     # grouping callbacks by node
     callbacks_groupby_node: List[List[CallBack]] = [[] for _ in range(num_nodes)]
     for cb in callbacks:
@@ -91,6 +128,7 @@ def _initial_node(callbacks: List[CallBack]) -> Tuple[int, List[Node]]:
         node = Node(
             node_id=cur_node_id,
             callbacks=cur_node_callbacks,
+            utilization=node_utilizations[cur_node_id] if node_utilizations is not None else None,
         )
         nodes.append(node)
 
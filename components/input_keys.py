@@ -0,0 +1,34 @@
+"""入力ファイルのキー ("cb12", "chain3" など) からidを取り出す
+
+iostreams (入力の読み込み) とcomponents (コンポーネントの初期化) の両方から使うので、他のモジュールに依存しない
+"""
+from typing import Any, Dict, Iterable, Iterator, Tuple, Union
+
+InputCallbacks = Union[Dict[str, Dict[str, Any]], Iterable[Tuple[int, Dict[str, Any]]]]
+
+
+def iter_input_callbacks(input_cbs: InputCallbacks) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """入力のコールバックを (callback_id, コールバックの情報) の順に返す"""
+    if isinstance(input_cbs, dict):
+        for key, cur_input_cb in input_cbs.items():
+            yield parse_callback_id(key), cur_input_cb
+    else:
+        yield from input_cbs
+
+
+def parse_callback_id(key: Union[str, int]) -> int:
+    """"cb12" のようなキーからコールバックidを取り出す"""
+    if isinstance(key, int):
+        return key
+    if key.startswith("cb"):
+        key = key[len("cb"):]
+    return int(key)
+
+
+def parse_chain_id(key: Union[str, int]) -> int:
+    """"chain3" のようなキーからチェインidを取り出す"""
+    if isinstance(key, int):
+        return key
+    if key.startswith("chain"):
+        key = key[len("chain"):]
+    return int(key)
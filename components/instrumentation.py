@@ -0,0 +1,85 @@
+import cProfile
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Dict, Union
+
+Profiler = Union[str, Callable[[str], ContextManager]]  # "cprofile" か、フェーズ名を受け取ってコンテキストマネージャーを返す関数
+
+
+class Instrumentation:
+    """フェーズごとの実行時間と、アルゴリズム内の回数を記録する
+
+    無効 (enabled=False) の場合は何も記録せず、phase()やcount()はほぼコストなしで返る
+
+    Args:
+        enabled: 記録するかどうか
+        output_dir: profileの結果を出力するディレクトリ
+        profiler: profile()で囲んだ区間をプロファイルする方法 (Noneの場合はプロファイルしない)
+            "cprofile": cProfileで計測して <output_dir>/<フェーズ名>.prof に出力する
+            関数: フェーズ名を受け取ってコンテキストマネージャーを返す関数 (サンプリングプロファイラーなどを差し込む)
+    """
+    __slots__ = ("enabled", "output_dir", "profiler", "phases", "counters")
+
+    def __init__(self, enabled: bool = False, output_dir: Path = None, profiler: Profiler = None):
+        self.enabled: bool = enabled
+        self.output_dir: Path = output_dir
+        self.profiler: Profiler = profiler
+        self.phases: Dict[str, Dict[str, float]] = {}  # フェーズ名 -> {"wall_sec", "cpu_sec"}
+        self.counters: Dict[str, int] = defaultdict(int)  # 名前 -> 回数
+
+    def phase(self, name: str) -> ContextManager:
+        """withで囲んだ区間の実時間とCPU時間をフェーズとして記録する"""
+        if not self.enabled:
+            return nullcontext()
+        return self._timed_phase(name)
+
+    @contextmanager
+    def _timed_phase(self, name: str):
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            phase = self.phases.setdefault(name, {"wall_sec": 0.0, "cpu_sec": 0.0})
+            phase["wall_sec"] += time.perf_counter() - wall_start
+            phase["cpu_sec"] += time.process_time() - cpu_start
+
+    def count(self, name: str, n: int = 1) -> None:
+        """回数を数える"""
+        if self.enabled:
+            self.counters[name] += n
+
+    def profile(self, name: str) -> ContextManager:
+        """withで囲んだ区間をプロファイルする (profilerが指定されていなければ何もしない)"""
+        if self.profiler is None:
+            return nullcontext()
+        if self.profiler == "cprofile":
+            return self._cprofile(name)
+        return self.profiler(name)
+
+    @contextmanager
+    def _cprofile(self, name: str):
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(str(Path(self.output_dir) / f"{name}.prof"))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "phases": self.phases,
+            "counters": dict(self.counters),
+        }
+
+    def write_json(self, file_path: Path) -> None:
+        with open(file_path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+
+# 計測しない場合に使う共有のインスタンス
+DISABLED_INSTRUMENTATION = Instrumentation(enabled=False)
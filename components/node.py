@@ -1,14 +1,18 @@
 from typing import List
 
-from .callback import CallBack, sort_cb_by_id, sort_cb_by_priority
+from .callback import CallBack, calc_utilization, sort_cb_by_id
 
 
 class Node:
-    def __init__(self, node_id: int, callbacks: List[CallBack]):
+    __slots__ = ("node_id", "callbacks", "utilization", "highest_priority", "lowest_priority")
+
+    def __init__(self, node_id: int, callbacks: List[CallBack], utilization: float = None):
         self.node_id: int = node_id  # ノードid
         self.callbacks: List[CallBack] = self._cb_preprocess(callbacks)  # ノードに含まれているcb
-        self.utilization: int = self._calc_utilization(callbacks)  # 利用率
+        # 利用率 (計算済みの値が渡された場合はそれを使う)
+        self.utilization: int = utilization if utilization is not None else self._calc_utilization(callbacks)
         self.highest_priority: int = None  # このノードの中で最も高い優先度
+        self.lowest_priority: int = None  # このノードの中で最も低い優先度
 
     def _cb_preprocess(self, callbacks: List[CallBack]) -> List[CallBack]:
         """コールバックの前処理"""
@@ -16,39 +20,26 @@ class Node:
         return callbacks
     
     def _calc_utilization(self, callbacks: List[CallBack]) -> int:
-        utilization = 0
-        for cb in callbacks:
-            utilization += cb.wcet / cb.period
-        return utilization
+        return calc_utilization(callbacks)
     
-    def set_highest_priority(self) -> None:
-        """このノードの中で最も高い優先度を計算してセットする
+    def set_priority_range(self) -> None:
+        """このノードの中で最も高い優先度と最も低い優先度を計算してセットする
         NOTE: コールバックに優先度が割り当てられてからしか呼び出せない
         """
-        self.highest_priority = max([cb.priority for cb in self.callbacks])
+        priorities = [cb.priority for cb in self.callbacks]
+        self.highest_priority = max(priorities)
+        self.lowest_priority = min(priorities)
 
-def set_highest_priorities(nodes: List[Node]) -> List[Node]:
-    """ノードの中で最も高い優先度を計算してセットする
+def set_priority_ranges(nodes: List[Node]) -> List[Node]:
+    """ノードの中で最も高い優先度と最も低い優先度を計算してセットする
     NOTE: コールバックに優先度が割り当てられてからしか呼び出せない
     """
     for node in nodes:
-        node.set_highest_priority()
+        node.set_priority_range()
     return nodes
 
 def sort_nodes_by_highest_priority(nodes: List[Node], is_decending=False) -> List[Node]:
     """最も高い優先度でソート
     何も指定しなければ昇順でソートされる
     """
-    return sorted(nodes, key=lambda node: node.highest_priority, reverse=is_decending)
- 
-def exclude_lowest_priority_in_nodes(nodes: List[Node]) -> List[Node]:
-    """最も優先度の低いコールバックを含むノードを除去して返す"""
-    all_callbacks = [cb for node in nodes for cb in node.callbacks]
-    
-    # 最も優先度の低いコールバック
-    lowest_priority_callback = sort_cb_by_priority(all_callbacks)[0]
-
-    # 最も優先度の低いコールバックを含むノードを除去
-    nodes = [node for node in nodes if node.node_id != lowest_priority_callback.node_id]
-
-    return nodes
\ No newline at end of file
+    return sorted(nodes, key=lambda node: node.highest_priority, reverse=is_decending)
\ No newline at end of file
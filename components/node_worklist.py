@@ -0,0 +1,120 @@
+import heapq
+from typing import Iterable, Iterator, List, Tuple
+
+from .node import Node, sort_nodes_by_highest_priority
+
+_END = -1  # 連結リストの終端
+
+
+class NodeWorklist:
+    """まだ割り当てられていないノードを、最も高い優先度の降順に並べたワークリスト
+
+    ノードの優先度は割り当て中に変わらないので、最初に一度だけソートして双方向連結リストで繋ぐ
+    - 先頭からの走査: 割り当て済みのノードを読み飛ばさない
+    - 割り当てたノードの削除: O(1) (順番はそのまま保たれる)
+    """
+    __slots__ = ("_nodes", "_next", "_prev", "_index_by_node_id", "_head", "_size")
+
+    def __init__(self, nodes: List[Node]):
+        self._nodes: List[Node] = sort_nodes_by_highest_priority(nodes, is_decending=True)  # 最も高い優先度を降順でソート
+        num_nodes = len(self._nodes)
+        self._next: List[int] = [i + 1 if i + 1 < num_nodes else _END for i in range(num_nodes)]
+        self._prev: List[int] = [i - 1 if i > 0 else _END for i in range(num_nodes)]
+        self._index_by_node_id = {node.node_id: i for i, node in enumerate(self._nodes)}
+        self._head: int = 0 if num_nodes != 0 else _END
+        self._size: int = num_nodes
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Node]:
+        """残っているノードを優先度の高い順に返す"""
+        i = self._head
+        while i != _END:
+            yield self._nodes[i]
+            i = self._next[i]
+
+    def remove(self, node: Node) -> None:
+        """ノードをワークリストから取り除く"""
+        i = self._index_by_node_id.pop(node.node_id)
+        prev_i = self._prev[i]
+        next_i = self._next[i]
+        if prev_i != _END:
+            self._next[prev_i] = next_i
+        else:
+            self._head = next_i
+        if next_i != _END:
+            self._prev[next_i] = prev_i
+        self._size -= 1
+
+    def remove_all(self, nodes: Iterable[Node]) -> None:
+        for node in nodes:
+            self.remove(node)
+
+
+class NodeSelection:
+    """_select_node()で選択されたノードのサブセット
+
+    割り当てに失敗した時にノードを一つずつ除外して再挑戦するために使う
+    - exclude_lowest_priority(): 最も優先度の低いコールバックを含むノードを除外する (PartA)
+        ノードごとの最も低い優先度のヒープから取り出すので O(log k)
+    - exclude_last(): 最も高い優先度が最も低いノード (末尾) を除外する (PartB)
+    除外したノードには印を付けるだけで、残りのノードのリストはnodes()で必要になった時に作る
+
+    Args:
+        nodes: 選択されたノード (最も高い優先度の降順)
+    """
+    __slots__ = ("_nodes", "_is_excluded", "_size", "_end", "_lowest_priority_heap", "_prefix_utilizations")
+
+    def __init__(self, nodes: List[Node]):
+        self._nodes: List[Node] = list(nodes)
+        self._is_excluded: List[bool] = [False] * len(self._nodes)
+        self._size: int = len(self._nodes)
+        self._end: int = len(self._nodes)  # 末尾から除外した位置 (ここより後ろは除外済み)
+        self._lowest_priority_heap: List[Tuple[int, int]] = None  # (ノード内の最も低い優先度, index) (必要になってから作る)
+
+        # 先頭からの利用率の累積和
+        # NOTE: 左から順に足しているので sum([node.utilization for node in nodes[:m]]) と同じ値になる
+        self._prefix_utilizations: List[float] = [0]
+        for node in self._nodes:
+            self._prefix_utilizations.append(self._prefix_utilizations[-1] + node.utilization)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def utilization(self) -> float:
+        """残っているノードの利用率の合計"""
+        if self._lowest_priority_heap is None:
+            return self._prefix_utilizations[self._end]  # 末尾からしか除外していない場合
+        return sum([node.utilization for node in self.nodes()])
+
+    def nodes(self) -> List[Node]:
+        """残っているノード (最も高い優先度の降順)"""
+        return [node for node, is_excluded in zip(self._nodes[:self._end], self._is_excluded) if not is_excluded]
+
+    def exclude_lowest_priority(self) -> Node:
+        """最も優先度の低いコールバックを含むノードを除外して返す
+        NOTE: コールバックの優先度は全て異なるので、除外するノードは一つに決まる
+        """
+        if self._lowest_priority_heap is None:
+            self._lowest_priority_heap = [
+                (node.lowest_priority, i) for i, node in enumerate(self._nodes[:self._end]) if not self._is_excluded[i]
+            ]
+            heapq.heapify(self._lowest_priority_heap)
+
+        _, i = heapq.heappop(self._lowest_priority_heap)
+        while self._is_excluded[i]:  # exclude_last()で既に除外されたノードは飛ばす
+            _, i = heapq.heappop(self._lowest_priority_heap)
+        self._is_excluded[i] = True
+        self._size -= 1
+        return self._nodes[i]
+
+    def exclude_last(self) -> Node:
+        """最も高い優先度が最も低いノード (末尾のノード) を除外して返す"""
+        self._end -= 1
+        while self._is_excluded[self._end]:
+            self._end -= 1
+        self._is_excluded[self._end] = True
+        self._size -= 1
+        return self._nodes[self._end]
@@ -0,0 +1,114 @@
+import heapq
+import math
+from typing import Dict, Iterable
+
+DEFAULT_RELATIVE_ACCURACY = 0.01  # 分位点の相対誤差
+DEFAULT_MAX_BINS = 2048  # ビンの数の上限 (これを超えると小さい値のビンからまとめる)
+
+
+class QuantileSketch:
+    """値を全て持たずに分位点を求めるストリーミングスケッチ (DDSketchと同じ対数のビン)
+
+    正の値 x を ceil(log_γ(x)) 番目のビンに数える (γ = (1 + α) / (1 - α), α: 相対誤差)
+    ビンの上端を返すので、返す分位点は真の値以上、真の値のγ倍 (約 1 + 2α 倍) 以下になる (最悪実行時間を過小評価しない)
+    ビンの数が上限を超えた場合は小さい値のビンからまとめるので、高い分位点の精度は保たれる
+    NOTE: 0以下の値は0として数える
+
+    Args:
+        relative_accuracy: 分位点の相対誤差α
+        max_bins: ビンの数の上限 (メモリ使用量の上限)
+    """
+    __slots__ = ("relative_accuracy", "max_bins", "count", "min", "max", "_log_gamma", "_bins", "_zero_count")
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY, max_bins: int = DEFAULT_MAX_BINS):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"relative_accuracy must be in (0, 1): {relative_accuracy}")
+        self.relative_accuracy: float = relative_accuracy
+        self.max_bins: int = max_bins
+        self.count: int = 0  # 加えた値の数
+        self.min: float = None  # 加えた値の最小値
+        self.max: float = None  # 加えた値の最大値
+        self._log_gamma: float = math.log((1 + relative_accuracy) / (1 - relative_accuracy))
+        self._bins: Dict[int, int] = {}  # ビンの番号 -> 値の数
+        self._zero_count: int = 0  # 0以下の値の数
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if value <= 0:
+            self._zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self._bins[index] = self._bins.get(index, 0) + 1
+        if len(self._bins) > self.max_bins:
+            self._collapse()
+
+    def add_all(self, values: Iterable[float]) -> None:
+        """まとめて加える (add()を値ごとに呼ぶより速い)"""
+        values = list(values)
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        min_value = min(values)
+        max_value = max(values)
+        if self.min is None or min_value < self.min:
+            self.min = min_value
+        if self.max is None or max_value > self.max:
+            self.max = max_value
+
+        bins = self._bins
+        log = math.log
+        ceil = math.ceil
+        log_gamma = self._log_gamma
+        for value in values:
+            if value <= 0:
+                self._zero_count += 1
+                continue
+            index = ceil(log(value) / log_gamma)
+            bins[index] = bins.get(index, 0) + 1
+        while len(bins) > self.max_bins:
+            self._collapse()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """同じ相対誤差の別のスケッチを足し合わせる (チャンクごとや並列に作ったものをまとめる)"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("cannot merge sketches with different relative accuracies")
+        if other.count == 0:
+            return
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._zero_count += other._zero_count
+        for index, count in other._bins.items():
+            self._bins[index] = self._bins.get(index, 0) + count
+        while len(self._bins) > self.max_bins:
+            self._collapse()
+
+    def quantile(self, q: float) -> float:
+        """q分位点 (0 <= q <= 1) の上界 (値がなければNone)
+        NOTE: 観測された最大値を超える値は返さない
+        """
+        if not 0 <= q <= 1:
+            raise ValueError(f"quantile must be in [0, 1]: {q}")
+        if self.count == 0:
+            return None
+        if q == 1:
+            return self.max
+
+        rank = math.ceil(q * (self.count - 1))  # 0から数えた順位 (間にある場合は大きい方の値)
+        if rank < self._zero_count:
+            return 0
+        seen = self._zero_count
+        for index in sorted(self._bins):
+            seen += self._bins[index]
+            if seen > rank:
+                return min(math.exp(index * self._log_gamma), self.max)  # ビンの上端
+        return self.max
+
+    def _collapse(self) -> None:
+        """最も小さい2つのビンを、大きい方のビンにまとめる"""
+        lowest, second = heapq.nsmallest(2, self._bins)
+        self._bins[second] += self._bins.pop(lowest)
@@ -0,0 +1,90 @@
+import heapq
+from bisect import bisect_left, insort
+from typing import Dict, List, Set, Tuple
+
+from .core import Core
+from .executor import Executor
+
+
+class CorePool:
+    """コアを利用率の昇順に並べたインデックス
+
+    コアの利用率が変わるとCoreから update() が呼ばれて並び順を保つ
+    「利用率 u を足しても1以下になるコア (利用率の昇順)」を O(log m + k) で返す
+    NOTE: 利用率が同じ場合はコアidの小さい順 (コアを利用率で安定ソートした時と同じ)
+    """
+    __slots__ = ("_entries", "_key_by_core_id", "_core_by_id")
+
+    def __init__(self, cores: List[Core]):
+        self._core_by_id: Dict[int, Core] = {core.core_id: core for core in cores}
+        self._key_by_core_id: Dict[int, Tuple[float, int]] = {core.core_id: (core.utilization, core.core_id) for core in cores}
+        self._entries: List[Tuple[float, int]] = sorted(self._key_by_core_id.values())  # (利用率, コアid) の昇順
+        for core in cores:
+            core.pool = self
+
+    def update(self, core: Core) -> None:
+        """コアの利用率が変わった時に並び順を更新する"""
+        old_key = self._key_by_core_id[core.core_id]
+        new_key = (core.utilization, core.core_id)
+        if old_key == new_key:
+            return
+        del self._entries[bisect_left(self._entries, old_key)]
+        insort(self._entries, new_key)
+        self._key_by_core_id[core.core_id] = new_key
+
+    def cores_fitting(self, utilization: float) -> List[Core]:
+        """utilization + (コアの利用率) <= 1 となるコアを利用率の昇順で返す
+        NOTE: 1 - utilization と比べると丸め誤差で結果が変わりうるので、元の式のまま二分探索する
+        """
+        lo, hi = 0, len(self._entries)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if utilization + self._entries[mid][0] <= 1:
+                lo = mid + 1
+            else:
+                hi = mid
+        return [self._core_by_id[core_id] for _, core_id in self._entries[:lo]]
+
+
+class FreeExecutorPool:
+    """空のエグゼキューター (コールバックが割り当てられていないエグゼキューター) を優先度順に持つプール
+
+    エグゼキューターのコールバックが変わるとExecutorから update() が呼ばれる
+    最も優先度の高い空のエグゼキューターは、空でなくなったものをヒープから遅延して捨てながら O(log n) で返す
+    """
+    __slots__ = ("_heap", "_in_heap", "_free_executor_ids", "_executor_by_id")
+
+    def __init__(self, executors: List[Executor]):
+        self._executor_by_id: Dict[int, Executor] = {exe.executor_id: exe for exe in executors}
+        self._free_executor_ids: Set[int] = {exe.executor_id for exe in executors if len(exe.callbacks) == 0}
+        self._heap: List[Tuple[int, int]] = [
+            (-self._executor_by_id[exe_id].priority, exe_id) for exe_id in self._free_executor_ids
+        ]  # (-優先度, エグゼキューターid)
+        heapq.heapify(self._heap)
+        self._in_heap: Set[int] = set(self._free_executor_ids)
+        for exe in executors:
+            exe.pool = self
+
+    def __len__(self) -> int:
+        """空のエグゼキューターの数"""
+        return len(self._free_executor_ids)
+
+    def update(self, executor: Executor) -> None:
+        """エグゼキューターのコールバックが変わった時に空かどうかを更新する"""
+        if len(executor.callbacks) == 0:
+            self._free_executor_ids.add(executor.executor_id)
+            if executor.executor_id not in self._in_heap:
+                heapq.heappush(self._heap, (-executor.priority, executor.executor_id))
+                self._in_heap.add(executor.executor_id)
+        else:
+            self._free_executor_ids.discard(executor.executor_id)  # ヒープからは取り出す時に捨てる
+
+    def highest_priority(self) -> Executor:
+        """最も優先度の高い空のエグゼキューター (なければNone)"""
+        while len(self._heap) != 0:
+            _, exe_id = self._heap[0]
+            if exe_id in self._free_executor_ids:
+                return self._executor_by_id[exe_id]
+            heapq.heappop(self._heap)  # もう空ではない
+            self._in_heap.discard(exe_id)
+        return None
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+DEFAULT_MAX_SIZE = 65536  # キャッシュするチェック結果の最大数
+
+
+class StrategyCache:
+    """戦略のチェック結果をメモ化するLRUキャッシュ
+
+    キーはエグゼキューターやコアのバージョン (components/version.py) から作るので、
+    割り当てで内容が変わると自動的に別のキーになり、古い結果は使われない
+    max_sizeを超えたら最も長く使われていない結果から捨てる
+
+    Args:
+        max_size: キャッシュする結果の最大数 (0の場合はキャッシュしない)
+    """
+    __slots__ = ("max_size", "hits", "misses", "evictions", "_results")
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE):
+        self.max_size: int = max_size
+        self.hits: int = 0  # キャッシュにあった回数
+        self.misses: int = 0  # キャッシュになかった回数
+        self.evictions: int = 0  # 上限を超えて捨てた回数
+        self._results: OrderedDict = OrderedDict()  # キー -> チェック結果
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """キャッシュされた結果を返す (なければNone)"""
+        result = self._results.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self._results.move_to_end(key)  # 最近使われたものを末尾に
+        self.hits += 1
+        return result
+
+    def put(self, key: Hashable, result: Any) -> None:
+        self._results[key] = result
+        if len(self._results) > self.max_size:
+            self._results.popitem(last=False)  # 最も長く使われていないものを捨てる
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._results.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._results),
+        }
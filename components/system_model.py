@@ -0,0 +1,85 @@
+from typing import Dict, Iterable, List, Optional
+
+from .callback import CallBack
+from .callback_store import CallbackStore
+from .chain import Chain
+from .core import Core
+from .decision_trace import DISABLED_TRACE, DecisionTrace
+from .executor import Executor
+from .instrumentation import DISABLED_INSTRUMENTATION, Instrumentation
+from .node import Node
+from .resource_pool import CorePool, FreeExecutorPool
+from .strategy_cache import StrategyCache
+
+
+class SystemModel:
+    """システム全体のコンポーネントをまとめたモデル
+    idからコンポーネントを定数時間で引けるようにインデックスを持つ
+    """
+    def __init__(
+        self,
+        callbacks: List[CallBack],
+        chains: List[Chain],
+        nodes: List[Node],
+        executors: List[Executor],
+        cores: List[Core],
+        callback_store: Optional[CallbackStore] = None,
+    ):
+        self.callbacks: List[CallBack] = callbacks  # コールバックの集合
+        self.chains: List[Chain] = chains  # チェインの集合
+        self.nodes: List[Node] = nodes  # ノードの集合
+        self.executors: List[Executor] = executors  # エグゼキューターの集合
+        self.cores: List[Core] = cores  # コアの集合
+        self.callback_store: Optional[CallbackStore] = callback_store  # 列指向のコールバックストア (使わない場合はNone)
+        self.num_partC_fallbacks: int = 0  # PartCで無理やり割り当てた回数
+        self.instrumentation: Instrumentation = DISABLED_INSTRUMENTATION  # 計測 (RunProgressで差し替える)
+        self.trace: DecisionTrace = DISABLED_TRACE  # 割り当ての判断の記録 (RunProgressで差し替える)
+        self.strategy_cache: StrategyCache = StrategyCache()  # 戦略のチェック結果のメモ化
+        self.core_pool: CorePool = CorePool(cores)  # 利用率の昇順に並べたコア
+        self.free_executor_pool: FreeExecutorPool = FreeExecutorPool(executors)  # 空のエグゼキューター
+
+        # id -> コンポーネント のインデックス
+        self._callback_by_id: Dict[int, CallBack] = {cb.callback_id: cb for cb in callbacks}
+        self._chain_by_id: Dict[int, Chain] = {chain.chain_id: chain for chain in chains}
+        self._node_by_id: Dict[int, Node] = {node.node_id: node for node in nodes}
+        self._executor_by_id: Dict[int, Executor] = {exe.executor_id: exe for exe in executors}
+        self._core_by_id: Dict[int, Core] = {core.core_id: core for core in cores}
+
+    @property
+    def num_callbacks(self) -> int:
+        return len(self.callbacks)
+
+    @property
+    def num_chains(self) -> int:
+        return len(self.chains)
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def num_executors(self) -> int:
+        return len(self.executors)
+
+    @property
+    def num_cores(self) -> int:
+        return len(self.cores)
+
+    def get_callback(self, callback_id: int) -> CallBack:
+        return self._callback_by_id[callback_id]
+
+    def get_chain(self, chain_id: int) -> Chain:
+        return self._chain_by_id[chain_id]
+
+    def get_node(self, node_id: int) -> Node:
+        return self._node_by_id[node_id]
+
+    def get_executor(self, executor_id: int) -> Executor:
+        return self._executor_by_id[executor_id]
+
+    def get_core(self, core_id: int) -> Core:
+        return self._core_by_id[core_id]
+
+    def get_chains(self, chain_ids: Iterable[int]) -> List[Chain]:
+        """チェインidの集合からチェインを抽出 (チェインid順)"""
+        return [self._chain_by_id[chain_id] for chain_id in sorted(set(chain_ids))]
@@ -0,0 +1,127 @@
+from typing import Any, Callable, List, Tuple
+
+from .callback import CallBack
+from .core import Core
+from .executor import Executor
+
+
+class AssignmentTransaction:
+    """コールバック->エグゼキューター、エグゼキューター->コアの割り当てを仮に行うためのトランザクション
+
+    begin()の後に行った割り当て (と取り除き) を、commit()で確定、rollback()で取り消す
+    割り当てのたびに元に戻す操作を記録 (undo log) しておき、rollback()ではそれを逆順に実行するので、
+    エグゼキューターやコアを初期化して作り直す必要がなく、割り当てた分だけのコストで元に戻せる
+    NOTE: 取り消しにはExecutor.remove_callbacks()とCore.remove_executor()を使うので、
+          既に割り当てられているコールバックやエグゼキューターを重ねて割り当てた場合は元に戻せない
+    """
+    __slots__ = ("is_active", "_undo_log")
+
+    def __init__(self):
+        self.is_active: bool = False  # トランザクション中かどうか
+        self._undo_log: List[Tuple[Callable[..., None], Tuple[Any, ...]]] = []  # (元に戻す関数, 引数)
+
+    def begin(self) -> None:
+        if self.is_active:
+            raise RuntimeError("transaction has already begun")
+        self.is_active = True
+        self._undo_log = []
+
+    def commit(self) -> None:
+        """仮の割り当てを確定する"""
+        self._check_active()
+        self.is_active = False
+        self._undo_log = []
+
+    def rollback(self) -> None:
+        """begin()以降の割り当てを逆順に取り消す"""
+        self._check_active()
+        for undo, args in reversed(self._undo_log):
+            undo(*args)
+        self.is_active = False
+        self._undo_log = []
+
+    def assign_callbacks(self, executor: Executor, callbacks: List[CallBack]) -> None:
+        """コールバックをエグゼキューターに仮に割り当てる"""
+        self._check_active()
+        callbacks = list(callbacks)
+        prev_executor_ids = [cb.assigned_executor_id for cb in callbacks]
+        prev_utilization = executor.utilization
+        executor.assign_callbacks(callbacks)
+        self._undo_log.append((_undo_assign_callbacks, (executor, callbacks, prev_executor_ids, prev_utilization)))
+
+    def remove_callbacks(self, executor: Executor, callbacks: List[CallBack]) -> None:
+        """コールバックをエグゼキューターから仮に取り除く"""
+        self._check_active()
+        callbacks = list(callbacks)
+        prev_executor_ids = [cb.assigned_executor_id for cb in callbacks]
+        prev_utilization = executor.utilization
+        executor.remove_callbacks(callbacks)
+        self._undo_log.append((_undo_remove_callbacks, (executor, callbacks, prev_executor_ids, prev_utilization)))
+
+    def assign_executor(self, core: Core, executor: Executor) -> None:
+        """エグゼキューターをコアに仮に割り当てる"""
+        self._check_active()
+        prev_core_id = executor.assigned_core_id
+        prev_utilization = core.utilization
+        core.assign_executor(executor)
+        self._undo_log.append((_undo_assign_executor, (core, executor, prev_core_id, prev_utilization)))
+
+    def remove_executor(self, core: Core, executor: Executor) -> None:
+        """エグゼキューターをコアから仮に取り除く"""
+        self._check_active()
+        index = core.executors.index(executor)
+        prev_core_id = executor.assigned_core_id
+        prev_utilization = core.utilization
+        recorded_utilization = core.remove_executor(executor)
+        self._undo_log.append(
+            (_undo_remove_executor, (core, executor, index, prev_core_id, recorded_utilization, prev_utilization))
+        )
+
+    def update_executor_utilization(self, core: Core, executor: Executor) -> None:
+        """コアに割り当て済みのエグゼキューターのコールバックが変わった後に、コアの利用率を仮に更新する"""
+        self._check_active()
+        prev_utilization = core.utilization
+        recorded_utilization = core.update_executor_utilization(executor)
+        self._undo_log.append((_undo_update_executor_utilization, (core, executor, recorded_utilization, prev_utilization)))
+
+    def _check_active(self) -> None:
+        if not self.is_active:
+            raise RuntimeError("transaction has not begun")
+
+
+def _undo_assign_callbacks(executor: Executor, callbacks: List[CallBack], prev_executor_ids: List[int], prev_utilization: float) -> None:
+    executor.remove_callbacks(callbacks)
+    executor.utilization = prev_utilization  # 引き算による浮動小数点の誤差を残さない
+
+    # 各コールバックのエグゼキューターの登録を割り当て前に戻す
+    for cb, prev_executor_id in zip(callbacks, prev_executor_ids):
+        cb.set_assigned_executor(prev_executor_id)
+
+
+def _undo_assign_executor(core: Core, executor: Executor, prev_core_id: int, prev_utilization: float) -> None:
+    core.remove_executor(executor)
+    core.utilization = prev_utilization  # 引き算による浮動小数点の誤差を残さない
+    executor.set_assigned_core(prev_core_id)
+
+
+def _undo_remove_callbacks(executor: Executor, callbacks: List[CallBack], prev_executor_ids: List[int], prev_utilization: float) -> None:
+    executor.assign_callbacks(callbacks)
+    executor.utilization = prev_utilization  # 足し算による浮動小数点の誤差を残さない
+
+    # 各コールバックのエグゼキューターの登録を取り除く前に戻す
+    for cb, prev_executor_id in zip(callbacks, prev_executor_ids):
+        cb.set_assigned_executor(prev_executor_id)
+
+
+def _undo_remove_executor(
+    core: Core, executor: Executor, index: int, prev_core_id: int, recorded_utilization: float, prev_utilization: float
+) -> None:
+    core.assign_executor(executor, index)
+    core.update_executor_utilization(executor, recorded_utilization)  # 取り除いた時に記録されていた利用率に戻す
+    core.utilization = prev_utilization
+    executor.set_assigned_core(prev_core_id)
+
+
+def _undo_update_executor_utilization(core: Core, executor: Executor, recorded_utilization: float, prev_utilization: float) -> None:
+    core.update_executor_utilization(executor, recorded_utilization)
+    core.utilization = prev_utilization
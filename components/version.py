@@ -0,0 +1,12 @@
+import itertools
+
+_versions = itertools.count()
+
+
+def next_version() -> int:
+    """新しいバージョンを返す (プロセス内で一意)
+
+    エグゼキューターやコアは内容が変わるたびにバージョンを振り直すので、
+    バージョンが同じであれば内容も同じとみなせる (戦略のチェックのメモ化のキーに使う)
+    """
+    return next(_versions)
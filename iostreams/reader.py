@@ -1,10 +1,241 @@
+import csv
+import json
 from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, TextIO, Tuple
 
 import yaml
 
+from components.input_keys import iter_input_callbacks, parse_callback_id
 
-def read_input(file_path: Path):
-    with open(file_path, 'r') as yml:
-        input = yaml.safe_load(yml)
+try:
+    # libyamlがあればCで実装されたローダーを使う
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+HEADER_KEYS = ("num_cpus", "num_executors")  # コールバック以外の入力 (必須)
+
+
+class CallbackStream:
+    """ストリーミングで読み込む (callback_id, コールバックの情報) のイテレーター
+
+    最後まで読むか、close()を呼ぶと入力ファイルを閉じる
+    途中で例外が起きても入力ファイルが開いたままにならないように、withで使うかclose_input()を呼ぶ
+    """
+    __slots__ = ("_callbacks", "_file")
+
+    def __init__(self, callbacks: Iterator[Tuple[int, Dict[str, Any]]], file: Optional[TextIO] = None):
+        self._callbacks = callbacks
+        self._file = file
+
+    def __iter__(self) -> "CallbackStream":
+        return self
+
+    def __next__(self) -> Tuple[int, Dict[str, Any]]:
+        return next(self._callbacks)
+
+    def close(self) -> None:
+        """読み終わっていなくても入力ファイルを閉じる (何度呼んでもよい)"""
+        self._callbacks.close()
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self) -> "CallbackStream":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def read_input(file_path: Path, streaming: bool = False) -> Dict[str, Any]:
+    """入力ファイルを読み込む
+
+    拡張子によって形式を判断する
+        .yaml / .yml: これまで通りのyaml
+        .json: yamlと同じ構造のjson
+        .csv: コールバックの表 (先頭のコメント行に "# num_cpus: 4" のようにヘッダを書く)
+
+    Args:
+        file_path: 入力ファイルのパス
+        streaming: Trueの場合、"callbacks"は (callback_id, コールバックの情報) を順に返すCallbackStreamになり、
+            ファイル全体を辞書にせずにコンポーネントを作れる (使い終わったらclose_input()で入力ファイルを閉じる)
+            NOTE: yamlの場合はnum_cpus, num_executors (とchains) がcallbacksより前に書かれている必要がある
+                (chainsがcallbacksより後に書かれている場合は、コールバックを読み終えた時にValueErrorになる)
+            NOTE: jsonは一度全体を読み込んでからイテレーターにする
+    """
+    file_path = Path(file_path)
+    suffix = file_path.suffix.lower()
+    if suffix in (".yaml", ".yml"):
+        if streaming:
+            return _stream_yaml_input(file_path)
+        with open(file_path, 'r') as yml:
+            input = yaml.load(yml, Loader=SafeLoader)
+    elif suffix == ".json":
+        with open(file_path, 'r') as js:
+            input = json.load(js)
+        if streaming:
+            input["callbacks"] = CallbackStream(iter_input_callbacks(input["callbacks"]))
+    elif suffix == ".csv":
+        input = _stream_csv_input(file_path)
+        if not streaming:
+            with input["callbacks"] as callbacks:
+                input["callbacks"] = {f"cb{callback_id}": cb for callback_id, cb in callbacks}
+    else:
+        raise ValueError(f"unsupported input format: {file_path}")
     return input
 
+
+def close_input(input: Dict[str, Any]) -> None:
+    """ストリーミングで読み込んだ入力ファイルを閉じる (ストリーミングでなければ何もしない)"""
+    callbacks = input.get("callbacks")
+    if isinstance(callbacks, CallbackStream):
+        callbacks.close()
+
+
+def _stream_yaml_input(file_path: Path) -> Dict[str, Any]:
+    """yamlをイベント単位で読み、コールバックを一つずつ返す"""
+    file = open(file_path, 'r')
+    try:
+        events = yaml.parse(file, Loader=SafeLoader)
+        input: Dict[str, Any] = {}
+
+        # トップレベルのマッピングの開始まで読み飛ばす
+        for event in events:
+            if isinstance(event, yaml.MappingStartEvent):
+                break
+
+        # callbacksが来るまでヘッダを読む
+        for event in events:
+            if isinstance(event, yaml.MappingEndEvent):
+                break
+            key = event.value
+            if key == "callbacks":
+                input["callbacks"] = CallbackStream(_iter_yaml_callbacks(file, events, file_path), file)
+                break
+            input[key] = _construct_value(next(events), events)
+
+        missing_keys = [key for key in HEADER_KEYS if key not in input]
+        if len(missing_keys) != 0:
+            raise ValueError(f"{missing_keys} must be written before callbacks to read {file_path} in streaming mode")
+    except BaseException:
+        file.close()  # ヘッダを読めなかった場合はコールバックを返さないので、ここで閉じる
+        raise
+    return input
+
+
+def _iter_yaml_callbacks(file: TextIO, events: Iterator[yaml.Event], file_path: Path) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """callbacksのマッピングを読み、(callback_id, コールバックの情報) を返す
+    callbacksより後に書かれたヘッダ (chainsなど) は読めないので、あればValueErrorにする
+    (黙って捨てると、デッドラインが周期になったまま優先度を割り当ててしまう)
+    """
+    try:
+        next(events)  # callbacksのマッピングの開始
+        for event in events:
+            if isinstance(event, yaml.MappingEndEvent):
+                break  # callbacksのマッピングの終了
+            callback_id = parse_callback_id(event.value)
+
+            next(events)  # コールバックのマッピングの開始
+            cb: Dict[str, Any] = {}
+            for cb_event in events:
+                if isinstance(cb_event, yaml.MappingEndEvent):
+                    break  # コールバックのマッピングの終了
+                cb[cb_event.value] = _construct_scalar(next(events))
+            yield callback_id, cb
+
+        # callbacksの後のトップレベルのキー
+        late_keys = []
+        for event in events:
+            if isinstance(event, yaml.MappingEndEvent):
+                break  # トップレベルのマッピングの終了
+            if event.value in HEADER_KEYS + ("chains",):
+                late_keys.append(event.value)
+            _construct_value(next(events), events)  # 値は読み飛ばす
+        if len(late_keys) != 0:
+            raise ValueError(f"{late_keys} must be written before callbacks to read {file_path} in streaming mode")
+    finally:
+        file.close()
+
+
+_resolver = yaml.resolver.Resolver()
+_constructor = yaml.constructor.SafeConstructor()
+
+def _construct_value(event: yaml.Event, events: Iterator[yaml.Event]) -> Any:
+    """ヘッダの値 (スカラー, またはchainsのようなマッピングやシーケンス) をpythonの値に変換する"""
+    if isinstance(event, yaml.MappingStartEvent):
+        mapping: Dict[Any, Any] = {}
+        for key_event in events:
+            if isinstance(key_event, yaml.MappingEndEvent):
+                return mapping
+            key = _construct_value(key_event, events)
+            mapping[key] = _construct_value(next(events), events)
+    if isinstance(event, yaml.SequenceStartEvent):
+        sequence = []
+        for item_event in events:
+            if isinstance(item_event, yaml.SequenceEndEvent):
+                return sequence
+            sequence.append(_construct_value(item_event, events))
+    return _construct_scalar(event)
+
+
+def _construct_scalar(event: yaml.ScalarEvent) -> Any:
+    """スカラーのイベントをpythonの値 (int, float, str, ...) に変換する"""
+    tag = event.tag
+    if tag is None or tag == "!":
+        tag = _resolver.resolve(yaml.ScalarNode, event.value, event.implicit)
+    return _constructor.construct_object(yaml.ScalarNode(tag, event.value))
+
+
+def _stream_csv_input(file_path: Path) -> Dict[str, Any]:
+    """コールバックの表 (csv) を読み、コールバックを一つずつ返す
+
+    # num_cpus: 4
+    # num_executors: 18
+    callback_id,period,exec,node_id,chain_id,node_name
+    0,80,2.3,0,0,
+    ...
+    """
+    file = open(file_path, 'r', newline='')
+    try:
+        input: Dict[str, Any] = {}
+
+        # 先頭のコメント行からヘッダを読む
+        line = file.readline()
+        while line.startswith("#"):
+            key, value = line[1:].split(":", 1)
+            input[key.strip()] = _parse_number(value.strip())
+            line = file.readline()
+
+        missing_keys = [key for key in HEADER_KEYS if key not in input]
+        if len(missing_keys) != 0:
+            raise ValueError(f"{missing_keys} must be written as comment lines at the top of {file_path}")
+
+        columns = next(csv.reader([line]))
+    except BaseException:
+        file.close()
+        raise
+    input["callbacks"] = CallbackStream(_iter_csv_callbacks(file, columns), file)
+    return input
+
+
+def _iter_csv_callbacks(file: TextIO, columns: list) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """csvの各行から (callback_id, コールバックの情報) を返す"""
+    try:
+        for row in csv.DictReader(file, fieldnames=columns):
+            callback_id = int(row.pop("callback_id"))
+            cb: Dict[str, Any] = {}
+            for key, value in row.items():
+                if value is None or value == "":
+                    continue  # 空欄 (node_nameなど) は書かれていないものとして扱う
+                cb[key] = value if key == "node_name" else _parse_number(value)
+            yield callback_id, cb
+    finally:
+        file.close()
+
+
+def _parse_number(value: str):
+    """intとして読めればint、そうでなければfloat"""
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
@@ -0,0 +1,162 @@
+"""入力の内容をキーにした、エグゼキューターとコアの割り当て結果のディスクキャッシュ
+
+同じ入力で何度も実行する場合に、executor_core_assignment()を省略して保存した割り当て結果を反映する
+キーは以下のハッシュ (yamlの書き方やキーの順番が違っても、読み込んだ結果が同じなら同じキーになる)
+    - コールバックごとの (最悪実行時間, 周期, ノードid, チェインid, タイマーコールバックか) をid順に並べたもの
+    - num_cpus, num_executors
+    - 割り当てアルゴリズムのバージョン (SCHEDULER_VERSION) と、結果が変わるオプション
+キャッシュの合計サイズが上限を超えると、最後に使われた時刻が古いものから消す (LRU)
+
+Usage:
+    $ python -m iostreams.result_cache ./data/result_cache --clear
+"""
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List
+
+from algos.executor_core_assignment.assignment import SCHEDULER_VERSION
+from components.system_model import SystemModel
+
+DEFAULT_MAX_BYTES = 256 << 20  # キャッシュの合計サイズの上限 (byte)
+_ENTRY_SUFFIX = ".json"
+
+
+def compute_cache_key(system: SystemModel, num_cpus: int, num_executors: int, options: Dict[str, Any] = None) -> str:
+    """入力の内容を正規化したハッシュ (16進数の文字列)
+
+    Args:
+        system: 初期化済み (周期割り当て済み) のシステム
+        options: 割り当て結果が変わるオプション (decompose など)
+    """
+    sha = hashlib.sha256()
+    header = {
+        "scheduler_version": SCHEDULER_VERSION,
+        "num_cpus": num_cpus,
+        "num_executors": num_executors,
+        "options": options or {},
+    }
+    sha.update(json.dumps(header, sort_keys=True).encode("utf-8"))
+    for cb in sorted(system.callbacks, key=lambda cb: cb.callback_id):
+        row = [cb.wcet, cb.period, cb.node_id, cb.chain_id, cb.is_timer_callback]
+        sha.update(b"\n")
+        sha.update(json.dumps(row).encode("utf-8"))
+    return sha.hexdigest()
+
+
+class ResultCache:
+    """割り当て結果をキーごとに1つのjsonファイルとして保存するディレクトリ
+
+    Args:
+        cache_dir: キャッシュのディレクトリ (無ければ作る)
+        max_bytes: キャッシュの合計サイズの上限 (byte)
+    """
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(exist_ok=True, parents=True)
+        self.max_bytes = max_bytes
+
+    def get(self, key: str) -> Dict[str, Any]:
+        """保存された割り当て結果 (無い、または読めない場合はNone)"""
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "r") as file:
+                entry = json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            _remove(entry_path)  # 書き込み途中などで壊れたものは捨てる
+            return None
+        if entry.get("key") != key:
+            _remove(entry_path)
+            return None
+
+        os.utime(entry_path)  # 最後に使われた時刻を更新する (LRU)
+        return entry["result"]
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        """割り当て結果を保存して、合計サイズが上限を超えていれば古いものから消す"""
+        entry_path = self._entry_path(key)
+        tmp_path = entry_path.with_name(f"{entry_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as file:
+            json.dump({"key": key, "result": result}, file, separators=(",", ":"))
+        os.replace(tmp_path, entry_path)  # 他のプロセスから書き込み途中のものが見えないように置き換える
+        self.evict(keep=entry_path)
+
+    def evict(self, keep: Path = None) -> int:
+        """合計サイズが上限以下になるまで、最後に使われた時刻が古いものから消す
+
+        Args:
+            keep: 消さないエントリー (保存したばかりのもの)
+
+        Returns:
+            消したエントリーの数
+        """
+        entries = []
+        total_bytes = 0
+        for entry_path in self._entry_paths():
+            try:
+                stat = entry_path.stat()
+            except FileNotFoundError:  # 他のプロセスが消した
+                continue
+            entries.append((stat.st_mtime, entry_path, stat.st_size))
+            total_bytes += stat.st_size
+
+        num_evicted = 0
+        for _, entry_path, size in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            if entry_path == keep:
+                continue
+            _remove(entry_path)
+            total_bytes -= size
+            num_evicted += 1
+        return num_evicted
+
+    def clear(self) -> int:
+        """全てのエントリーを消して、消した数を返す"""
+        entry_paths = self._entry_paths()
+        for entry_path in entry_paths:
+            _remove(entry_path)
+        return len(entry_paths)
+
+    def stats(self) -> Dict[str, int]:
+        """エントリーの数と合計サイズ (byte)"""
+        sizes = [entry_path.stat().st_size for entry_path in self._entry_paths()]
+        return {"entries": len(sizes), "bytes": sum(sizes)}
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{_ENTRY_SUFFIX}"
+
+    def _entry_paths(self) -> List[Path]:
+        return list(self.cache_dir.glob(f"*{_ENTRY_SUFFIX}"))
+
+
+def _remove(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="割り当て結果のキャッシュを管理する")
+    parser.add_argument("cache_dir", type=Path)
+    parser.add_argument("--clear", action="store_true", help="全てのエントリーを消す")
+    parser.add_argument("--max-bytes", type=int, default=None, help="合計サイズがこれ以下になるまで古いものから消す")
+    args = parser.parse_args()
+
+    cache = ResultCache(args.cache_dir, args.max_bytes if args.max_bytes is not None else DEFAULT_MAX_BYTES)
+    if args.clear:
+        print(f"removed {cache.clear()} entries")
+    elif args.max_bytes is not None:
+        print(f"removed {cache.evict()} entries")
+    else:
+        stats = cache.stats()
+        print(f"{stats['entries']} entries, {stats['bytes']} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""初期化済みのモデル (周期割り当て済みのコールバック, チェインとノードのまとまり) のバイナリスナップショット
+
+同じ入力でエグゼキューターやCPUの数だけを変えて何度も実行する場合に、
+yamlの読み込みとinitial_components()を省略するために使う
+
+Usage:
+    $ python -m iostreams.snapshot ./data/case_study.yaml ./data/case_study.snap
+"""
+import argparse
+import hashlib
+import mmap
+import struct
+from array import array
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from components.callback import CallBack
+from components.callback_store import CallbackStore
+from components.chain import Chain
+from components.initial_components import build_system_model, initial_components
+from components.node import Node
+from components.system_model import SystemModel
+
+from .reader import read_input
+
+SNAPSHOT_MAGIC = b"PICASSNP"
+SNAPSHOT_VERSION = 1
+
+# magic, version, reserved, 入力ファイルのハッシュ, num_cpus, num_executors, num_callbacks, num_chains, num_nodes
+_HEADER = struct.Struct("<8sHH32s5q")
+
+# コールバックのフラグ
+_FLAG_TIMER = 1  # タイマーコールバック
+_FLAG_INT_WCET = 2  # 最悪実行時間がint
+_FLAG_INT_PERIOD = 4  # 周期がint
+
+
+class SnapshotError(Exception):
+    """スナップショットが読めない、またはバージョンや入力ファイルと合わない"""
+
+
+def compute_source_hash(source_path: Path) -> bytes:
+    """入力ファイルの内容のハッシュ"""
+    sha = hashlib.sha256()
+    with open(source_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.digest()
+
+
+def compile_snapshot(source_path: Path, snapshot_path: Path) -> None:
+    """入力ファイルを読み込んで初期化したモデルをスナップショットに書き出す"""
+    input = read_input(source_path)
+    system = initial_components(input["callbacks"], 0, 0)
+    write_snapshot(snapshot_path, system, input["num_cpus"], input["num_executors"], compute_source_hash(source_path))
+
+
+def write_snapshot(snapshot_path: Path, system: SystemModel, num_cpus: int, num_executors: int, source_hash: bytes) -> None:
+    """初期化済みのモデルをスナップショットに書き出す
+
+    ヘッダの後に以下を順に並べる (8byteの列を先に、1byteの列を後に置く)
+        wcet, period: float64[num_callbacks]
+        node_id, chain_id: int64[num_callbacks]
+        チェインごとのコールバック: offsets int64[num_chains+1], callback_ids int64[num_callbacks]
+        ノードごとのコールバック: offsets int64[num_nodes+1], callback_ids int64[num_callbacks]
+        ノードの利用率: float64[num_nodes]
+        node_nameのoffsets: int64[num_callbacks+1]
+        フラグ: uint8[num_callbacks]
+        node_name: utf-8の文字列を連結したもの
+    """
+    callbacks = system.callbacks
+    chain_offsets, chain_callback_ids = _grouping([chain.callbacks for chain in system.chains])
+    node_offsets, node_callback_ids = _grouping([node.callbacks for node in system.nodes])
+
+    node_names = [cb.node_name.encode("utf-8") for cb in callbacks]
+    node_name_offsets = array("q", [0])
+    for name in node_names:
+        node_name_offsets.append(node_name_offsets[-1] + len(name))
+
+    flags = array("B", [
+        (_FLAG_TIMER if cb.is_timer_callback else 0)
+        | (_FLAG_INT_WCET if isinstance(cb.wcet, int) else 0)
+        | (_FLAG_INT_PERIOD if isinstance(cb.period, int) else 0)
+        for cb in callbacks
+    ])
+
+    header = _HEADER.pack(
+        SNAPSHOT_MAGIC,
+        SNAPSHOT_VERSION,
+        0,
+        source_hash,
+        num_cpus,
+        num_executors,
+        system.num_callbacks,
+        system.num_chains,
+        system.num_nodes,
+    )
+    with open(snapshot_path, "wb") as file:
+        file.write(header)
+        file.write(array("d", [cb.wcet for cb in callbacks]))
+        file.write(array("d", [cb.period for cb in callbacks]))
+        file.write(array("q", [cb.node_id for cb in callbacks]))
+        file.write(array("q", [cb.chain_id for cb in callbacks]))
+        file.write(chain_offsets)
+        file.write(chain_callback_ids)
+        file.write(node_offsets)
+        file.write(node_callback_ids)
+        file.write(array("d", [node.utilization for node in system.nodes]))
+        file.write(node_name_offsets)
+        file.write(flags)
+        file.write(b"".join(node_names))
+
+
+def load_snapshot(
+    snapshot_path: Path,
+    source_path: Path = None,
+    num_executors: int = None,
+    num_cores: int = None,
+    use_callback_store: bool = False,
+) -> Tuple[Dict[str, int], SystemModel]:
+    """スナップショットをメモリマップして、コンポーネントを復元する
+
+    Args:
+        snapshot_path: スナップショットのパス
+        source_path: 指定された場合、入力ファイルのハッシュと一致しなければSnapshotErrorを投げる
+        num_executors, num_cores: 指定されなければ入力ファイルに書かれていた数を使う
+        use_callback_store: 列指向のコールバックストアを作るかどうか
+
+    Returns:
+        input_header: {"num_cpus": ..., "num_executors": ...} (実際に使う数)
+        system: エグゼキューターとコアを加えたシステム
+    """
+    if Path(snapshot_path).stat().st_size < _HEADER.size:
+        raise SnapshotError(f"{snapshot_path} is not a snapshot")
+    with open(snapshot_path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                header, callbacks, chains, nodes = _read_snapshot(view, snapshot_path, source_path)
+            finally:
+                view.release()
+
+    input_header = {
+        "num_cpus": num_cores if num_cores is not None else header["num_cpus"],
+        "num_executors": num_executors if num_executors is not None else header["num_executors"],
+    }
+    callback_store = CallbackStore(callbacks) if use_callback_store else None
+    system = build_system_model(
+        callbacks, chains, nodes, input_header["num_executors"], input_header["num_cpus"], callback_store
+    )
+    return input_header, system
+
+
+def load_or_compile_snapshot(
+    source_path: Path,
+    snapshot_path: Path,
+    num_executors: int = None,
+    num_cores: int = None,
+    use_callback_store: bool = False,
+) -> Tuple[Dict[str, int], SystemModel]:
+    """スナップショットが入力ファイルと一致すれば読み込み、そうでなければ作り直してから読み込む"""
+    try:
+        return load_snapshot(snapshot_path, source_path, num_executors, num_cores, use_callback_store)
+    except (FileNotFoundError, SnapshotError):
+        compile_snapshot(source_path, snapshot_path)
+        return load_snapshot(snapshot_path, source_path, num_executors, num_cores, use_callback_store)
+
+
+def _read_snapshot(view: memoryview, snapshot_path: Path, source_path: Path) -> Tuple[Dict[str, int], List[CallBack], List[Chain], List[Node]]:
+    """メモリマップしたスナップショットからコンポーネントを復元する"""
+    (
+        magic,
+        version,
+        _,
+        source_hash,
+        num_cpus,
+        num_executors,
+        num_callbacks,
+        num_chains,
+        num_nodes,
+    ) = _HEADER.unpack_from(view)
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotError(f"{snapshot_path} is not a snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotError(f"{snapshot_path} has version {version}, expected {SNAPSHOT_VERSION}")
+    if source_path is not None and source_hash != compute_source_hash(source_path):
+        raise SnapshotError(f"{snapshot_path} is out of date with {source_path}")
+
+    reader = _SectionReader(view, _HEADER.size)
+    wcets = reader.read("d", num_callbacks)
+    periods = reader.read("d", num_callbacks)
+    node_ids = reader.read("q", num_callbacks)
+    chain_ids = reader.read("q", num_callbacks)
+    chain_offsets = reader.read("q", num_chains + 1)
+    chain_callback_ids = reader.read("q", num_callbacks)
+    node_offsets = reader.read("q", num_nodes + 1)
+    node_callback_ids = reader.read("q", num_callbacks)
+    node_utilizations = reader.read("d", num_nodes)
+    node_name_offsets = reader.read("q", num_callbacks + 1)
+    flags = reader.read("B", num_callbacks)
+    node_names_section = reader.read_bytes(node_name_offsets[-1])
+    node_names = bytes(node_names_section)
+    node_names_section.release()
+
+    # create callback instance
+    callbacks: List[CallBack] = []
+    for id in range(num_callbacks):
+        flag = flags[id]
+        wcet = int(wcets[id]) if flag & _FLAG_INT_WCET else wcets[id]
+        period = int(periods[id]) if flag & _FLAG_INT_PERIOD else periods[id]
+        node_name = node_names[node_name_offsets[id]:node_name_offsets[id+1]].decode("utf-8")
+        callback = CallBack(
+            callback_id=id,
+            wcet=wcet,
+            period=period if flag & _FLAG_TIMER else 0,
+            node_id=node_ids[id],
+            chain_id=chain_ids[id],
+            node_name=node_name,
+        )
+        callback.period = period  # 割り当て済みの周期
+        callbacks.append(callback)
+
+    # create chain instance
+    chains: List[Chain] = []
+    for chain_id in range(num_chains):
+        cur_chain_callbacks = [callbacks[id] for id in chain_callback_ids[chain_offsets[chain_id]:chain_offsets[chain_id+1]]]
+        chains.append(Chain(chain_id=chain_id, callbacks=cur_chain_callbacks))
+
+    # create node instance
+    nodes: List[Node] = []
+    for node_id in range(num_nodes):
+        cur_node_callbacks = [callbacks[id] for id in node_callback_ids[node_offsets[node_id]:node_offsets[node_id+1]]]
+        nodes.append(Node(node_id=node_id, callbacks=cur_node_callbacks, utilization=node_utilizations[node_id]))
+
+    header = {"num_cpus": num_cpus, "num_executors": num_executors}
+    return header, callbacks, chains, nodes
+
+
+class _SectionReader:
+    """メモリマップした領域から順に配列を読み出す"""
+    def __init__(self, view: memoryview, offset: int):
+        self.view = view
+        self.offset = offset
+
+    def read(self, typecode: str, length: int) -> list:
+        size = struct.calcsize(typecode) * length
+        section = self.read_bytes(size)
+        values = section.cast(typecode).tolist()
+        section.release()
+        return values
+
+    def read_bytes(self, size: int) -> memoryview:
+        if self.offset + size > len(self.view):
+            raise SnapshotError("snapshot is truncated")
+        section = self.view[self.offset:self.offset + size]
+        self.offset += size
+        return section
+
+
+def _grouping(groups: List[List[CallBack]]) -> Tuple[array, array]:
+    """コールバックのまとまりを (offsets, callback_ids) に変換する"""
+    offsets = array("q", [0])
+    callback_ids = array("q")
+    for group in groups:
+        callback_ids.extend(cb.callback_id for cb in group)
+        offsets.append(len(callback_ids))
+    return offsets, callback_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="入力ファイルを初期化済みモデルのスナップショットにコンパイルする")
+    parser.add_argument("input_path", type=Path)
+    parser.add_argument("snapshot_path", type=Path)
+    args = parser.parse_args()
+
+    compile_snapshot(args.input_path, args.snapshot_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""コールバックの実行トレースから最悪実行時間 (WCET) を求めて、スケジューラーの入力に反映する
+
+トレースは (callback_id, start, end) のレコードの列で、csv (ヘッダ行あり) かjsonl (1行に1つのオブジェクト)
+callback_idは入力ファイルと同じ "cb12" か 12 の形式
+ファイル全体は読み込まずにチャンクごとに処理し、コールバックごとに
+実行回数、平均、最大値と、分位点のストリーミングスケッチ (QuantileSketch) だけを持つので、メモリ使用量はレコードの数によらない
+
+最悪実行時間 = (最大値、または指定された分位点) x (1 + margin) x time_scale
+
+Usage:
+    $ python -m iostreams.trace_ingest ./data/trace.csv --input ./data/case_study.yaml --output ./data/case_study_measured.yaml
+    $ python -m iostreams.trace_ingest ./data/trace.jsonl --percentile 99.9 --margin 0.2 --time-scale 1e-6 --wcet-output ./data/wcet.csv
+"""
+import argparse
+import csv
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+import yaml
+
+from components.input_keys import parse_callback_id
+from components.quantile_sketch import DEFAULT_RELATIVE_ACCURACY, QuantileSketch
+
+from .reader import read_input
+
+DEFAULT_CHUNK_SIZE = 100000  # 一度に処理するレコードの数
+WCET_COLUMNS = ["callback_id", "count", "mean", "max", "percentile", "wcet"]
+OUTPUT_SUFFIXES = (".yaml", ".yml", ".json")  # 最悪実行時間を置き換えた入力を書き出せる形式
+
+Record = Tuple[int, float]  # (callback_id, 実行時間)
+
+
+class CallbackExecStats:
+    """一つのコールバックの実行時間の統計"""
+    __slots__ = ("callback_id", "count", "sum", "sketch")
+
+    def __init__(self, callback_id: int, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        self.callback_id: int = callback_id
+        self.count: int = 0  # 実行回数
+        self.sum: float = 0  # 実行時間の合計
+        self.sketch: QuantileSketch = QuantileSketch(relative_accuracy)  # 最大値と分位点
+
+    def add_all(self, exec_times: List[float]) -> None:
+        self.count += len(exec_times)
+        self.sum += sum(exec_times)
+        self.sketch.add_all(exec_times)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count != 0 else None
+
+    @property
+    def max(self) -> float:
+        return self.sketch.max
+
+    def wcet(self, percentile: float = None, margin: float = 0, time_scale: float = 1) -> float:
+        """最悪実行時間 (percentileがNoneの場合は最大値, そうでなければその分位点 (0〜100)) に余裕を持たせたもの"""
+        base = self.max if percentile is None else self.sketch.quantile(percentile / 100)
+        return base * (1 + margin) * time_scale
+
+
+def iter_trace_chunks(trace_path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[Record]]:
+    """トレースを読み、(callback_id, 実行時間) をchunk_size個ずつ返す
+
+    拡張子によって形式を判断する
+        .csv: callback_id,start,end の列を持つ表 (他の列は無視する)
+        .jsonl: {"callback_id": ..., "start": ..., "end": ...} を1行に1つ
+    """
+    trace_path = Path(trace_path)
+    suffix = trace_path.suffix.lower()
+    if suffix == ".csv":
+        return _iter_csv_chunks(trace_path, chunk_size)
+    elif suffix in (".jsonl", ".ndjson"):
+        return _iter_jsonl_chunks(trace_path, chunk_size)
+    else:
+        raise ValueError(f"unsupported trace format: {trace_path}")
+
+
+def collect_exec_stats(
+    trace_path: Path,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+) -> Dict[int, CallbackExecStats]:
+    """トレース全体からコールバックごとの実行時間の統計を集める"""
+    stats_each_callback: Dict[int, CallbackExecStats] = {}
+    for chunk in iter_trace_chunks(trace_path, chunk_size):
+        # チャンクの中でコールバックごとにまとめてから統計に加える
+        exec_times_each_callback: Dict[int, List[float]] = {}
+        for callback_id, exec_time in chunk:
+            exec_times_each_callback.setdefault(callback_id, []).append(exec_time)
+        for callback_id, exec_times in exec_times_each_callback.items():
+            if callback_id not in stats_each_callback:
+                stats_each_callback[callback_id] = CallbackExecStats(callback_id, relative_accuracy)
+            stats_each_callback[callback_id].add_all(exec_times)
+    return stats_each_callback
+
+
+def update_input_wcets(
+    input_path: Path,
+    output_path: Path,
+    stats_each_callback: Dict[int, CallbackExecStats],
+    percentile: float = None,
+    margin: float = 0,
+    time_scale: float = 1,
+) -> Tuple[int, int]:
+    """入力ファイルのコールバックの "exec" を測定した最悪実行時間で置き換えて、yamlかjsonに書き出す
+    一時ファイルに書いてから置き換えるので、失敗しても出力先 (入力ファイルを上書きする場合は入力ファイル) は壊れない
+    NOTE: トレースにないコールバックは元の "exec" のまま (yamlのコメントは残らない)
+
+    Returns:
+        (置き換えたコールバックの数, トレースにあったが入力にないコールバックの数)
+    """
+    output_path = Path(output_path)
+    suffix = output_path.suffix.lower()
+    if suffix not in OUTPUT_SUFFIXES:
+        raise ValueError(f"unsupported output format: {output_path} (expected .yaml, .yml or .json)")
+
+    input = read_input(input_path)
+    input_callback_ids = set()
+    num_updated = 0
+    for key, cb in input["callbacks"].items():
+        callback_id = parse_callback_id(key)
+        input_callback_ids.add(callback_id)
+        if callback_id in stats_each_callback:
+            cb["exec"] = stats_each_callback[callback_id].wcet(percentile, margin, time_scale)
+            num_updated += 1
+    num_unknown = len([callback_id for callback_id in stats_each_callback if callback_id not in input_callback_ids])
+
+    tmp_path = output_path.with_name(f"{output_path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "w") as file:
+            if suffix == ".json":
+                json.dump(input, file, indent=2)
+            else:
+                yaml.safe_dump(input, file, sort_keys=False)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+    return num_updated, num_unknown
+
+
+def write_wcet_table(
+    output_path: Path,
+    stats_each_callback: Dict[int, CallbackExecStats],
+    percentile: float = None,
+    margin: float = 0,
+    time_scale: float = 1,
+) -> None:
+    """コールバックごとの統計と最悪実行時間をcsvに出力する (実行時間はtime_scaleを掛けた値)"""
+    with open(output_path, mode="w", newline="") as file:
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow(WCET_COLUMNS)
+        for callback_id in sorted(stats_each_callback):
+            stats = stats_each_callback[callback_id]
+            quantile = stats.sketch.quantile(percentile / 100) if percentile is not None else stats.max
+            writer.writerow([
+                callback_id,
+                stats.count,
+                stats.mean * time_scale,
+                stats.max * time_scale,
+                quantile * time_scale,
+                stats.wcet(percentile, margin, time_scale),
+            ])
+
+
+def _iter_csv_chunks(trace_path: Path, chunk_size: int) -> Iterator[List[Record]]:
+    with open(trace_path, "r", newline="") as file:
+        reader = csv.reader(file)
+        columns = next(reader)
+        callback_id_index = columns.index("callback_id")
+        start_index = columns.index("start")
+        end_index = columns.index("end")
+
+        callback_ids = _CallbackIdCache()
+        chunk: List[Record] = []
+        for row in reader:
+            if len(row) == 0:
+                continue
+            chunk.append((callback_ids[row[callback_id_index]], float(row[end_index]) - float(row[start_index])))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if len(chunk) != 0:
+            yield chunk
+
+
+def _iter_jsonl_chunks(trace_path: Path, chunk_size: int) -> Iterator[List[Record]]:
+    with open(trace_path, "r") as file:
+        callback_ids = _CallbackIdCache()
+        chunk: List[Record] = []
+        for line in file:
+            if len(line.strip()) == 0:
+                continue
+            record = json.loads(line)
+            chunk.append((callback_ids[record["callback_id"]], record["end"] - record["start"]))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if len(chunk) != 0:
+            yield chunk
+
+
+class _CallbackIdCache(dict):
+    """トレースのcallback_id ("cb12" や 12) -> コールバックid (同じ値を何度もパースしない)"""
+    def __missing__(self, key) -> int:
+        callback_id = parse_callback_id(key)
+        self[key] = callback_id
+        return callback_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="実行トレースから最悪実行時間を求めてスケジューラーの入力に反映する")
+    parser.add_argument("trace_path", type=Path, help="(callback_id, start, end) のトレース (.csv か .jsonl)")
+    parser.add_argument("--input", type=Path, default=None, help="最悪実行時間を置き換える入力ファイル")
+    parser.add_argument("--output", type=Path, default=None, help="置き換えた入力の出力先 (.yaml か .json, 省略時は--inputを上書き, --inputがcsvの場合は必須)")
+    parser.add_argument("--wcet-output", type=Path, default=None, help="コールバックごとの統計と最悪実行時間のcsv")
+    parser.add_argument("--percentile", type=float, default=None, help="最大値の代わりに使う分位点 (0〜100, 例: 99.9)")
+    parser.add_argument("--margin", type=float, default=0, help="最悪実行時間に持たせる余裕の割合 (例: 0.2で1.2倍)")
+    parser.add_argument("--time-scale", type=float, default=1, help="トレースの時間を入力ファイルの単位にする係数 (例: nsからmsなら1e-6)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="一度に処理するレコードの数")
+    parser.add_argument("--relative-accuracy", type=float, default=DEFAULT_RELATIVE_ACCURACY, help="分位点の相対誤差")
+    args = parser.parse_args()
+
+    if args.input is None and args.wcet_output is None:
+        parser.error("either --input or --wcet-output is required")
+    if args.percentile is not None and not 0 <= args.percentile <= 100:
+        parser.error("--percentile must be in [0, 100]")
+    if args.input is not None:
+        # トレースを読む前に確かめる (csvの入力は書き出せないので、上書きせずに--outputを指定させる)
+        output_path = args.output if args.output is not None else args.input
+        if output_path.suffix.lower() not in OUTPUT_SUFFIXES:
+            if args.output is None:
+                parser.error(f"--output (.yaml, .yml or .json) is required to update {args.input}")
+            parser.error("--output must be .yaml, .yml or .json")
+
+    stats_each_callback = collect_exec_stats(args.trace_path, args.chunk_size, args.relative_accuracy)
+    num_records = sum([stats.count for stats in stats_each_callback.values()])
+    print(f"read {num_records} records of {len(stats_each_callback)} callbacks")
+
+    if args.wcet_output is not None:
+        write_wcet_table(args.wcet_output, stats_each_callback, args.percentile, args.margin, args.time_scale)
+    if args.input is not None:
+        num_updated, num_unknown = update_input_wcets(
+            args.input, output_path, stats_each_callback, args.percentile, args.margin, args.time_scale
+        )
+        print(f"updated {num_updated} callbacks in {output_path} ({num_unknown} callbacks in the trace are not in the input)")
+
+
+if __name__ == "__main__":
+    main()
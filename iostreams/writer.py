@@ -1,12 +1,39 @@
+import csv
+import gzip
 from pathlib import Path
-from typing import List
+from typing import Any, Iterable, Iterator, List, Sequence, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrowは任意の依存 (parquetで出力する時だけ必要)
+    pa = None
+    pq = None
 
 from components.callback import CallBack
+from components.callback_store import CallbackStore
 from components.chain import Chain
 from components.core import Core
 from components.executor import Executor
 from components.node import Node
 
+OUTPUT_FORMATS = ("csv", "parquet")
+WRITE_BUFFER_SIZE = 1 << 20  # csvの書き込みバッファのサイズ (byte)
+
+# 各表の列のタイトル
+CALLBACK_COLUMNS = ["callback_id", "wcet", "period", "priority", "node_id", "chain_id", "is_timer_callback", "assigned_executor_id"]
+CHAIN_COLUMNS = ["chain_id", "contain_callback_ids", "priority", "wcet_sum"]
+NODE_COLUMNS = ["node_id", "contain_callback_ids", "utilization", "highest_priority"]
+EXECUTOR_COLUMNS = ["executor_id", "contain_callback_ids", "priority", "utilization", "assigned_core_id"]
+CORE_COLUMNS = ["core_id", "contain_executor_ids", "utilization"]
+
+Row = Tuple[Any, ...]
+
+
+def is_parquet_available() -> bool:
+    """parquetで出力できるかどうか (pyarrowがインストールされているか)"""
+    return pa is not None
+
 
 def write_all_info(
     output_dir: Path,
@@ -15,121 +42,133 @@ def write_all_info(
     nodes: List[Node],
     executors: List[Executor],
     cores: List[Core],
+    callback_store: CallbackStore = None,
+    output_format: str = "csv",
+    compress: bool = False,
 ) -> None:
-    _write_callbacks_info(output_dir, callbacks)
-    _write_chains_info(output_dir, chains)
-    _write_nodes_info(output_dir, nodes)
-    _write_executors_info(output_dir, executors)
-    _write_cores_info(output_dir, cores)
+    """全ての情報を表ごとにファイルに出力する
+    callback_storeが渡された場合、コールバックの情報はストアの配列からまとめて取り出す
+    NOTE: エグゼキューターとコアの利用率は割り当ての時に差分で更新した値 (戦略や利用率のチェックに使った値) を出力する
+        (ストアの配列から計算し直すと足す順番が変わり、浮動小数点の誤差で出力がcallback_storeを使わない場合と変わる)
+
+    Args:
+        output_format: "csv" (1行ずつ書き出す) か "parquet" (列指向, pyarrowが必要)
+        compress: Trueの場合、csvはgzipで圧縮して *.csv.gz に、parquetはgzipで圧縮して出力する
+    """
+    _check_output_format(output_format)
+
+    if callback_store is not None:
+        callback_store.pull_assignment()  # 割り当て結果を取り込む
+        callback_rows = zip(*callback_store.columns())
+    else:
+        callback_rows = _callback_rows(callbacks)
+
+    tables = [
+        ("callback_info", CALLBACK_COLUMNS, callback_rows),
+        ("chain_info", CHAIN_COLUMNS, _chain_rows(chains)),
+        ("node_info", NODE_COLUMNS, _node_rows(nodes)),
+        ("executor_info", EXECUTOR_COLUMNS, _executor_rows(executors)),
+        ("core_info", CORE_COLUMNS, _core_rows(cores)),
+    ]
+    for name, columns, rows in tables:
+        _write_table(output_dir, name, columns, rows, output_format, compress)
+
+
+def write_table(
+    output_dir: Path,
+    name: str,
+    columns: Sequence[str],
+    rows: Iterable[Row],
+    output_format: str = "csv",
+    compress: bool = False,
+) -> None:
+    """解析結果などの行を表 name に出力する (形式はwrite_all_info()と同じ)
+
+    Args:
+        columns: 列のタイトル
+        rows: columnsの順に値を並べた行
+    """
+    _check_output_format(output_format)
+    _write_table(output_dir, name, columns, rows, output_format, compress)
+
+
+def _check_output_format(output_format: str) -> None:
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"unsupported output format: {output_format} (expected one of {OUTPUT_FORMATS})")
+    if output_format == "parquet" and pa is None:
+        raise ImportError("parquet output requires pyarrow. Install it with `pip install pyarrow`.")
+
+
+def _write_table(output_dir: Path, name: str, columns: Sequence[str], rows: Iterable[Row], output_format: str, compress: bool) -> None:
+    if output_format == "csv":
+        suffix = ".csv.gz" if compress else ".csv"
+        _write_csv(output_dir / f"{name}{suffix}", columns, rows, compress)
+    else:
+        _write_parquet(output_dir / f"{name}.parquet", columns, rows, compress)
+
+
+def _write_csv(file_path: Path, columns: Sequence[str], rows: Iterable[Row], compress: bool) -> None:
+    """表全体を文字列にせず、1行ずつcsvに書き出す
+    NOTE: Noneは従来の出力と同じく "None" と書き出す
+    """
+    if compress:
+        file = gzip.open(file_path, mode="wt", newline="")
+    else:
+        file = open(file_path, mode="w", newline="", buffering=WRITE_BUFFER_SIZE)
+    with file:
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow(columns)  # カラムタイトル
+        writer.writerows(
+            ["None" if value is None else value for value in row]
+            for row in rows
+        )
 
-def _write_callbacks_info(output_dir: Path, callbacks: List[CallBack]) -> None:
-    file_path = output_dir / Path("callback_info.csv")
 
-    # 各列のタイトル
-    columns = ["callback_id", "wcet", "period", "priority", "node_id", "chain_id", "is_timer_callback", "assigned_executor_id"]
-    columns_str = ",".join(columns) + "\n"
+def _write_parquet(file_path: Path, columns: Sequence[str], rows: Iterable[Row], compress: bool) -> None:
+    """列指向のparquetに書き出す (Noneはnullになる)"""
+    values_each_column = list(zip(*rows))
+    if len(values_each_column) == 0:
+        values_each_column = [() for _ in columns]  # 行がない場合
+    table = pa.table({column: list(values) for column, values in zip(columns, values_each_column)})
+    pq.write_table(table, file_path, compression="gzip" if compress else "snappy")
 
-    # 情報
-    callbacks_info = []
-    for cb in callbacks:
-        callbacks_info.append(
-            f"{cb.callback_id},{cb.wcet},{cb.period},{cb.priority},{cb.node_id},{cb.chain_id},{cb.is_timer_callback},{cb.assigned_executor_id}"
-        )
-    callbacks_info_str = "\n".join(callbacks_info)
-    
-    with open(file=file_path, mode="w") as file:
-        file.writelines(columns_str)  # カラムタイトル
-        file.writelines(callbacks_info_str)  # コールバック情報
 
-def _write_chains_info(output_dir: Path, chains: List[Chain]) -> None:
-    file_path = output_dir / Path("chain_info.csv")
+def _join_ids(ids: Iterable[int]) -> str:
+    """idのリストを "-" でつないだ文字列にする"""
+    return "-".join([f"{id}" for id in ids])
+
 
-    # 各列のタイトル
-    columns = ["chain_id", "contain_callback_ids", "priority", "wcet_sum"]
-    columns_str = ",".join(columns) + "\n"
+def _callback_rows(callbacks: List[CallBack]) -> Iterator[Row]:
+    for cb in callbacks:
+        yield (
+            cb.callback_id, cb.wcet, cb.period, cb.priority, cb.node_id, cb.chain_id,
+            cb.is_timer_callback, cb.assigned_executor_id,
+        )
 
 
-    # 情報
-    chains_info = []
+def _chain_rows(chains: List[Chain]) -> Iterator[Row]:
     for chain in chains:
         # チェインに含まれるコールバック
-        cb_ids = [f"{cb.callback_id}" for cb in chain.callbacks]
-        cb_ids_str = "-".join(cb_ids)
-
-        chains_info.append(
-            f"{chain.chain_id},{cb_ids_str},{chain.priority},{chain.wcet_sum}"
-        )
-    chains_info_str = "\n".join(chains_info)
-    
-    with open(file=file_path, mode="w") as file:
-        file.writelines(columns_str)  # カラムタイトル
-        file.writelines(chains_info_str)  # チェイン情報
-
-def _write_nodes_info(output_dir: Path, nodes: List[Node]) -> None:
-    file_path = output_dir / Path("node_info.csv")
+        cb_ids_str = _join_ids(cb.callback_id for cb in chain.callbacks)
+        yield (chain.chain_id, cb_ids_str, chain.priority, chain.wcet_sum)
 
-    # 各列のタイトル
-    columns = ["node_id", "contain_callback_ids", "utilization", "highest_priority"]
-    columns_str = ",".join(columns) + "\n"
 
-    # 情報
-    nodes_info = []
+def _node_rows(nodes: List[Node]) -> Iterator[Row]:
     for node in nodes:
         # ノードに含まれるコールバック
-        cb_ids = [f"{cb.callback_id}" for cb in node.callbacks]
-        cb_ids_str = "-".join(cb_ids)
-        
-        nodes_info.append(
-            f"{node.node_id},{cb_ids_str},{node.utilization},{node.highest_priority}"
-        )
-    nodes_info_str = "\n".join(nodes_info)
-    
-    with open(file=file_path, mode="w") as file:
-        file.writelines(columns_str)  # カラムタイトル
-        file.writelines(nodes_info_str)  # ノード情報
+        cb_ids_str = _join_ids(cb.callback_id for cb in node.callbacks)
+        yield (node.node_id, cb_ids_str, node.utilization, node.highest_priority)
 
-def _write_executors_info(output_dir: Path, executors: List[Executor]) -> None:
-    file_path = output_dir / Path("executor_info.csv")
 
-    # 各列のタイトル
-    columns = ["executor_id", "contain_callback_ids", "priority", "utilization", "assigned_core_id"]
-    columns_str = ",".join(columns) + "\n"
-
-    # 情報
-    executors_info = []
+def _executor_rows(executors: List[Executor]) -> Iterator[Row]:
     for executor in executors:
         # エグゼキューターに割り当てられているコールバック
-        cb_ids = [f"{cb.callback_id}" for cb in executor.callbacks]
-        cb_ids_str = "-".join(cb_ids)
-
-        executors_info.append(
-            f"{executor.executor_id},{cb_ids_str},{executor.priority},{executor.utilization},{executor.assigned_core_id}"
-        )
-    executors_info_str = "\n".join(executors_info)
-    
-    with open(file=file_path, mode="w") as file:
-        file.writelines(columns_str)  # カラムタイトル
-        file.writelines(executors_info_str)  # エグゼキューター情報
+        cb_ids_str = _join_ids(cb.callback_id for cb in executor.callbacks)
+        yield (executor.executor_id, cb_ids_str, executor.priority, executor.utilization, executor.assigned_core_id)
 
-def _write_cores_info(output_dir: Path, cores: List[Core]) -> None:
-    file_path = output_dir / Path("core_info.csv")
 
-    # 各列のタイトル
-    columns = ["core_id", "contain_executor_ids", "utilization"]
-    columns_str = ",".join(columns) + "\n"
-
-    # 情報
-    cores_info = []
+def _core_rows(cores: List[Core]) -> Iterator[Row]:
     for core in cores:
-        # コアに割り当てられているコールバック
-        exe_ids = [f"{exe.executor_id}" for exe in core.executors]
-        exe_ids_str = "-".join(exe_ids)
-
-        cores_info.append(
-            f"{core.core_id},{exe_ids_str},{core.utilization}"
-        )
-    cores_info_str = "\n".join(cores_info)
-    
-    with open(file=file_path, mode="w") as file:
-        file.writelines(columns_str)  # カラムタイトル
-        file.writelines(cores_info_str)  # コア情報
\ No newline at end of file
+        # コアに割り当てられているエグゼキューター
+        exe_ids_str = _join_ids(exe.executor_id for exe in core.executors)
+        yield (core.core_id, exe_ids_str, core.utilization)
@@ -1,58 +1,242 @@
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Dict, List
 
-from algos.callback_priority_assignment import callback_priority_assignment
+from algos.callback_priority_assignment import DEFAULT_PRIORITY_POLICY, callback_priority_assignment
+from algos.chain_latency import CHAIN_LATENCY_COLUMNS, ChainLatency, analyze_chain_latencies, chain_latency_rows
+from algos.schedule_simulator import SimulationResult, simulate_schedule
 from algos.executor_core_assignment.assignment import executor_core_assignment
+from algos.executor_core_assignment.assignment_result import apply_assignment, export_assignment
+from algos.executor_core_assignment.decomposition import parallel_executor_core_assignment
+from algos.executor_core_assignment.local_search import DEFAULT_TIME_BUDGET as DEFAULT_LOCAL_SEARCH_TIME_BUDGET
+from algos.executor_core_assignment.local_search import local_search_assignment
 from components.callback import CallBack
-from components.chain import set_chains_priority
+from components.chain import set_chain_attributes, set_chains_priority
+from components.decision_trace import DecisionTrace
 from components.initial_components import initial_components
-from components.node import set_highest_priorities
-from iostreams.reader import read_input
-from iostreams.writer import write_all_info
+from components.instrumentation import Instrumentation, Profiler
+from components.node import set_priority_ranges
+from components.strategy_cache import DEFAULT_MAX_SIZE as DEFAULT_STRATEGY_CACHE_SIZE
+from components.strategy_cache import StrategyCache
+from components.system_model import SystemModel
+from iostreams.reader import close_input, read_input
+from iostreams.result_cache import DEFAULT_MAX_BYTES as DEFAULT_RESULT_CACHE_MAX_BYTES
+from iostreams.result_cache import ResultCache, compute_cache_key
+from iostreams.snapshot import load_or_compile_snapshot
+from iostreams.writer import write_all_info, write_table
 
 
 class RunProgress():
 
-    def __init__(self, input_path: Path, output_dir: Path) -> None:
-        input = read_input(input_path)
-
+    def __init__(
+        self,
+        input_path: Path,
+        output_dir: Path,
+        use_callback_store: bool = False,
+        streaming_input: bool = False,
+        snapshot_path: Path = None,
+        num_cpus: int = None,
+        num_executors: int = None,
+        instrument: bool = False,
+        profiler: Profiler = None,
+        trace: bool = False,
+        output_format: str = "csv",
+        compress: bool = False,
+        strategy_cache_size: int = DEFAULT_STRATEGY_CACHE_SIZE,
+        decompose: bool = False,
+        num_workers: int = None,
+        result_cache_dir: Path = None,
+        result_cache_max_bytes: int = DEFAULT_RESULT_CACHE_MAX_BYTES,
+        simulate: bool = False,
+        simulation_horizon: float = None,
+        priority_policy: str = DEFAULT_PRIORITY_POLICY,
+        local_search: bool = False,
+        local_search_time_budget: float = DEFAULT_LOCAL_SEARCH_TIME_BUDGET,
+    ) -> None:
+        """
+        Args:
+            input_path: 入力ファイルのパス
+            output_dir: csvを出力するディレクトリ
+            use_callback_store: 列指向のコールバックストア (numpyが必要) を使うかどうか
+            streaming_input: 入力全体を辞書にせずにコールバックを一つずつ読み込むかどうか
+            snapshot_path: 指定された場合、初期化済みモデルのスナップショットを読み込む
+                (無い、または入力ファイルと一致しない場合は作り直す)
+            num_cpus, num_executors: 指定された場合、入力ファイルに書かれている数の代わりに使う
+            instrument: フェーズごとの実行時間とアルゴリズム内の回数を記録して instrumentation.json に出力するかどうか
+            profiler: executor_core_assignmentをプロファイルする方法 ("cprofile" など, Instrumentationを参照)
+            trace: PartA/B/Cでの割り当ての判断を decision_trace.jsonl に出力するかどうか
+            output_format: 結果の出力形式 ("csv" か "parquet", parquetはpyarrowが必要)
+            compress: 結果をgzipで圧縮して出力するかどうか
+            strategy_cache_size: メモ化する戦略のチェック結果の最大数 (0の場合はメモ化しない)
+            decompose: ノードを共有しない独立したサブシステムに分けて、割り当てをワーカープロセスで並列に行うかどうか
+                (サブシステム内の判断はdecision_trace.jsonlに記録されない)
+            num_workers: decomposeの場合のワーカープロセスの数 (Noneの場合はCPUの数)
+            result_cache_dir: 指定された場合、入力の内容をキーにして割り当て結果をキャッシュするディレクトリ
+                (キャッシュにあれば割り当てを省略する)
+            result_cache_max_bytes: キャッシュの合計サイズの上限 (超えると古いものから消す)
+            simulate: 割り当て結果を離散イベントシミュレーションして、観測されたレイテンシとコアのビジー時間を出力するかどうか
+            simulation_horizon: シミュレーションする時間 (Noneの場合はハイパーピリオド, ただし最大の周期の10倍で打ち切る)
+            priority_policy: コールバックの優先度の割り当て方 (PRIORITY_POLICIESを参照)
+                "deadline_monotonic"と"criticality"は入力のchainsに書かれたデッドラインとクリティカリティを使う
+                (スナップショットとcsvの入力はchainsを持たないので、デッドラインは周期, クリティカリティは0になる)
+            local_search: 割り当ての後に、戦略I〜VIを満たしたままノードとエグゼキューターを動かして、コアの利用率の最大値を小さくするかどうか
+            local_search_time_budget: 局所探索に使う時間の上限 (秒)
+        """
         self.output_dir = output_dir
         self.output_dir.mkdir(exist_ok=True, parents=True)
+        self.output_format = output_format
+        self.compress = compress
+        self.decompose = decompose
+        self.num_workers = num_workers
+        self.simulate = simulate
+        self.simulation_horizon = simulation_horizon
+        self.priority_policy = priority_policy
+        self.local_search = local_search
+        self.local_search_time_budget = local_search_time_budget
+        self.result_cache = ResultCache(result_cache_dir, result_cache_max_bytes) if result_cache_dir is not None else None
+
+        self.instrumentation = Instrumentation(enabled=instrument, output_dir=self.output_dir, profiler=profiler)
 
-        self.num_cpus: int = input["num_cpus"]
-        self.num_executors: int = input["num_executors"]
+        if snapshot_path is not None:
+            with self.instrumentation.phase("load_snapshot"):
+                input, self.system = load_or_compile_snapshot(
+                    input_path, snapshot_path, num_executors, num_cpus, use_callback_store=use_callback_store
+                )
+            self.num_cpus: int = input["num_cpus"]
+            self.num_executors: int = input["num_executors"]
+        else:
+            # NOTE: streaming_inputの場合、コールバックの読み込みはinitial_componentsの中で行われる
+            with self.instrumentation.phase("read_input"):
+                input = read_input(input_path, streaming=streaming_input)
+            self.num_cpus: int = num_cpus if num_cpus is not None else input["num_cpus"]
+            self.num_executors: int = num_executors if num_executors is not None else input["num_executors"]
+            with self.instrumentation.phase("initial_components"):
+                try:
+                    self.system: SystemModel = initial_components(
+                        input["callbacks"], self.num_executors, self.num_cpus, use_callback_store=use_callback_store
+                    )
+                finally:
+                    close_input(input)  # ストリーミングの途中で例外が起きても入力ファイルを閉じる
+        self.input_chains: Dict[Any, Dict[str, Any]] = input.get("chains") or {}  # チェインごとのデッドラインとクリティカリティ
+        if self.priority_policy == "criticality" and len(self.input_chains) == 0:
+            raise ValueError(f"priority policy 'criticality' requires chains (criticality of each chain) in {input_path}")
+        set_chain_attributes(self.system.chains, self.input_chains)
+        self.system.instrumentation = self.instrumentation
+        self.system.strategy_cache = StrategyCache(max_size=strategy_cache_size)
+        if trace:
+            self.system.trace = DecisionTrace(self.output_dir / "decision_trace.jsonl")
 
-        (
-            self.num_callbacks,
-            self.callbacks,
-            self.num_chains,
-            self.chains,
-            self.num_nodes,
-            self.nodes,
-            self.executors,
-            self.cores,
-        ) = initial_components(input["callbacks"], self.num_executors, self.num_cpus)
+        self.num_callbacks = self.system.num_callbacks
+        self.callbacks = self.system.callbacks
+        self.num_chains = self.system.num_chains
+        self.chains = self.system.chains
+        self.num_nodes = self.system.num_nodes
+        self.nodes = self.system.nodes
+        self.executors = self.system.executors
+        self.cores = self.system.cores
+        self.chain_latencies: List[ChainLatency] = None  # main_process()で求める
+        self.simulation_result: SimulationResult = None  # simulateの場合にmain_process()で求める
 
     
     def main_process(self):
         # コールバックの優先度を割り当てる
-        self.chains = callback_priority_assignment(self.chains)
+        with self.instrumentation.phase("callback_priority_assignment"):
+            self.chains = callback_priority_assignment(self.chains, self.priority_policy)
         
-        # 各ノードの中で最も高い優先度をノードのインスタンス変数にセット
-        self.nodes = set_highest_priorities(self.nodes)
+        # 各ノードの中で最も高い優先度と最も低い優先度をノードのインスタンス変数にセット
+        with self.instrumentation.phase("set_priority_ranges"):
+            self.nodes = set_priority_ranges(self.nodes)
 
         # チェインの優先度を決定
-        self.chains = set_chains_priority(self.chains)
+        with self.instrumentation.phase("set_chains_priority"):
+            self.chains = set_chains_priority(self.chains)
+
+        # 同じ入力の割り当て結果がキャッシュにあれば探す
+        cache_key = None
+        cached_result = None
+        if self.result_cache is not None:
+            with self.instrumentation.phase("result_cache_lookup"):
+                # 割り当て結果が変わるオプション (チェインの属性は優先度を通して結果を変える)
+                options = {
+                    "decompose": self.decompose,
+                    "priority_policy": self.priority_policy,
+                    "local_search": [self.local_search_time_budget] if self.local_search else None,
+                    "chains": {
+                        str(chain.chain_id): [chain.deadline, chain.criticality]
+                        for chain in self.chains if chain.deadline is not None or chain.criticality != 0
+                    },
+                }
+                cache_key = compute_cache_key(self.system, self.num_cpus, self.num_executors, options)
+                cached_result = self.result_cache.get(cache_key)
+            self.instrumentation.count("result_cache_hits" if cached_result is not None else "result_cache_misses")
 
         # エグゼキューターとコアの割り当て
-        executor_core_assignment(self.nodes, self.executors, self.cores, self.chains)
+        if cached_result is not None:
+            with self.instrumentation.phase("restore_assignment"):
+                apply_assignment(self.system, cached_result)
+            self.system.trace.close()
+        else:
+            with self.instrumentation.phase("executor_core_assignment"):
+                with self.instrumentation.profile("executor_core_assignment"):
+                    try:
+                        if self.decompose:
+                            parallel_executor_core_assignment(self.system, self.num_workers)
+                        else:
+                            executor_core_assignment(self.system)
+                        # コアの利用率の偏りを局所探索で小さくする (移動もdecision_trace.jsonlに記録する)
+                        if self.local_search:
+                            with self.instrumentation.phase("local_search"):
+                                local_search_assignment(self.system, self.local_search_time_budget)
+                    finally:
+                        self.system.trace.close()  # 途中で例外が起きてもそれまでの判断は書き出す
+            for name, value in self.system.strategy_cache.stats().items():
+                self.instrumentation.count(f"strategy_cache_{name}", value)
+            if self.result_cache is not None:
+                with self.instrumentation.phase("result_cache_store"):
+                    self.result_cache.put(cache_key, export_assignment(self.system))
+
+        # チェインのエンドツーエンドの最悪応答時間を求める
+        with self.instrumentation.phase("chain_latency_analysis"):
+            self.chain_latencies = analyze_chain_latencies(self.system)
+
+        # 割り当て結果をシミュレーションして、観測されたレイテンシを求める
+        if self.simulate:
+            with self.instrumentation.phase("simulation"):
+                self.simulation_result = simulate_schedule(self.system, self.simulation_horizon)
 
         # csvに情報を出力
-        write_all_info(
-            self.output_dir,
-            self.callbacks,
-            self.chains,
-            self.nodes,
-            self.executors,
-            self.cores,
-        )
+        with self.instrumentation.phase("write_all_info"):
+            write_all_info(
+                self.output_dir,
+                self.callbacks,
+                self.chains,
+                self.nodes,
+                self.executors,
+                self.cores,
+                callback_store=self.system.callback_store,
+                output_format=self.output_format,
+                compress=self.compress,
+            )
+            tables = [("chain_latency", CHAIN_LATENCY_COLUMNS, chain_latency_rows(self.chain_latencies))]
+            if self.simulation_result is not None:
+                tables += self.simulation_result.tables()
+            for name, columns, rows in tables:
+                write_table(self.output_dir, name, columns, rows, output_format=self.output_format, compress=self.compress)
+
+        # 計測結果をcsvと同じディレクトリに出力
+        if self.instrumentation.enabled:
+            self.instrumentation.write_json(self.output_dir / "instrumentation.json")
+
+    def summary(self) -> Dict[str, Any]:
+        """割り当て結果の要約
+        NOTE: main_process()の後に呼び出す
+        """
+        max_core_utilization = max([core.utilization for core in self.cores], default=0)
+        return {
+            "feasible": max_core_utilization <= 1,  # 全てのコアの利用率が1以下か
+            "max_core_utilization": max_core_utilization,
+            "num_partC_fallbacks": self.system.num_partC_fallbacks,
+            # デッドライン (周期) を満たさないチェインの数
+            "num_chain_deadline_misses": len([chain_latency for chain_latency in self.chain_latencies if not chain_latency.is_schedulable]),
+            # シミュレーションで観測されたデッドラインミスの数 (シミュレーションしない場合はNone)
+            "num_simulated_deadline_misses": self.simulation_result.num_deadline_misses if self.simulation_result is not None else None,
+        }
@@ -0,0 +1,51 @@
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pytest
+
+# リポジトリのルート (run_progress.py など) をimportできるようにする
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from components.initial_components import initial_components
+from components.system_model import SystemModel
+
+
+# 手で決めた割り当てのコールバック: (チェインid, 周期 (レギュラーコールバックは0), 最悪実行時間, エグゼキューターid, 優先度)
+CallbackSpec = Tuple[int, float, float, int, int]
+
+
+def build_assigned_system(
+    callbacks: List[CallbackSpec],
+    executors: Dict[int, Tuple[int, int]],
+    num_cores: int,
+    deadlines: Dict[int, float] = None,
+) -> SystemModel:
+    """手で決めた割り当てのシステムを作る (解析とシミュレーションの結果を手計算と比べるため)
+
+    Args:
+        callbacks: callback_idの順のコールバック (ノードはコールバックごとに一つ)
+        executors: エグゼキューターid -> (優先度, 割り当てるコアid)
+        deadlines: チェインid -> 相対デッドライン
+    """
+    input_cbs = {
+        f"cb{callback_id}": {"period": period, "exec": wcet, "node_id": callback_id, "chain_id": chain_id}
+        for callback_id, (chain_id, period, wcet, _, _) in enumerate(callbacks)
+    }
+    system = initial_components(input_cbs, max(executors) + 1, num_cores)
+    for cb, (_, _, _, _, priority) in zip(system.callbacks, callbacks):
+        cb.priority = priority
+    for chain_id, deadline in (deadlines or {}).items():
+        system.get_chain(chain_id).deadline = deadline
+
+    for executor_id, (priority, core_id) in sorted(executors.items()):
+        executor = system.get_executor(executor_id)
+        executor.priority = priority
+        executor.assign_callbacks([cb for cb, spec in zip(system.callbacks, callbacks) if spec[3] == executor_id])
+        system.get_core(core_id).assign_executor(executor)
+    return system
+
+
+@pytest.fixture
+def assigned_system():
+    return build_assigned_system
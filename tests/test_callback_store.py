@@ -0,0 +1,43 @@
+"""列指向のコールバックストアを使っても、割り当てと出力が使わない場合と完全に同じになるか"""
+from pathlib import Path
+
+import pytest
+
+from benchmarks.task_set_generator import generate_task_set, write_task_set
+from run_progress import RunProgress
+
+pytest.importorskip("numpy")
+
+CASE_STUDY_PATH = Path(__file__).resolve().parent.parent / "data" / "case_study.yaml"
+
+
+def _outputs(input_path: Path, output_dir: Path, **options) -> dict:
+    run_progress = RunProgress(input_path, output_dir, **options)
+    run_progress.main_process()
+    nodes = [(node.node_id, node.utilization) for node in run_progress.system.nodes]
+    files = {path.name: path.read_bytes() for path in sorted(output_dir.iterdir())}
+    return {"nodes": nodes, "files": files}
+
+
+def _assert_same_outputs(input_path: Path, tmp_path: Path, **options) -> None:
+    without_store = _outputs(input_path, tmp_path / "without_store", use_callback_store=False, **options)
+    with_store = _outputs(input_path, tmp_path / "with_store", use_callback_store=True, **options)
+
+    assert with_store["nodes"] == without_store["nodes"]  # 浮動小数点の値まで同じ
+    assert list(with_store["files"]) == list(without_store["files"])
+    for name, content in without_store["files"].items():
+        assert with_store["files"][name] == content, name
+
+
+def test_case_study(tmp_path: Path):
+    _assert_same_outputs(CASE_STUDY_PATH, tmp_path)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("options", [{}, {"decompose": True, "local_search": True, "simulate": True}])
+def test_generated_task_sets(tmp_path: Path, seed: int, options: dict):
+    # PartB, Cまで進む大きさ
+    input_path = tmp_path / f"t{seed}.yaml"
+    task_set = generate_task_set(300, 60, 180, 6, 8, total_utilization=6.4, max_chain_length=10, seed=seed)
+    write_task_set(input_path, task_set)
+    _assert_same_outputs(input_path, tmp_path, **options)
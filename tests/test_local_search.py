@@ -0,0 +1,149 @@
+"""局所探索の差分での戦略のチェックと移動の取り消しが、全体を調べ直した結果や移動前の状態と一致するか"""
+from pathlib import Path
+
+import pytest
+
+from algos.core_strategy import check_satisfy_all_core_strategies
+from algos.executor_core_assignment.local_search import _LocalSearch
+from algos.executor_strategy import check_satisfy_all_executor_strategies
+from benchmarks.task_set_generator import generate_task_set, write_task_set
+from components.system_model import SystemModel
+from run_progress import RunProgress
+
+# (コールバック数, チェイン数, ノード数, エグゼキューター数, CPU数, 全体の利用率)
+TASK_SETS = {
+    # エグゼキューターがCPUより少ないので、PartBで一つのエグゼキューターに複数のチェインが入る (戦略III, IV)
+    "partB": (120, 24, 40, 3, 4, 3.0),
+    # 空いたコアが多いので、ノードを空のエグゼキューターに移す移動がある
+    "free_executor": (200, 40, 120, 12, 6, 3.0),
+    # PartCまで進む
+    "partC": (300, 60, 180, 6, 8, 6.4),
+}
+CASE_STUDY_PATH = Path(__file__).resolve().parent.parent / "data" / "case_study.yaml"
+
+# (タスクセット名かcase_study, シード (case_studyの場合はCPU数))
+INPUTS = [(name, seed) for name in TASK_SETS for seed in (0, 1, 2)]
+# 生成したタスクセットでは戦略を満たさない移動が出ないので、case_studyのCPUを減らして出す
+REJECTING_INPUTS = [("case_study", None), ("case_study", 2), ("case_study", 3)]
+
+
+def _system(tmp_path: Path, name: str, seed: int) -> SystemModel:
+    if name == "case_study":
+        run_progress = RunProgress(CASE_STUDY_PATH, tmp_path / "output", num_cpus=seed, instrument=True)
+        run_progress.main_process()
+        return run_progress.system
+
+    num_callbacks, num_chains, num_nodes, num_executors, num_cpus, total_utilization = TASK_SETS[name]
+    input_path = tmp_path / f"{name}_{seed}.yaml"
+    task_set = generate_task_set(
+        num_callbacks, num_chains, num_nodes, num_executors, num_cpus,
+        total_utilization=total_utilization, max_chain_length=10, seed=seed,
+    )
+    write_task_set(input_path, task_set)
+    run_progress = RunProgress(input_path, tmp_path / "output", instrument=True)
+    run_progress.main_process()
+    return run_progress.system
+
+
+def _satisfy_all_strategies(system: SystemModel, executors, cores) -> bool:
+    """戦略I〜VIを全体で調べ直す (空のエグゼキューターとコアは満たしているとみなす)"""
+    return all(len(exe.callbacks) == 0 or check_satisfy_all_executor_strategies(exe, [], system) for exe in executors) \
+        and all(len(core.executors) == 0 or check_satisfy_all_core_strategies(core, [], system) for core in cores)
+
+
+def _state(search: _LocalSearch):
+    """割り当てと局所探索が差分で持っている状態 (浮動小数点の値も含めて完全に比べる)"""
+    system = search.system
+    orders = [("executor", i, order) for i, order in search.executor_orders.items()]
+    orders += [("core", i, order) for i, order in search.core_orders.items()]
+    return {
+        "callbacks": [(cb.callback_id, cb.assigned_executor_id) for cb in system.callbacks],
+        "executors": [
+            (exe.executor_id, [cb.callback_id for cb in exe.callbacks], exe.utilization, exe.assigned_core_id)
+            for exe in system.executors
+        ],
+        "cores": [
+            (core.core_id, [exe.executor_id for exe in core.executors], core.utilization,
+             dict(core._executor_utilizations))
+            for core in system.cores
+        ],
+        "free_executors": len(system.free_executor_pool),
+        "chain_orders": {
+            (kind, i): (list(order._keys), {chain_id: dict(counts) for chain_id, counts in order._counts.items()},
+                        {value: n for value, n in order.value_counts.items() if n != 0})
+            for kind, i, order in orders
+        },
+        "sorted_nodes": {core_id: list(nodes) for core_id, nodes in search.sorted_nodes_each_core.items()},
+        "nodes": {executor_id: set(nodes) for executor_id, nodes in search.nodes_each_executor.items() if nodes},
+    }
+
+
+@pytest.fixture
+def checked_search(monkeypatch):
+    """差分でのチェックのたびに、全体を調べ直した結果と一致することを確かめる"""
+    satisfy_strategies = _LocalSearch._satisfy_strategies
+    results = []
+
+    def checked(self, executors, cores, chains):
+        is_satisfied = satisfy_strategies(self, executors, cores, chains)
+        assert is_satisfied == _satisfy_all_strategies(self.system, executors, cores)
+        results.append(is_satisfied)
+        return is_satisfied
+
+    monkeypatch.setattr(_LocalSearch, "_satisfy_strategies", checked)
+    return results
+
+
+@pytest.mark.parametrize("name, seed", INPUTS + REJECTING_INPUTS)
+def test_incremental_check_matches_full_check(tmp_path: Path, checked_search, name: str, seed: int):
+    system = _system(tmp_path, name, seed)
+    search = _LocalSearch(system, float("inf"))
+
+    num_moves = 0
+    while True:
+        before = _state(search)
+        if not search.improve_max_core():
+            break
+        num_moves += 1
+
+        # 適用した移動の後: 差分で更新した状態が作り直したものと一致し、全てのエグゼキューターとコアが戦略を満たしている
+        state = _state(search)
+        fresh = _LocalSearch(system, float("inf"))
+        assert _state(fresh) == state
+        assert search.executor_strategies == fresh.executor_strategies
+        assert search.core_strategies == fresh.core_strategies
+        assert _satisfy_all_strategies(system, system.executors, system.cores)
+        assert state != before
+
+    assert num_moves > 0
+    assert system.instrumentation.counters["local_search_incremental_checks"] > 0
+
+
+@pytest.mark.parametrize("name, seed", INPUTS + REJECTING_INPUTS)
+def test_rollback_restores_state(tmp_path: Path, checked_search, monkeypatch, name: str, seed: int):
+    system = _system(tmp_path, name, seed)
+    search = _LocalSearch(system, float("inf"))
+    before = _state(search)
+    executor_strategies = dict(search.executor_strategies)
+    core_strategies = dict(search.core_strategies)
+
+    # 改善する全ての候補を、戦略のチェックの後で取り消させる
+    satisfy_strategies = _LocalSearch._satisfy_strategies
+    monkeypatch.setattr(
+        _LocalSearch, "_satisfy_strategies", lambda self, *args: satisfy_strategies(self, *args) and False
+    )
+
+    num_rollbacks = 0
+    for core in system.cores:
+        for move in list(search._move_candidates(core)) + search._swap_candidates(core):
+            assert not search._try_move(move, core)
+            num_rollbacks += 1
+            # 利用率とエグゼキューターの並びを含めて、移動の前と完全に同じに戻っている
+            assert _state(search) == before, move
+
+    assert num_rollbacks > 0
+    assert len(checked_search) > 0
+    if (name, seed) in REJECTING_INPUTS:
+        assert False in checked_search  # 戦略を満たさない移動の取り消しも調べている
+    assert search.executor_strategies == executor_strategies
+    assert search.core_strategies == core_strategies
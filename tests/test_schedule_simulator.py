@@ -0,0 +1,95 @@
+"""割り当て結果のシミュレーションを、手計算したレイテンシ、ビジー時間、デッドラインミスと比べる"""
+from algos.schedule_simulator import DEFAULT_MAX_HORIZON_PERIODS, simulate_schedule, simulation_horizon
+
+
+def _stats(result):
+    return {
+        stats.chain_id: (stats.num_instances, stats.num_deadline_misses, stats.min_latency, stats.max_latency)
+        for stats in result.chain_stats
+    }
+
+
+def test_preemption(assigned_system):
+    # コア0: エグゼキューター0 (優先度2, 周期10, 実行時間2) がエグゼキューター1 (優先度1, 周期30, 実行時間9) をプリエンプトする
+    system = assigned_system(
+        [(0, 10, 2, 0, 1), (1, 30, 9, 1, 1)],
+        {0: (2, 0), 1: (1, 0)},
+        num_cores=1,
+    )
+    result = simulate_schedule(system)
+
+    # cb1は2から実行され、10でプリエンプトされて13に終わる (11の終了イベントは無効になる)
+    assert result.horizon == 30
+    assert _stats(result) == {0: (3, 0, 2, 2), 1: (1, 0, 13, 13)}
+    assert result.chain_stats[0].mean_latency == 2
+    assert result.chain_stats[1].histogram() == [(12, 15, 1)]
+    # [0, 13) と [20, 22) で実行している
+    assert result.core_busy_times == {0: 15}
+    assert list(result._core_busy_rows()) == [(0, 15, 0.5)]
+    assert result.num_deadline_misses == 0
+
+
+def test_running_job_at_horizon(assigned_system):
+    # 周期10, 実行時間8, デッドライン4のチェインを15まで: 2つ目のインスタンスは10から実行中のまま打ち切られる
+    system = assigned_system([(0, 10, 8, 0, 1)], {0: (1, 0)}, num_cores=1, deadlines={0: 4})
+    result = simulate_schedule(system, horizon=15)
+
+    # 1つ目はレイテンシ8でデッドラインミス、2つ目は終わっていないが 15 - 10 > 4 なのでデッドラインミス
+    assert _stats(result) == {0: (1, 2, 8, 8)}
+    assert result.core_busy_times == {0: 8 + 5}
+
+
+def test_pending_jobs_at_horizon(assigned_system):
+    # コア0: エグゼキューター0 (優先度2) にcb0 (周期10, 実行時間8)、エグゼキューター1 (優先度1) にcb1 (周期20, 実行時間5)
+    system = assigned_system(
+        [(0, 10, 8, 0, 1), (1, 20, 5, 1, 1)],
+        {0: (2, 0), 1: (1, 0)},
+        num_cores=1,
+    )
+    result = simulate_schedule(system, horizon=22)
+
+    # cb1は [8, 10), [18, 20) で実行され、20でcb0にプリエンプトされたまま打ち切られる (22 - 0 > 20 でデッドラインミス)
+    # cb0の3つ目のインスタンスは20から実行中 (22 - 20 <= 10 なのでミスではない)
+    assert _stats(result) == {0: (2, 0, 8, 8), 1: (0, 1, None, None)}
+    assert result.core_busy_times == {0: 22}
+
+
+def test_ready_job_at_horizon(assigned_system):
+    # 一つのエグゼキューターに2つのチェイン: cb1はcb0の実行中に打ち切られ、待ち行列に残る
+    system = assigned_system(
+        [(0, 10, 9, 0, 2), (1, 10, 9, 0, 1)],
+        {0: (1, 0)},
+        num_cores=1,
+        deadlines={1: 4},
+    )
+    result = simulate_schedule(system, horizon=5)
+
+    assert _stats(result) == {0: (0, 0, None, None), 1: (0, 1, None, None)}
+    assert result.core_busy_times == {0: 5}
+
+
+def test_idle_cores_and_unassigned_chains(assigned_system):
+    # コア1は何も実行しない
+    system = assigned_system([(0, 10, 3, 0, 1)], {0: (1, 0)}, num_cores=2)
+    result = simulate_schedule(system)
+
+    assert _stats(result) == {0: (1, 0, 3, 3)}
+    assert result.core_busy_times == {0: 3, 1: 0}
+
+
+def test_simulation_horizon(assigned_system):
+    def horizon(periods, **kwargs):
+        system = assigned_system(
+            [(chain_id, period, 1, 0, chain_id) for chain_id, period in enumerate(periods)], {0: (1, 0)}, num_cores=1
+        )
+        return simulation_horizon(system, **kwargs)
+
+    # ハイパーピリオド
+    assert horizon([10, 15]) == 30
+    assert horizon([10.0, 15.0]) == 30
+    assert horizon([10, 15], max_horizon=20) == 20
+    # ハイパーピリオドが最大の周期の DEFAULT_MAX_HORIZON_PERIODS 倍を超える場合は打ち切る
+    assert horizon([7, 11, 13]) == 13 * DEFAULT_MAX_HORIZON_PERIODS
+    # 周期が整数でなければハイパーピリオドは求めずに打ち切る
+    assert horizon([2.5, 10]) == 10 * DEFAULT_MAX_HORIZON_PERIODS
+    assert horizon([2.5, 10], max_horizon=35) == 35
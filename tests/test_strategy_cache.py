@@ -0,0 +1,181 @@
+"""戦略のチェック結果のメモ化 (StrategyCache) が、メモ化しない場合と同じ判断と出力になるか"""
+import json
+from pathlib import Path
+
+import pytest
+
+from algos import core_strategy, executor_strategy
+from algos.core_strategy import _check_core_strategies, check_satisfy_all_core_strategies
+from algos.executor_core_assignment import local_search, partA, partB
+from algos.executor_strategy import _check_executor_strategies, check_satisfy_all_executor_strategies
+from benchmarks.task_set_generator import generate_task_set, write_task_set
+from components.strategy_cache import StrategyCache
+from components.transaction import AssignmentTransaction
+from run_progress import RunProgress
+
+CASE_STUDY_PATH = Path(__file__).resolve().parent.parent / "data" / "case_study.yaml"
+
+# (入力, RunProgressのオプション)
+INPUTS = [
+    ("case_study", {}),
+    ("case_study", {"num_cpus": 2, "local_search": True}),
+    ("generated", {}),
+    ("generated", {"decompose": True, "num_workers": 1, "local_search": True}),
+]
+
+
+def _input_path(tmp_path: Path, name: str) -> Path:
+    if name == "case_study":
+        return CASE_STUDY_PATH
+    # PartB, Cまで進む大きさ
+    input_path = tmp_path / "generated.yaml"
+    task_set = generate_task_set(300, 60, 180, 6, 8, total_utilization=6.4, max_chain_length=10, seed=0)
+    write_task_set(input_path, task_set)
+    return input_path
+
+
+def _run(input_path: Path, output_dir: Path, strategy_cache_size: int, **options):
+    run_progress = RunProgress(
+        input_path, output_dir, strategy_cache_size=strategy_cache_size, trace=True, instrument=True, **options
+    )
+    run_progress.main_process()
+
+    # 判断の記録から、メモ化を使ったかどうかを除いたもの
+    verdicts = []
+    with open(output_dir / "decision_trace.jsonl") as file:
+        for line in file:
+            event = json.loads(line)
+            event.pop("cached", None)
+            verdicts.append(event)
+    # NOTE: instrumentation.jsonは時間とメモ化の統計なので比べない
+    files = {
+        path.name: path.read_bytes()
+        for path in sorted(output_dir.iterdir())
+        if path.name not in ("decision_trace.jsonl", "instrumentation.json")
+    }
+    return verdicts, files, run_progress.system.strategy_cache.stats()
+
+
+@pytest.fixture
+def verify_cached_checks(monkeypatch):
+    """割り当て中の全てのチェックで、メモ化した結果がチェックし直した結果と一致することを確かめる"""
+    num_checks = {"executor": 0, "core": 0}
+
+    def checked_executor(executor, assigned_nodes, system):
+        res = check_satisfy_all_executor_strategies(executor, assigned_nodes, system)
+        assert res == _check_executor_strategies(executor, assigned_nodes, system)[1]
+        num_checks["executor"] += 1
+        return res
+
+    def checked_core(core, assigned_executors, system):
+        res = check_satisfy_all_core_strategies(core, assigned_executors, system)
+        assert res == _check_core_strategies(core, assigned_executors, system)[1]
+        num_checks["core"] += 1
+        return res
+
+    for module in (partA, partB, local_search):
+        if hasattr(module, "check_satisfy_all_executor_strategies"):
+            monkeypatch.setattr(module, "check_satisfy_all_executor_strategies", checked_executor)
+        monkeypatch.setattr(module, "check_satisfy_all_core_strategies", checked_core)
+    return num_checks
+
+
+@pytest.mark.parametrize("name, options", INPUTS)
+def test_cache_size_does_not_change_results(tmp_path: Path, verify_cached_checks, name: str, options: dict):
+    input_path = _input_path(tmp_path, name)
+    uncached = _run(input_path, tmp_path / "uncached", 0, **options)
+    cached = _run(input_path, tmp_path / "cached", StrategyCache().max_size, **options)
+    small = _run(input_path, tmp_path / "small", 2, **options)  # すぐに上限を超えて捨てる
+
+    for verdicts, files, _ in (cached, small):
+        assert verdicts == uncached[0]
+        assert list(files) == list(uncached[1])
+        for file_name, content in uncached[1].items():
+            assert files[file_name] == content, file_name
+
+    assert verify_cached_checks["executor"] + verify_cached_checks["core"] > 0
+    assert uncached[2] == {"hits": 0, "misses": 0, "evictions": 0, "size": 0}  # 0の場合はキャッシュを引かない
+    # 割り当ての中では同じ内容を二度チェックしないので、チェックのたびに結果を足し、上限を超えた分だけ捨てる
+    assert cached[2] == {"hits": 0, "misses": cached[2]["misses"], "evictions": 0, "size": cached[2]["misses"]}
+    assert cached[2]["misses"] > 2
+    assert small[2] == {"hits": 0, "misses": cached[2]["misses"], "evictions": cached[2]["misses"] - 2, "size": 2}
+
+
+def test_lru_eviction_and_stats():
+    cache = StrategyCache(max_size=2)
+    assert cache.get("a") is None
+    cache.put("a", ("I", True))
+    cache.put("b", ("VI", False))
+    assert cache.get("a") == ("I", True)  # aが最近使われたので、次はbが捨てられる
+    cache.put("c", ("V", True))
+    assert cache.get("b") is None
+    assert cache.get("a") == ("I", True)
+    assert cache.get("c") == ("V", True)
+    assert cache.stats() == {"hits": 3, "misses": 2, "evictions": 1, "size": 2}
+
+    cache.clear()
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+    assert not StrategyCache(max_size=0).enabled
+
+
+def test_recheck_after_rollback_is_not_stale(tmp_path: Path):
+    # CPUを減らすと、戦略を満たさない移動がある
+    run_progress = RunProgress(CASE_STUDY_PATH, tmp_path / "output", num_cpus=2)
+    run_progress.main_process()
+    system = run_progress.system
+    assert system.strategy_cache.enabled
+
+    def check_core(core):
+        res = core_strategy.check_satisfy_all_core_strategies(core, [], system)
+        assert res == _check_core_strategies(core, [], system)[1]
+        return res
+
+    def check_executor(executor):
+        if len(executor.callbacks) == 0:
+            return True
+        res = executor_strategy.check_satisfy_all_executor_strategies(executor, [], system)
+        assert res == _check_executor_strategies(executor, [], system)[1]
+        return res
+
+    num_changed_verdicts = 0
+    for source in system.cores:
+        for target in system.cores:
+            if source is target:
+                continue
+            # エグゼキューターを別のコアに移して、チェックしてから取り消す
+            for executor in list(source.executors):
+                before = (check_core(source), check_core(target))
+                versions = (source.version, target.version, executor.version)
+                transaction = AssignmentTransaction()
+                transaction.begin()
+                transaction.remove_executor(source, executor)
+                transaction.assign_executor(target, executor)
+                moved = (check_core(source), check_core(target))
+                moved_versions = (source.version, target.version)
+                transaction.rollback()
+
+                # 取り消した後は新しいバージョンになり、移した時の結果は使われない
+                assert (source.version, target.version) != versions[:2]
+                assert source.version not in moved_versions and target.version not in moved_versions
+                assert (check_core(source), check_core(target)) == before
+                num_changed_verdicts += moved != before
+
+            # ノードを別のコアのエグゼキューターに移して、チェックしてから取り消す
+            for from_executor in list(source.executors):
+                for to_executor in list(target.executors):
+                    node = system.get_node(from_executor.callbacks[0].node_id)
+                    before = (check_executor(from_executor), check_executor(to_executor), check_core(source), check_core(target))
+                    transaction = AssignmentTransaction()
+                    transaction.begin()
+                    transaction.remove_callbacks(from_executor, node.callbacks)
+                    transaction.assign_callbacks(to_executor, node.callbacks)
+                    moved = (check_executor(from_executor), check_executor(to_executor), check_core(source), check_core(target))
+                    transaction.rollback()
+
+                    after = (check_executor(from_executor), check_executor(to_executor), check_core(source), check_core(target))
+                    assert after == before
+                    num_changed_verdicts += moved != before
+
+    assert num_changed_verdicts > 0  # 移した時だけ戦略を満たさなくなる (古い結果が使われれば検出できる)
+    assert system.strategy_cache.hits > 0
@@ -0,0 +1,51 @@
+"""RunProgress.summary() と core_info.csv のコアの利用率が、割り当てられたエグゼキューターの利用率の和と一致するか"""
+import csv
+from pathlib import Path
+
+import pytest
+
+from benchmarks.task_set_generator import generate_task_set, write_task_set
+from run_progress import RunProgress
+
+
+def _run(tmp_path: Path, seed: int, **options) -> RunProgress:
+    # エグゼキューターがCPUより少ないので、PartBで割り当て済みのエグゼキューターにコールバックが足される
+    input_path = tmp_path / f"t{seed}.yaml"
+    task_set = generate_task_set(120, 24, 40, 3, 4, total_utilization=3.0, max_chain_length=8, seed=seed)
+    write_task_set(input_path, task_set)
+    run_progress = RunProgress(input_path, tmp_path / "output", **options)
+    run_progress.main_process()
+    return run_progress
+
+
+@pytest.mark.parametrize("seed", [0, 3, 6])
+@pytest.mark.parametrize("decompose", [False, True])
+def test_core_utilization_includes_partB_callbacks(tmp_path: Path, seed: int, decompose: bool):
+    run_progress = _run(tmp_path, seed, decompose=decompose, num_workers=1)
+
+    true_utilizations = [sum([exe.utilization for exe in core.executors]) for core in run_progress.cores]
+    for core, utilization in zip(run_progress.cores, true_utilizations):
+        assert core.utilization == pytest.approx(utilization)
+
+    summary = run_progress.summary()
+    assert summary["max_core_utilization"] == pytest.approx(max(true_utilizations))
+    assert summary["feasible"] == (max(true_utilizations) <= 1)
+
+    with open(tmp_path / "output" / "core_info.csv") as file:
+        rows = list(csv.DictReader(file))
+    assert [float(row["utilization"]) for row in rows] == pytest.approx(true_utilizations)
+
+
+def test_infeasible_assignment_is_reported(tmp_path: Path):
+    # seed=0 はPartBで足された分を含めると1を超えるコアがある (足さないと0.996で実行可能に見える)
+    summary = _run(tmp_path, 0).summary()
+    assert summary["max_core_utilization"] == pytest.approx(1.034736)
+    assert not summary["feasible"]
+
+
+def test_cached_result_keeps_core_utilization(tmp_path: Path):
+    cache_dir = tmp_path / "cache"
+    first = _run(tmp_path, 0, result_cache_dir=cache_dir).summary()
+    second = _run(tmp_path, 0, result_cache_dir=cache_dir, instrument=True)
+    assert second.instrumentation.counters["result_cache_hits"] == 1
+    assert second.summary()["max_core_utilization"] == pytest.approx(first["max_core_utilization"])
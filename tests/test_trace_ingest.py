@@ -0,0 +1,240 @@
+"""実行トレースからの最悪実行時間 (分位点のスケッチ、チャンクごとの読み込み、入力ファイルの置き換え)"""
+import json
+import math
+import random
+import sys
+from pathlib import Path
+
+import pytest
+import yaml
+
+from components.quantile_sketch import QuantileSketch
+from iostreams import trace_ingest
+from iostreams.trace_ingest import CallbackExecStats, collect_exec_stats, iter_trace_chunks, update_input_wcets
+
+QUANTILES = [0, 0.1, 0.5, 0.9, 0.99, 0.999, 1]
+CASE_STUDY_PATH = Path(__file__).resolve().parent.parent / "data" / "case_study.yaml"
+
+
+def _exact_quantile(sorted_values, q: float) -> float:
+    """QuantileSketch.quantile()と同じ順位 (間にある場合は大きい方の値) の真の値"""
+    return sorted_values[math.ceil(q * (len(sorted_values) - 1))]
+
+
+def _assert_upper_bound(sketch: QuantileSketch, sorted_values, q: float) -> None:
+    """返す分位点は真の値以上、真の値のγ倍以下"""
+    gamma = (1 + sketch.relative_accuracy) / (1 - sketch.relative_accuracy)
+    exact = _exact_quantile(sorted_values, q)
+    assert exact <= sketch.quantile(q) <= exact * gamma * (1 + 1e-12)
+
+
+def _values(seed: int, n: int = 20000):
+    rng = random.Random(seed)
+    return [rng.lognormvariate(0, 1.5) for _ in range(n)]
+
+
+@pytest.mark.parametrize("relative_accuracy", [0.005, 0.01, 0.05])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_quantile_is_upper_bound(relative_accuracy: float, seed: int):
+    values = _values(seed)
+    sketch = QuantileSketch(relative_accuracy)
+    sketch.add_all(values)
+    sorted_values = sorted(values)
+
+    assert sketch.count == len(values)
+    assert sketch.min == sorted_values[0]
+    assert sketch.max == sorted_values[-1]
+    for q in QUANTILES:
+        _assert_upper_bound(sketch, sorted_values, q)
+
+
+def test_add_matches_add_all():
+    values = _values(0, 1000) + [0, -1.0]  # 0以下の値は0として数える
+    one_by_one = QuantileSketch()
+    for value in values:
+        one_by_one.add(value)
+    at_once = QuantileSketch()
+    at_once.add_all(values)
+
+    assert [one_by_one.quantile(q) for q in QUANTILES] == [at_once.quantile(q) for q in QUANTILES]
+    assert at_once.quantile(0) == 0
+    assert at_once.min == -1.0
+
+
+def test_merge_matches_single_sketch():
+    values = _values(0)
+    single = QuantileSketch()
+    single.add_all(values)
+
+    merged = QuantileSketch()
+    for i in range(0, len(values), 3000):
+        chunk = QuantileSketch()
+        chunk.add_all(values[i:i + 3000])
+        merged.merge(chunk)
+    merged.merge(QuantileSketch())  # 空のスケッチは何も変えない
+
+    assert (merged.count, merged.min, merged.max) == (single.count, single.min, single.max)
+    assert [merged.quantile(q) for q in QUANTILES] == [single.quantile(q) for q in QUANTILES]
+
+    with pytest.raises(ValueError):
+        merged.merge(QuantileSketch(0.05))
+
+
+@pytest.mark.parametrize("use_merge", [False, True])
+def test_collapse_keeps_high_quantiles(use_merge: bool):
+    # 値の範囲が広いので、ビンの数の上限を超えて小さい値のビンからまとめられる
+    rng = random.Random(0)
+    values = [math.exp(rng.uniform(-20, 20)) for _ in range(20000)]
+    max_bins = 64
+    sketch = QuantileSketch(0.01, max_bins=max_bins)
+    if use_merge:
+        for i in range(0, len(values), 1000):
+            chunk = QuantileSketch(0.01, max_bins=max_bins)
+            chunk.add_all(values[i:i + 1000])
+            sketch.merge(chunk)
+    else:
+        sketch.add_all(values)
+    sorted_values = sorted(values)
+
+    assert len(sketch._bins) <= max_bins
+    for q in (0.999, 0.9999, 1):
+        _assert_upper_bound(sketch, sorted_values, q)
+    # まとめられた低い分位点も、真の値を下回らない (最悪実行時間を過小評価しない)
+    for q in (0, 0.1, 0.5):
+        assert sketch.quantile(q) >= _exact_quantile(sorted_values, q)
+
+
+def test_wcet_margin_and_time_scale():
+    stats = CallbackExecStats(0)
+    stats.add_all([float(i) for i in range(1, 101)])
+    stats.add_all([50.0])
+
+    assert stats.count == 101
+    assert stats.mean == pytest.approx(5100 / 101)
+    assert stats.max == 100
+    assert stats.wcet() == 100
+    assert stats.wcet(margin=0.2, time_scale=1e-3) == pytest.approx(100 * 1.2 * 1e-3)
+    assert stats.wcet(percentile=100, margin=0.5, time_scale=2) == pytest.approx(300)
+
+    # 分位点のスケッチの値に余裕と係数を掛ける
+    median = stats.sketch.quantile(0.5)
+    assert 50 <= median <= 50 * 1.01 / 0.99
+    assert stats.wcet(percentile=50, margin=0.2, time_scale=1e-3) == pytest.approx(median * 1.2 * 1e-3)
+    assert CallbackExecStats(1).mean is None
+
+
+def _records(seed: int, n: int = 1000):
+    rng = random.Random(seed)
+    records = []
+    for i in range(n):
+        start = i * 10.0
+        records.append((rng.randrange(5), start, start + rng.uniform(0.5, 3)))
+    return records
+
+
+def _write_csv_trace(path: Path, records) -> None:
+    with open(path, "w") as file:
+        file.write("callback_id,thread,start,end\n")
+        for callback_id, start, end in records:
+            file.write(f"cb{callback_id},7,{start!r},{end!r}\n")
+        file.write("\n")
+
+
+def _write_jsonl_trace(path: Path, records) -> None:
+    with open(path, "w") as file:
+        for callback_id, start, end in records:
+            file.write(json.dumps({"callback_id": callback_id, "start": start, "end": end}) + "\n")
+            file.write("\n")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000, 5000])
+def test_chunked_readers(tmp_path: Path, chunk_size: int):
+    records = _records(0)
+    csv_path = tmp_path / "trace.csv"
+    jsonl_path = tmp_path / "trace.jsonl"
+    _write_csv_trace(csv_path, records)
+    _write_jsonl_trace(jsonl_path, records)
+
+    expected = [(callback_id, end - start) for callback_id, start, end in records]
+    for trace_path in (csv_path, jsonl_path):
+        chunks = list(iter_trace_chunks(trace_path, chunk_size))
+        assert all(len(chunk) == chunk_size for chunk in chunks[:-1])
+        assert 0 < len(chunks[-1]) <= chunk_size
+        assert [record for chunk in chunks for record in chunk] == expected
+
+        stats_each_callback = collect_exec_stats(trace_path, chunk_size)
+        for callback_id, stats in stats_each_callback.items():
+            exec_times = [exec_time for i, exec_time in expected if i == callback_id]
+            assert stats.count == len(exec_times)
+            assert stats.max == max(exec_times)
+            assert stats.mean == pytest.approx(sum(exec_times) / len(exec_times))
+
+    with pytest.raises(ValueError):
+        iter_trace_chunks(tmp_path / "trace.txt")
+
+
+def test_update_input_wcets(tmp_path: Path):
+    stats = CallbackExecStats(0)
+    stats.add_all([1.0, 2.0])
+    output_path = tmp_path / "measured.yaml"
+    num_updated, num_unknown = update_input_wcets(
+        CASE_STUDY_PATH, output_path, {0: stats, 999: CallbackExecStats(999)}, margin=0.5
+    )
+
+    assert (num_updated, num_unknown) == (1, 1)
+    with open(output_path) as file:
+        callbacks = yaml.safe_load(file)["callbacks"]
+    assert callbacks["cb0"]["exec"] == 3.0
+    assert callbacks["cb1"]["exec"] == 16.1
+    assert [path.name for path in tmp_path.iterdir()] == ["measured.yaml"]  # 一時ファイルは残らない
+
+
+def _write_csv_input(path: Path) -> bytes:
+    content = b"# num_cpus: 2\n# num_executors: 2\ncallback_id,period,exec,node_id,chain_id\n0,10,1,0,0\n1,0,2,1,0\n"
+    path.write_bytes(content)
+    return content
+
+
+def test_unsupported_output_keeps_input(tmp_path: Path):
+    input_path = tmp_path / "in.csv"
+    content = _write_csv_input(input_path)
+    stats = CallbackExecStats(0)
+    stats.add_all([1.0])
+
+    with pytest.raises(ValueError):
+        update_input_wcets(input_path, input_path, {0: stats})
+    assert input_path.read_bytes() == content
+    assert [path.name for path in tmp_path.iterdir()] == ["in.csv"]
+
+
+def test_failed_write_keeps_output(tmp_path: Path, monkeypatch):
+    output_path = tmp_path / "out.yaml"
+    output_path.write_text("original\n")
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("write failed")
+
+    monkeypatch.setattr(trace_ingest.yaml, "safe_dump", fail)
+    with pytest.raises(RuntimeError):
+        update_input_wcets(CASE_STUDY_PATH, output_path, {})
+    assert output_path.read_text() == "original\n"
+    assert [path.name for path in tmp_path.iterdir()] == ["out.yaml"]
+
+
+def test_main_requires_output_for_csv_input(tmp_path: Path, monkeypatch):
+    input_path = tmp_path / "in.csv"
+    content = _write_csv_input(input_path)
+    trace_path = tmp_path / "trace.csv"
+    _write_csv_trace(trace_path, [(0, 0.0, 1.5)])
+
+    monkeypatch.setattr(sys, "argv", ["trace_ingest", str(trace_path), "--input", str(input_path)])
+    with pytest.raises(SystemExit):
+        trace_ingest.main()
+    assert input_path.read_bytes() == content
+
+    output_path = tmp_path / "out.yaml"
+    monkeypatch.setattr(sys, "argv", ["trace_ingest", str(trace_path), "--input", str(input_path), "--output", str(output_path)])
+    trace_ingest.main()
+    with open(output_path) as file:
+        assert yaml.safe_load(file)["callbacks"]["cb0"]["exec"] == 1.5
+    assert input_path.read_bytes() == content